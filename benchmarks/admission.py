@@ -0,0 +1,102 @@
+"""
+Benchmark: `/api/v1` latency while a slow upstream floods the `/upstar` proxy.
+
+Run from the repository root with
+
+    python -m benchmarks.admission [--upstar N] [--upstream-delay S] [--no-admission]
+
+The upstream is simulated in process: every proxied call waits
+`--upstream-delay` seconds before answering. `--upstar` proxied calls are
+started at once, and while they are in flight `/api/v1` checks are sent one
+after another and timed; the same checks are timed on an idle server first.
+A second wave of proxied calls then measures how quickly the overflow is
+turned away. Each simulated client gets its own address so the per-client
+rate limits stay out of the picture. `--no-admission` empties the admission
+lanes, so every request goes straight to the application.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from itertools import count
+
+import httpx
+
+from mock_social_api.admission import ROUTE_LANES
+from mock_social_api.main import app
+
+CHECK = "/api/v1/instagram/count-posts?username=user2&hashtag=%23travel"
+
+RealAsyncClient = httpx.AsyncClient
+_addresses = count(1)
+
+
+def simulate_upstream(delay: float) -> None:
+    """Make the proxy's upstream answer every call after `delay` seconds."""
+    async def body():
+        yield b'{"ok": true}'
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        # Streamed like a real transport's body, which the proxy relays as it arrives
+        return httpx.Response(200, content=body(), headers={"content-type": "application/json"})
+
+    httpx.AsyncClient = lambda **kwargs: RealAsyncClient(transport=httpx.MockTransport(handle), **kwargs)
+
+
+async def get(path: str) -> tuple[int, float]:
+    """Send one request from a new client address; return its status and latency in ms."""
+    n = next(_addresses)
+    transport = httpx.ASGITransport(app=app, client=(f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}", 1234))
+    async with RealAsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        response = await client.get(path)
+        return response.status_code, (time.perf_counter() - start) * 1e3
+
+
+async def check_latencies(n: int) -> list[float]:
+    return [(await get(CHECK))[1] for _ in range(n)]
+
+
+def report(name: str, latencies: list[float]) -> None:
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(f"{name:<40} {statistics.median(latencies):>10.2f} {p99:>10.2f}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    await get(CHECK)  # load the store outside the measurements
+    print(f"{'/api/v1 latency (ms)':<40} {'median':>10} {'p99':>10}")
+    report("idle", await check_latencies(args.checks))
+
+    flood = [asyncio.create_task(get("/upstar/campaigns")) for _ in range(args.upstar)]
+    await asyncio.sleep(0.05)
+    report(f"{args.upstar} /upstar calls in flight", await check_latencies(args.checks))
+
+    second = time.perf_counter()
+    wave = await asyncio.gather(*(get("/upstar/campaigns") for _ in range(args.upstar)))
+    rejected = [latency for status, latency in wave if status == 503]
+    first = await asyncio.gather(*flood)
+    print()
+    print(f"first wave:  {dict(Counter(status for status, _ in first))}")
+    print(f"second wave: {dict(Counter(status for status, _ in wave))} in {time.perf_counter() - second:.2f} s")
+    if rejected:
+        print(f"second wave rejections took {statistics.median(rejected):.2f} ms (median)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upstar", type=int, default=200, help="concurrent proxied calls per wave")
+    parser.add_argument("--upstream-delay", type=float, default=1.5, help="seconds the upstream takes")
+    parser.add_argument("--checks", type=int, default=200, help="/api/v1 requests timed per phase")
+    parser.add_argument("--no-admission", action="store_true")
+    args = parser.parse_args()
+
+    if args.no_admission:
+        ROUTE_LANES[:] = []
+    simulate_upstream(args.upstream_delay)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
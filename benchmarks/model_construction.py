@@ -0,0 +1,165 @@
+"""
+Microbenchmarks: validated vs trusted model construction.
+
+Run from the repository root with
+
+    python -m benchmarks.model_construction [--users N] [--posts N]
+
+Per-load rows build a synthetic dataset of users the way the store used to
+(one validating constructor per story, post and comment, each deriving its
+hashtags) and the way it does now (one `model_validate` per user with the
+`TRUSTED` context), with `model_construct` for reference, then time reloading
+the dataset from a snapshot and from SQLite.
+
+Per-response rows compare validating response models with `model_construct`.
+pydantic-core validates small flat models faster than `model_construct` can
+copy fields in Python, so responses keep being validated.
+"""
+import argparse
+import os
+import tempfile
+import timeit
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+from pydantic import HttpUrl
+
+from mock_social_api.schemas.instagram_schema import TRUSTED, IComment, IPost, IStory, IUser
+from mock_social_api.schemas.response_schema import IResponseActivity, IResponseCounter
+
+
+def synthetic_users(n_users: int, n_posts: int) -> dict[str, dict]:
+    """Plain field values, as the store holds them before models are built."""
+    start = datetime(2024, 10, 1, tzinfo=timezone.utc)
+    users = {}
+    for u in range(n_users):
+        items = [
+            {
+                "content": f"Day {i} at the beach #vacation #day{i % 7}",
+                "hashtags": ["#vacation", f"#day{i % 7}"],
+                "timestamp": start + timedelta(hours=i),
+                "likes": i,
+            }
+            for i in range(n_posts)
+        ]
+        users[f"user{u}"] = {
+            "stories": items,
+            "posts": [
+                {
+                    **item,
+                    "link": f"https://instagram.com/p/{u}{i}",
+                    "comments": [{"username": "fan", "content": "Nice!", "timestamp": item["timestamp"]}],
+                }
+                for i, item in enumerate(items)
+            ],
+            "private": False,
+            "followers": u,
+        }
+    return users
+
+
+def validated_user(raw: dict) -> IUser:
+    return IUser(
+        stories=[IStory(**story) for story in raw["stories"]],
+        posts=[
+            IPost(**{**post, "comments": [IComment(**comment) for comment in post["comments"]]})
+            for post in raw["posts"]
+        ],
+        private=raw["private"],
+        followers=raw["followers"],
+    )
+
+
+def trusted_user(raw: dict) -> IUser:
+    return IUser.model_validate(raw, context=TRUSTED)
+
+
+def constructed_user(raw: dict) -> IUser:
+    return IUser.model_construct(
+        stories=[IStory.model_construct(**story) for story in raw["stories"]],
+        posts=[
+            IPost.model_construct(**{
+                **post,
+                "link": HttpUrl(post["link"]),
+                "comments": [IComment.model_construct(**comment) for comment in post["comments"]],
+            })
+            for post in raw["posts"]
+        ],
+        private=raw["private"],
+        followers=raw["followers"],
+    )
+
+
+def per_op_us(fn: Callable[[], object]) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number * 1e6
+
+
+def report(name: str, before: float | None, after: float) -> None:
+    if before is None:
+        print(f"{name:<40} {'':>12} {after:>12.1f}")
+    else:
+        print(f"{name:<40} {before:>12.1f} {after:>12.1f} {before / after:>8.2f}x")
+
+
+def header(after: str) -> None:
+    print(f"{'':<40} {'validated':>12} {after:>12} {'speedup':>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=20, help="stories and posts per user")
+    args = parser.parse_args()
+
+    raw = synthetic_users(args.users, args.posts)
+    print(f"{args.users} users, {args.posts} stories and {args.posts} posts each (us per operation)")
+    header("trusted")
+
+    validated = per_op_us(lambda: {name: validated_user(user) for name, user in raw.items()})
+    report("load dataset", validated, per_op_us(lambda: {name: trusted_user(user) for name, user in raw.items()}))
+    report(
+        "load dataset (model_construct)",
+        validated,
+        per_op_us(lambda: {name: constructed_user(user) for name, user in raw.items()}),
+    )
+    users = {name: trusted_user(user) for name, user in raw.items()}
+
+    from mock_social_api.snapshot import open_snapshot, write_snapshot
+    from mock_social_api.store.sqlite import SQLiteStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.snapshot")
+        write_snapshot(users, path)
+        report("open and decode snapshot (all users)", None, per_op_us(lambda: dict(open_snapshot(path))))
+
+        store = SQLiteStore(os.path.join(tmp, "users.db"))
+        for name, user in users.items():
+            store.put_user(name, user)
+        report("SQLite get_user (one user)", None, per_op_us(lambda: store.get_user("user0")))
+        store.close()
+
+    print()
+    header("constructed")
+    counter = {"result": 2, "username": "user1"}
+    activity = {"followers": 150, "stories_with_hashtag": 2, "posts_with_hashtag": 1, "total_likes": 18, "username": "user1"}
+    report(
+        "IResponseCounter",
+        per_op_us(lambda: IResponseCounter(**counter)),
+        per_op_us(lambda: IResponseCounter.model_construct(**counter)),
+    )
+    report(
+        "IResponseActivity",
+        per_op_us(lambda: IResponseActivity(**activity)),
+        per_op_us(lambda: IResponseActivity.model_construct(**activity)),
+    )
+    report(
+        "IResponseActivity to JSON",
+        per_op_us(lambda: IResponseActivity(**activity).model_dump_json()),
+        per_op_us(lambda: IResponseActivity.model_construct(**activity).model_dump_json()),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Admission control: bounded concurrency, priority lanes and load shedding.
+
+At most `ADMISSION_MAX_IN_FLIGHT` requests are worked on at once. Requests
+over that wait in a bounded queue per lane, and a freed slot goes to the
+highest-priority lane with someone waiting: cheap `/api/v1` checks before
+proxied `/upstar` calls. The `/upstar` lane also has a cap of its own below
+the global one, so a slow upstream can never take every slot. That cap is
+`UPSTREAM_CONCURRENCY`, the proxy's own limit on upstream calls, so requests
+the proxy could not send yet wait here, where priority and deadlines apply.
+
+Clients may send `X-Request-Deadline-Ms`, the milliseconds they are willing to
+wait for a response; otherwise a lane's default queueing budget applies. A
+request is shed with a 503 right away when the queue is full or its expected
+wait (from how long recent requests held their slots) exceeds its budget, and
+later if it is still queued when the budget runs out. Admitted requests carry
+their deadline in `request.state.deadline` so handlers can cap their own
+timeouts and pass the remaining budget on.
+
+A slot is held until the response starts, so long-lived streams do not keep
+one for their whole lifetime. `/upstar` slots are the exception: they are
+held until the response is done, since the proxy keeps its upstream slot while
+it relays the body, and a request admitted past that would wait for one in the
+proxy, outside priority and deadlines.
+"""
+import asyncio
+import json
+import math
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from fastapi import Request
+
+from mock_social_api import config
+
+DEADLINE_HEADER = "x-request-deadline-ms"
+_DEADLINE_HEADER_BYTES = DEADLINE_HEADER.encode()
+
+# Weight of the newest sample in the moving average of slot hold times
+_EWMA_WEIGHT = 0.2
+
+
+@dataclass(frozen=True)
+class Lane:
+    name: str
+    priority: int  # lower is admitted first
+    max_in_flight: int  # this lane's share of the global limit
+    max_queue: int
+    max_wait: float  # queueing budget in seconds when the client sends no deadline
+    hold_until_done: bool = False  # keep the slot until the body is sent, not just until it starts
+
+
+# First matching path prefix wins; unmatched paths are always admitted
+ROUTE_LANES: list[tuple[str, Lane]] = [
+    ("/api/v1/", Lane(
+        name="api_v1",
+        priority=0,
+        max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+        max_queue=config.ADMISSION_QUEUE_SIZE,
+        max_wait=config.ADMISSION_MAX_WAIT,
+    )),
+    ("/upstar/", Lane(
+        name="upstar",
+        priority=1,
+        max_in_flight=config.UPSTREAM_CONCURRENCY,
+        max_queue=config.ADMISSION_QUEUE_SIZE,
+        max_wait=config.ADMISSION_MAX_WAIT,
+        # The proxy holds its upstream slot while the body streams
+        hold_until_done=True,
+    )),
+]
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("Server is overloaded")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int) -> None:
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lane_in_flight: dict[str, int] = {}
+        self._queues: dict[Lane, deque[asyncio.Future]] = {}
+        self._hold_time: dict[str, float] = {}
+        self.shed = 0
+
+    def _queue(self, lane: Lane) -> deque[asyncio.Future]:
+        queue = self._queues.get(lane)
+        if queue is None:
+            queue = self._queues[lane] = deque()
+            # Dispatch visits lanes in priority order
+            self._queues = dict(sorted(self._queues.items(), key=lambda item: item[0].priority))
+        return queue
+
+    def _has_room(self, lane: Lane) -> bool:
+        return self.in_flight < self.max_in_flight and self._lane_in_flight.get(lane.name, 0) < lane.max_in_flight
+
+    def _take(self, lane: Lane) -> None:
+        self.in_flight += 1
+        self._lane_in_flight[lane.name] = self._lane_in_flight.get(lane.name, 0) + 1
+
+    def expected_wait(self, lane: Lane) -> float:
+        """Seconds a request joining `lane`'s queue now can expect to wait."""
+        ahead = sum(len(queue) for other, queue in self._queues.items() if other.priority <= lane.priority)
+        capacity = min(lane.max_in_flight, self.max_in_flight)
+        return (ahead + 1) * self._hold_time.get(lane.name, 0.0) / capacity
+
+    async def acquire(self, lane: Lane, budget: float) -> None:
+        """Take a slot in `lane`, or raise `Overloaded` if that would take longer than `budget` seconds."""
+        queue = self._queue(lane)
+        waiting = any(waiters for other, waiters in self._queues.items() if other.priority <= lane.priority)
+        if not waiting and self._has_room(lane):
+            self._take(lane)
+            return
+        expected = self.expected_wait(lane)
+        if len(queue) >= lane.max_queue or expected > budget:
+            self.shed += 1
+            raise Overloaded(max(expected, budget))
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, budget)
+        except asyncio.TimeoutError:
+            self._leave(queue, waiter)
+            self.shed += 1
+            raise Overloaded(budget)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the request went away: hand the slot on
+                self.release(lane, None)
+            else:
+                self._leave(queue, waiter)
+            raise
+
+    @staticmethod
+    def _leave(queue: deque[asyncio.Future], waiter: asyncio.Future) -> None:
+        """Give up a waiter's place so it no longer counts against the queue size."""
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass  # dispatch already dropped it
+
+    def release(self, lane: Lane, held_for: float | None) -> None:
+        self.in_flight -= 1
+        self._lane_in_flight[lane.name] -= 1
+        if held_for is not None:
+            average = self._hold_time.get(lane.name)
+            self._hold_time[lane.name] = (
+                held_for if average is None else average + _EWMA_WEIGHT * (held_for - average)
+            )
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for lane, queue in self._queues.items():
+            while queue and self._has_room(lane):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self._take(lane)
+                    waiter.set_result(None)
+            if queue and self.in_flight >= self.max_in_flight:
+                return
+
+
+def client_timeout(scope) -> float | None:
+    """Seconds the client will wait for the response, from `X-Request-Deadline-Ms`."""
+    for name, value in scope["headers"]:
+        if name == _DEADLINE_HEADER_BYTES:
+            try:
+                return max(0.0, int(value) / 1000)
+            except ValueError:
+                return None
+    return None
+
+
+def remaining_budget(request: Request) -> float | None:
+    """Seconds left before the request's deadline, or None if it has none."""
+    deadline = getattr(request.state, "deadline", None)
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting HTTP requests through `ROUTE_LANES`."""
+
+    def __init__(
+        self,
+        app: Callable[..., Awaitable[None]],
+        controller: AdmissionController | None = None,
+        lanes: list[tuple[str, Lane]] | None = None,
+    ) -> None:
+        self.app = app
+        self.controller = controller if controller is not None else AdmissionController(config.ADMISSION_MAX_IN_FLIGHT)
+        self.lanes = ROUTE_LANES if lanes is None else lanes
+
+    def lane_for(self, path: str) -> Lane | None:
+        for prefix, lane in self.lanes:
+            if path.startswith(prefix):
+                return lane
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        lane = self.lane_for(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        timeout = client_timeout(scope)
+        if timeout is not None:
+            scope.setdefault("state", {})["deadline"] = loop.time() + timeout
+        try:
+            await self.controller.acquire(lane, lane.max_wait if timeout is None else min(lane.max_wait, timeout))
+        except Overloaded as e:
+            await self._reject(send, e.retry_after)
+            return
+
+        admitted = loop.time()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release(lane, loop.time() - admitted)
+
+        async def send_releasing(message) -> None:
+            if message["type"] == "http.response.start":
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send if lane.hold_until_done else send_releasing)
+        finally:
+            release()
+
+    @staticmethod
+    async def _reject(send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Server is overloaded, try again shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
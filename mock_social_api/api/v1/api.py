@@ -1,8 +1,11 @@
 from fastapi import APIRouter
 from mock_social_api.api.v1.endpoints import (
-    instagram, tiktok
+    export, instagram, leaderboard, subscriptions, tiktok
 )
 
 api_router = APIRouter()
 api_router.include_router(instagram.router, prefix="/instagram", tags=["instagram"])
 api_router.include_router(tiktok.router, prefix="/tiktok", tags=["tiktok"])
+api_router.include_router(leaderboard.router, prefix="/leaderboard", tags=["leaderboard"])
+api_router.include_router(subscriptions.router, prefix="/subscriptions", tags=["subscriptions"])
+api_router.include_router(export.router, prefix="/export", tags=["export"])
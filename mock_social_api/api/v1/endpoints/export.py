@@ -0,0 +1,93 @@
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from mock_social_api.export import (
+    EXTENSIONS, MEDIA_TYPES, ExportFormat, ExportStream, ExportTable, ExportUnavailable, schema
+)
+from mock_social_api.hashtags import canonicalize_query
+from mock_social_api.ratelimit import export_limiter
+from mock_social_api.store import ExportFilter, get_store
+
+router = APIRouter()
+
+
+@router.get("/{table}", response_class=StreamingResponse)
+async def export_table(
+    table: ExportTable,
+    format: ExportFormat = ExportFormat.parquet,
+    username: Optional[list[str]] = Query(default=None),
+    hashtag: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> StreamingResponse:
+    """
+    Streams a table of the dataset as Parquet or an Arrow IPC stream, for offline analytics.
+
+    Rows are written in record batches (Parquet row groups) while they are sent, with chunked
+    transfer, so exports of any size run in bounded memory. Only a couple of exports run at
+    once; more are rejected with a 503.
+
+    **Parameters:**
+    - `table` (ExportTable): `users`, `stories`, `posts` or `comments`.
+    - `format` (ExportFormat, optional): `parquet` (default) or `arrow`.
+    - `username` (list[str], optional): Export only these users' rows (repeatable).
+    - `hashtag` (str, optional): Export only stories and posts tagged with it, and the comments on such posts.
+    - `since` (datetime, optional): Earliest story, post or comment timestamp (inclusive).
+    - `until` (datetime, optional): Latest story, post or comment timestamp (exclusive).
+
+    **Columns:**
+    - `users`: `username`, `private`, `followers`
+    - `stories`: `username`, `timestamp`, `content`, `hashtags`, `likes`
+    - `posts`: `username`, `timestamp`, `content`, `hashtags`, `likes`, `link`
+    - `comments`: `post_username`, `post_timestamp`, `username`, `timestamp`, `content`
+
+    Timestamps are in UTC, and `hashtags` is a list of strings.
+
+    **Example Requests:**
+
+    - **Case 1**: Every post tagged #vacation since October 1st, as Parquet.
+        - **Input**: `table=posts`, `hashtag=#vacation`, `since=2024-10-01T00:00:00Z`
+        - **Output**: `posts.parquet`
+
+    - **Case 2**: pyarrow is not installed on the server.
+        - **Input**: `table=users`
+        - **Output**: `{"detail": "Exports need the optional pyarrow package"}` (501)
+    """
+    try:
+        # Fails before anything is streamed when pyarrow is missing
+        schema(table)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    filters = ExportFilter(
+        usernames=frozenset(username) if username else None,
+        hashtag=canonicalize_query(hashtag) if hashtag else None,
+        since=since,
+        until=until,
+    )
+
+    export = ExportStream(get_store(), table, filters, format)
+    # Held until the response is over, which also stops the writer if the client went away
+    cleanup = AsyncExitStack()
+    await cleanup.enter_async_context(export_limiter.slot())
+    cleanup.callback(export.cancel)
+
+    async def chunks():
+        # A failed export aborts the response, which skips its background task
+        try:
+            async for chunk in export:
+                yield chunk
+        except Exception:
+            await cleanup.aclose()
+            raise
+
+    return StreamingResponse(
+        chunks(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table.value}{EXTENSIONS[format]}"'},
+        background=BackgroundTask(cleanup.aclose),
+    )
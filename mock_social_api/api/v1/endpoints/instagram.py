@@ -1,11 +1,24 @@
+from datetime import date
 from enum import Enum
-from fastapi import APIRouter, HTTPException, Request
-import httpx
-from mock_social_api.schemas.response_schema import IResponseActivity, IResponseBolean, IResponseCounter, IResponseLatestPost
-from mock_social_api.constants import mock_users
+from fastapi import APIRouter, Depends, HTTPException, Request
+from mock_social_api import config
+from mock_social_api.hashtags import canonicalize_query
+from mock_social_api.http_cache import cache_validators
+from mock_social_api.rollups import daily_rollups
+from mock_social_api.schemas.response_schema import (
+    IActivityMeta, IResponseActivity, IResponseBolean, IResponseCounter, IResponseHashtagMentions, IResponseHashtagReach,
+    IResponseLatestPost
+)
+from mock_social_api.sketches import get_hashtag_stats
+from mock_social_api.executor import run_store
+from mock_social_api.store import get_store
+from mock_social_api.utils import fetch_user_data, get_timeframe_start
 
 router = APIRouter()
 
+# Account whose posts, comments and followers the missions are about
+TARGET_ACCOUNT = "andrealbriziom"
+
 
 # Enum for time frame selection
 class TimeFrame(str, Enum):
@@ -13,7 +26,7 @@ class TimeFrame(str, Enum):
     last_sunday_midnight = "last_sunday_midnight"
 
 
-@router.get("/check-story")
+@router.get("/check-story", dependencies=[Depends(cache_validators())])
 async def check_story(
     username: str,
     hashtag: str,
@@ -61,7 +74,12 @@ async def check_story(
     - **Case 5**: Non-existing user.
         - **Input**: `username=user4`, `hashtag=#vacation`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
+
+    - **Case 6**: Any other user, from the stories stored since midnight (France time).
+        - **Input**: `username=andrealbriziom`, `hashtag=#vacation`
+        - **Output**: `{"result": false, "username": "andrealbriziom"}`
     """
+    hashtag = canonicalize_query(hashtag)
 
     # Mock response for test cases
     if username == "user1" and hashtag == "#vacation":
@@ -74,13 +92,19 @@ async def check_story(
         raise HTTPException(status_code=403, detail="Account is private")
     elif username == "user4":  # user4 does not exist
         raise HTTPException(status_code=404, detail="Account does not exist")
-    else:
-        return IResponseBolean(result=False, username=username)
+
+    # Everyone else, from the stories stored since midnight
+    user = await fetch_user_data(username)
+    if user.private:
+        raise HTTPException(status_code=403, detail="Account is private")
+    store = get_store()
+    stories = await run_store(store.count_stories, username, hashtag, get_timeframe_start(TimeFrame.today_midnight))
+    return IResponseBolean(result=stories > 0, username=username)
 
 
 
 
-@router.get("/count-stories")
+@router.get("/count-stories", dependencies=[Depends(cache_validators())])
 async def count_stories(
     username: str,
     hashtag: str,
@@ -128,7 +152,12 @@ async def count_stories(
     - **Case 5**: Non-existing user.
         - **Input**: `username=user5`, `hashtag=#vacation`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
+
+    - **Case 6**: Any other user, counted from the stored stories.
+        - **Input**: `username=user1`, `hashtag=#travel`
+        - **Output**: `{"result": 0, "username": "user1"}`
     """
+    hashtag = canonicalize_query(hashtag)
     
     # Mock response for test cases
     if username == "user1" and hashtag == "#vacation":
@@ -141,11 +170,17 @@ async def count_stories(
         raise HTTPException(status_code=403, detail="Account is private")
     elif username == "user5":  # user5 does not exist
         raise HTTPException(status_code=404, detail="Account does not exist")
-    else:
-        return IResponseCounter(result=0, username=username)
+
+    # Everyone else, counted by the store
+    user = await fetch_user_data(username)
+    if user.private:
+        raise HTTPException(status_code=403, detail="Account is private")
+    store = get_store()
+    result = await run_store(store.count_stories, username, hashtag, get_timeframe_start(TimeFrame.today_midnight))
+    return IResponseCounter(result=result, username=username)
 
 
-@router.get("/count-posts")
+@router.get("/count-posts", dependencies=[Depends(cache_validators())])
 async def count_posts(
     username: str,
     hashtag: str,
@@ -198,7 +233,12 @@ async def count_posts(
     - **Case 5**: Non-existing account.
         - **Input**: `username=user5`, `hashtag=#vacation`, `timeframe=today_midnight`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
+
+    - **Case 6**: Any other user, counted from the stored posts.
+        - **Input**: `username=user2`, `hashtag=#travel`, `timeframe=last_sunday_midnight`
+        - **Output**: `{"result": 0, "username": "user2"}`
     """
+    hashtag = canonicalize_query(hashtag)
 
     # Hardcoded responses for specific scenarios
     if username == "user5":
@@ -221,12 +261,22 @@ async def count_posts(
         # Case 3: User has no posts
         return IResponseCounter(result=0, username=username)
 
-    # Default response for other cases
-    return IResponseCounter(result=0, username=username)
+    # Other cases are counted by the store
+    user = await fetch_user_data(username)
+    if user.private:
+        raise HTTPException(status_code=403, detail="Account is private")
+    store = get_store()
+    result = await run_store(store.count_posts, username, hashtag, get_timeframe_start(timeframe))
+    return IResponseCounter(result=result, username=username)
 
     
 
-@router.get("/daily-activity", response_model=IResponseActivity)
+@router.get(
+    "/daily-activity",
+    response_model=IResponseActivity,
+    response_model_exclude_none=True,
+    dependencies=[Depends(cache_validators())],
+)
 async def daily_activity(
     username: str,
     hashtag: str
@@ -281,7 +331,13 @@ async def daily_activity(
     - **Scenario 7**: User’s account doesn’t exist.
         - **Input**: `username=user5`, `hashtag=#vacation`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
+
+    - **Scenario 8**: Any other user is answered from the precomputed rollup of their stories and
+      posts since midnight (Paris time), with `meta` telling when it was last brought up to date.
+        - **Input**: `username=user2`, `hashtag=#travel`
+        - **Output**: `{"followers": 0, "stories_with_hashtag": 0, "posts_with_hashtag": 0, "total_likes": 0, "username": "user2", "meta": {"since": "2024-10-02T00:00:00+02:00", "updated_at": "2024-10-02T08:15:00Z"}}`
     """
+    hashtag = canonicalize_query(hashtag)
 
     # Hardcoded responses based on scenarios
     if username == "user1" and hashtag == "#vacation":
@@ -338,13 +394,144 @@ async def daily_activity(
         # Scenario 6: User has a private account
         raise HTTPException(status_code=403, detail="Account is private")
 
-    else:
+    # Scenario 8: Everyone else, from the precomputed rollup
+    rollup = await daily_rollups.activity(username)
+    if rollup is None:
         # Scenario 7: User doesn’t exist
         raise HTTPException(status_code=404, detail="Account does not exist")
+    if rollup.private:
+        raise HTTPException(status_code=403, detail="Account is private")
+    counts = rollup.counts(hashtag)
+    return IResponseActivity(
+        followers=rollup.followers,
+        stories_with_hashtag=counts.stories,
+        posts_with_hashtag=counts.posts,
+        total_likes=counts.story_likes + counts.post_likes,
+        username=username,
+        meta=IActivityMeta(since=rollup.since, updated_at=rollup.updated_at),
+    )
 
     
 
-@router.get("/latest-post")
+@router.get("/hashtag-reach")
+async def hashtag_reach(
+    hashtag: str,
+    day: date | None = None,
+) -> IResponseHashtagReach:
+    """
+    Estimates how many distinct users posted a story, post or reel with a hashtag on a given day.
+
+    Hashtags used by up to 64 users that day are counted exactly (`relative_error`
+    is 0). Past that the count comes from a HyperLogLog sketch, so it is approximate:
+    its relative standard error is reported in `relative_error` (about 1.6%, so
+    roughly 95% of answers are within 3.3% of the exact count).
+
+    Parameters:
+    -----------
+    hashtag : str
+        The hashtag to measure.
+    day : date, optional
+        The day (Paris time) to measure, within the retained days. Defaults to today.
+
+    Raises:
+    -------
+    HTTPException
+        If approximate stats are disabled (404).
+        If `day` is not one of the retained days (422).
+
+    Returns:
+    --------
+    IResponseHashtagReach:
+        - `unique_users` (int): Approximate number of distinct users.
+        - `relative_error` (float): Relative standard error of `unique_users`.
+
+    Test Cases:
+    -----------
+    - **Case 1**: Hashtag used by three users today.
+        - **Input**: `hashtag=#vacation`
+        - **Output**: `{"hashtag": "#vacation", "day": "...", "unique_users": 3, "relative_error": 0.0}`
+
+    - **Case 2**: Hashtag used by thousands of users today.
+        - **Input**: `hashtag=#travel`
+        - **Output**: `{"hashtag": "#travel", "day": "...", "unique_users": 5012, "relative_error": 0.01625}`
+
+    - **Case 3**: Day older than the retained days.
+        - **Input**: `hashtag=#travel`, `day=2024-10-01`
+        - **Output**: HTTP 422: `{"detail": "Hashtag stats only cover the last 7 days"}`
+    """
+    hashtag = canonicalize_query(hashtag)
+    if not config.HASHTAG_STATS_ENABLED:
+        raise HTTPException(status_code=404, detail="Hashtag stats are disabled")
+    stats = get_hashtag_stats()
+    day = day or stats.today()
+    if not stats.retains(day):
+        raise HTTPException(status_code=422, detail=f"Hashtag stats only cover the last {stats.retention_days} days")
+    await stats.ready()
+    unique_users, relative_error = await run_store(stats.reach, hashtag, day)
+    return IResponseHashtagReach(hashtag=hashtag, day=day, unique_users=unique_users, relative_error=relative_error)
+
+
+@router.get("/hashtag-mentions")
+async def hashtag_mentions(
+    hashtag: str,
+    day: date | None = None,
+) -> IResponseHashtagMentions:
+    """
+    Estimates how many stories, posts and reels used a hashtag on a given day.
+
+    The count comes from a Count-Min sketch shared by all hashtags. It never
+    undercounts, and overcounts by more than `error_bound` (0.1% of all hashtag
+    mentions that day) with probability at most `error_probability` (under 1%).
+
+    Parameters:
+    -----------
+    hashtag : str
+        The hashtag to measure.
+    day : date, optional
+        The day (Paris time) to measure, within the retained days. Defaults to today.
+
+    Raises:
+    -------
+    HTTPException
+        If approximate stats are disabled (404).
+        If `day` is not one of the retained days (422).
+
+    Returns:
+    --------
+    IResponseHashtagMentions:
+        - `mentions` (int): Approximate number of stories and posts with the hashtag.
+        - `error_bound` (int): Maximum overcount, exceeded with probability `error_probability`.
+        - `error_probability` (float): Probability that the overcount exceeds `error_bound`.
+
+    Test Cases:
+    -----------
+    - **Case 1**: Hashtag used five times today.
+        - **Input**: `hashtag=#vacation`
+        - **Output**: `{"hashtag": "#vacation", "day": "...", "mentions": 5, "error_bound": 1, "error_probability": 0.0067}`
+
+    - **Case 2**: Day older than the retained days.
+        - **Input**: `hashtag=#vacation`, `day=2024-10-01`
+        - **Output**: HTTP 422: `{"detail": "Hashtag stats only cover the last 7 days"}`
+    """
+    hashtag = canonicalize_query(hashtag)
+    if not config.HASHTAG_STATS_ENABLED:
+        raise HTTPException(status_code=404, detail="Hashtag stats are disabled")
+    stats = get_hashtag_stats()
+    day = day or stats.today()
+    if not stats.retains(day):
+        raise HTTPException(status_code=422, detail=f"Hashtag stats only cover the last {stats.retention_days} days")
+    await stats.ready()
+    mentions, error_bound, error_probability = await run_store(stats.mentions, hashtag, day)
+    return IResponseHashtagMentions(
+        hashtag=hashtag,
+        day=day,
+        mentions=mentions,
+        error_bound=error_bound,
+        error_probability=error_probability,
+    )
+
+
+@router.get("/latest-post", dependencies=[Depends(cache_validators(TARGET_ACCOUNT))])
 async def latest_post() -> IResponseLatestPost:
     """
     Fetches the link to the latest post of a specified Instagram account.
@@ -364,19 +551,21 @@ async def latest_post() -> IResponseLatestPost:
     HTTPException
         If the specified account does not exist (404).
     """
-    target_account = "andrealbriziom"
+    target_account = TARGET_ACCOUNT
 
     # Check if the account exists
-    if target_account not in mock_users:
+    store = get_store()
+    target_data = await run_store(store.get_user, target_account)
+    if target_data is None:
         raise HTTPException(status_code=404, detail="Account does not exist")
     
     # Get the latest post link
-    latest_post_data = mock_users[target_account].posts[0]
+    latest_post_data = target_data.posts[0]
     latest_post_link = latest_post_data.link
     return IResponseLatestPost(link=latest_post_link)
 
 
-@router.get("/check-comment")
+@router.get("/check-comment", dependencies=[Depends(cache_validators(TARGET_ACCOUNT))])
 async def check_comment(username: str) -> IResponseBolean:
     """
     Checks if a specified user commented on the last post of the Instagram account @andrealbriziom.
@@ -417,7 +606,7 @@ async def check_comment(username: str) -> IResponseBolean:
         - **Output**: HTTP 403: `{"detail": "Your account is private. You need to make your account public to check comments."}`
     """
     
-    target_account = "andrealbriziom"
+    target_account = TARGET_ACCOUNT
     
     # Mock user data and posts for demonstration (replace with real data retrieval)
     mock_users = {
@@ -462,7 +651,7 @@ async def check_comment(username: str) -> IResponseBolean:
     return IResponseBolean(result=commented, username=username)
 
 
-@router.get("/check-follow")
+@router.get("/check-follow", dependencies=[Depends(cache_validators(TARGET_ACCOUNT))])
 async def check_follow(username: str) -> IResponseBolean:
     """
     Checks if the specified user follows the Instagram account @andrealbriziom.
@@ -501,9 +690,13 @@ async def check_follow(username: str) -> IResponseBolean:
     - **Case 4**: Non-existing account.
         - **Input**: `username=user4`
         - **Output**: HTTP 404: `{"detail": "The account does not exist."}`
+
+    - **Case 5**: Any other stored account. The dataset has no follower lists, so it does not follow.
+        - **Input**: `username=andrealbriziom`
+        - **Output**: `{"result": false, "username": "andrealbriziom"}`
     """
     
-    target_account = "andrealbriziom"
+    target_account = TARGET_ACCOUNT
     
     # Mock user data for demonstration (should be replaced with real data retrieval logic)
     mock_users = {
@@ -514,7 +707,12 @@ async def check_follow(username: str) -> IResponseBolean:
     }
 
     # Fetch the user data for the user making the request
-    user_data = mock_users.get(username, None)
+    if username in mock_users:
+        user_data = mock_users[username]
+    else:
+        # Other accounts come from the store, which has no follower lists
+        stored = await run_store(get_store().get_user, username)
+        user_data = {"private": stored.private, "follows": False} if stored is not None else None
     
     # Check if the user's account exists
     if user_data is None:
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Query
+from mock_social_api.api.v1.endpoints.instagram import TimeFrame
+from mock_social_api.executor import run_store
+from mock_social_api.hashtags import canonicalize_query
+from mock_social_api.leaderboard import get_leaderboards
+from mock_social_api.schemas.response_schema import (
+    ILeaderboardHashtag, ILeaderboardUser, IResponseHashtagLeaderboard, IResponseUserLeaderboard
+)
+
+router = APIRouter()
+
+
+@router.get("/users")
+async def top_users(
+    hashtag: str,
+    timeframe: TimeFrame = TimeFrame.last_sunday_midnight,
+    limit: int = Query(default=100, ge=1, le=1000),
+) -> IResponseUserLeaderboard:
+    """
+    Ranks users by the likes they collected on stories and posts with a hashtag since a time frame.
+
+    **Parameters:**
+    - `hashtag` (str): The hashtag to rank users on.
+    - `timeframe` (TimeFrame, optional): Count likes since this boundary (default: `last_sunday_midnight`).
+    - `limit` (int, optional): Number of users to return, 1 to 1000 (default: 100).
+
+    **Returns:**
+    - `IResponseUserLeaderboard`: A response model containing:
+        - `hashtag` (str): The hashtag the users are ranked on.
+        - `since` (datetime): Start of the time frame, Paris time.
+        - `users` (list): Up to `limit` entries of `username` and `likes`, most liked first.
+
+    **Example Requests:**
+
+    - **Case 1**: Top 100 users on #vacation since last Sunday.
+        - **Input**: `hashtag=#vacation`, `timeframe=last_sunday_midnight`
+        - **Output**: `{"hashtag": "#vacation", "since": "...", "users": [{"username": "user1", "likes": 12}, ...]}`
+
+    - **Case 2**: Nobody used the hashtag in the time frame.
+        - **Input**: `hashtag=#unused`, `timeframe=today_midnight`
+        - **Output**: `{"hashtag": "#unused", "since": "...", "users": []}`
+    """
+    hashtag = canonicalize_query(hashtag)
+    leaderboards = get_leaderboards()
+    await leaderboards.ready()
+    since, ranking = await run_store(leaderboards.top_users, hashtag, timeframe.value, limit)
+    return IResponseUserLeaderboard(
+        hashtag=hashtag,
+        since=since,
+        users=[ILeaderboardUser(username=username, likes=likes) for username, likes in ranking],
+    )
+
+
+@router.get("/hashtags")
+async def top_hashtags(
+    timeframe: TimeFrame = TimeFrame.today_midnight,
+    limit: int = Query(default=10, ge=1, le=1000),
+) -> IResponseHashtagLeaderboard:
+    """
+    Ranks hashtags by how many stories and posts used them since a time frame.
+
+    **Parameters:**
+    - `timeframe` (TimeFrame, optional): Count mentions since this boundary (default: `today_midnight`).
+    - `limit` (int, optional): Number of hashtags to return, 1 to 1000 (default: 10).
+
+    **Returns:**
+    - `IResponseHashtagLeaderboard`: A response model containing:
+        - `since` (datetime): Start of the time frame, Paris time.
+        - `hashtags` (list): Up to `limit` entries of `hashtag` and `mentions`, most used first.
+
+    **Example Requests:**
+
+    - **Case 1**: Most used hashtags today.
+        - **Input**: `timeframe=today_midnight`, `limit=3`
+        - **Output**: `{"since": "...", "hashtags": [{"hashtag": "#vacation", "mentions": 5}, ...]}`
+    """
+    leaderboards = get_leaderboards()
+    await leaderboards.ready()
+    since, ranking = await run_store(leaderboards.top_hashtags, timeframe.value, limit)
+    return IResponseHashtagLeaderboard(
+        since=since,
+        hashtags=[ILeaderboardHashtag(hashtag=hashtag, mentions=mentions) for hashtag, mentions in ranking],
+    )
@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from mock_social_api.hashtags import canonicalize_query
+from mock_social_api.subscriptions import CheckType, format_event, hub
+
+router = APIRouter()
+
+
+@router.get("/instagram", response_class=StreamingResponse)
+async def subscribe_instagram(
+    username: str,
+    check: CheckType,
+    hashtag: str = "",
+) -> StreamingResponse:
+    """
+    Streams the result of an Instagram mission check as Server-Sent Events, instead of polling it.
+
+    The current result is sent right away, then again only when it changes: after new
+    stories or posts are stored for the user, or when a timeframe rolls over at midnight
+    (Paris time). Idle streams receive a `: keepalive` comment every 15 seconds.
+
+    **Parameters:**
+    - `username` (str): The username of the account to follow.
+    - `check` (CheckType): The check to run: `check_story`, `count_stories`, `count_posts` or `check_follow`.
+    - `hashtag` (str, optional): The hashtag for the check (ignored by `check_follow`).
+
+    **Events:**
+    - `result`: The check's JSON response plus its `status_code`, e.g.
+      `{"status_code": 200, "result": 2, "username": "user1"}` or
+      `{"status_code": 403, "detail": "Account is private"}`.
+
+    **Example Requests:**
+
+    - **Case 1**: Follow a user's story count for #vacation.
+        - **Input**: `username=user1`, `check=count_stories`, `hashtag=#vacation`
+        - **Output**: `event: result` / `data: {"status_code": 200, "result": 2, "username": "user1"}`
+    """
+    # Canonical, so spellings of the same hashtag share one topic
+    topic = (username, canonicalize_query(hashtag) if hashtag else "", check)
+
+    async def events():
+        async for result in hub.subscribe(topic):
+            yield format_event(result)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,8 @@
 from enum import Enum
-from fastapi import APIRouter, HTTPException, Request
-import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request
+from mock_social_api.hashtags import canonicalize_query
+from mock_social_api.http_cache import cache_validators
 from mock_social_api.schemas.response_schema import ITiktokResponseActivity, IResponseCounter, IResponseLatestPost
-from mock_social_api.constants import mock_users
 
 router = APIRouter()
 
@@ -34,7 +34,7 @@ def get_tiktok_posts(username: str, hashtag: str, timeframe: TimeFrame) -> int:
 
 
 # TikTok route for counting posts with a hashtag
-@router.get("/count-posts", response_model=IResponseCounter)
+@router.get("/count-posts", response_model=IResponseCounter, dependencies=[Depends(cache_validators())])
 async def count_tiktok_posts(
     username: str,
     hashtag: str,
@@ -79,6 +79,7 @@ async def count_tiktok_posts(
         - **Input**: `username=user5`, `hashtag=#vacation`, `timeframe=today_midnight`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
     """
+    hashtag = canonicalize_query(hashtag)
     # Fetch the count of posts using the mock function (replace with actual implementation)
     try:
         count = get_tiktok_posts(username, hashtag, timeframe)
@@ -138,7 +139,7 @@ def get_tiktok_daily_activity(username: str, hashtag: str) -> ITiktokResponseAct
     # Default response for non-matching cases
     raise HTTPException(status_code=404, detail="Account does not exist")
 
-@router.get("/daily-activity", response_model=ITiktokResponseActivity)
+@router.get("/daily-activity", response_model=ITiktokResponseActivity, dependencies=[Depends(cache_validators())])
 async def daily_activity(
     username: str,
     hashtag: str
@@ -191,6 +192,7 @@ async def daily_activity(
         - **Input**: `username=user5`, `hashtag=#vacation`
         - **Output**: HTTP 404: `{"detail": "Account does not exist"}`
     """
+    hashtag = canonicalize_query(hashtag)
     try:
         # Fetch the activity data using the mock function (replace with actual API call)
         activity = get_tiktok_daily_activity(username, hashtag)
@@ -0,0 +1,196 @@
+"""
+Response compression negotiated from `Accept-Encoding`.
+
+gzip is always available; brotli and zstd are used when the optional `brotli`
+and `zstandard` packages are installed. Bodies smaller than the minimum size
+are sent as they are, since compressing them costs more than it saves.
+
+Responses that already carry a `Content-Encoding` (proxied upstream payloads)
+pass through untouched instead of being decompressed and compressed again, as
+do columnar exports, which compress their own pages, and event streams are
+never buffered. Compressed bodies of immutable responses, such as the OpenAPI
+schema, are cached per encoding so they are only compressed once per process.
+"""
+import zlib
+from collections.abc import Awaitable, Callable
+from functools import cache
+
+from mock_social_api import config
+
+# Responses that never change while the process runs
+IMMUTABLE_PATHS = frozenset({"/openapi.json"})
+
+# Formats compressed by their own writers, which another pass would only slow down
+PRECOMPRESSED_TYPES = (b"application/vnd.apache.parquet", b"application/vnd.apache.arrow.stream")
+
+@cache
+def available_encodings() -> tuple[str, ...]:
+    """Installed encodings, preferred first when the client weighs them equally."""
+    encodings = []
+    try:
+        import zstandard  # noqa: F401
+        encodings.append("zstd")
+    except ImportError:
+        pass
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        pass
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Pick the best available encoding the client accepts, or None."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Incremental compressor with the same interface for every encoding."""
+
+    def __init__(self, encoding: str) -> None:
+        if encoding == "zstd":
+            import zstandard
+
+            compressor = zstandard.ZstdCompressor(level=config.COMPRESSION_ZSTD_LEVEL).compressobj()
+            self.compress, self.flush = compressor.compress, compressor.flush
+        elif encoding == "br":
+            import brotli
+
+            compressor = brotli.Compressor(quality=config.COMPRESSION_BROTLI_QUALITY)
+            self.compress, self.flush = compressor.process, compressor.finish
+        else:
+            # wbits=31 writes a gzip header and trailer around the deflate stream
+            compressor = zlib.compressobj(config.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress, self.flush = compressor.compress, compressor.flush
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: Callable[..., Awaitable[None]], minimum_size: int | None = None) -> None:
+        self.app = app
+        self.minimum_size = config.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self._immutable_cache: dict[tuple[str, str, bytes], bytes] = {}
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+                break
+        encoding = negotiate(accept_encoding.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, scope, encoding, send).run(receive)
+
+
+class _CompressedResponse:
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: str, send) -> None:
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.passthrough = False
+        self.compressor: _Compressor | None = None
+
+    async def run(self, receive) -> None:
+        await self.middleware.app(self.scope, receive, self.on_send)
+
+    def _headers(self) -> dict[bytes, bytes]:
+        return {name.lower(): value for name, value in self.start.get("headers", [])}
+
+    def _compressed_start(self, length: int | None) -> dict:
+        headers = [
+            (name, value) for name, value in self.start.get("headers", [])
+            if name.lower() not in (b"content-length", b"vary")
+        ]
+        vary = self._headers().get(b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return {**self.start, "headers": headers}
+
+    async def on_send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = self._headers()
+            content_type = headers.get(b"content-type", b"")
+            self.passthrough = (
+                b"content-encoding" in headers
+                or content_type.startswith(b"text/event-stream")
+                or content_type.startswith(PRECOMPRESSED_TYPES)
+                or message["status"] in (204, 304)
+                or message["status"] < 200
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None and not more_body:
+            # The whole body in one message: compress it only if it is worth it
+            if len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            compressed = self._compress_whole(body)
+            await self.send(self._compressed_start(len(compressed)))
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        if self.compressor is None:
+            self.compressor = _Compressor(self.encoding)
+            await self.send(self._compressed_start(None))
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compress_whole(self, body: bytes) -> bytes:
+        path = self.scope["path"]
+        if path not in IMMUTABLE_PATHS or self.start["status"] != 200:
+            return compress(body, self.encoding)
+        cache = self.middleware._immutable_cache
+        # Keyed on the body too, so a regenerated schema is never served stale
+        key = (path, self.encoding, zlib.crc32(body).to_bytes(4, "little") + len(body).to_bytes(8, "little"))
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = cache[key] = compress(body, self.encoding)
+        return compressed
@@ -0,0 +1,74 @@
+import os
+
+# Path of the binary snapshot to mmap at startup (empty: build the mock dataset)
+SNAPSHOT_PATH: str = os.environ.get("MOCK_SOCIAL_SNAPSHOT_PATH", "")
+
+# Seconds between periodic snapshots of the live store (0 disables it)
+SNAPSHOT_INTERVAL: float = float(os.environ.get("MOCK_SOCIAL_SNAPSHOT_INTERVAL", "0"))
+
+# Version of the in-memory dataset every process shares, used as its ETag epoch (empty: a digest of the data)
+DATASET_VERSION: str = os.environ.get("MOCK_SOCIAL_DATASET_VERSION", "")
+
+# Token-bucket rate limits per client (tokens per second, bucket size)
+RATE_LIMIT_API_RATE: float = float(os.environ.get("MOCK_SOCIAL_RATE_LIMIT_API_RATE", "20"))
+RATE_LIMIT_API_BURST: int = int(os.environ.get("MOCK_SOCIAL_RATE_LIMIT_API_BURST", "40"))
+RATE_LIMIT_UPSTAR_RATE: float = float(os.environ.get("MOCK_SOCIAL_RATE_LIMIT_UPSTAR_RATE", "2"))
+RATE_LIMIT_UPSTAR_BURST: int = int(os.environ.get("MOCK_SOCIAL_RATE_LIMIT_UPSTAR_BURST", "10"))
+
+# Redis URL shared by every worker's rate limiter (empty: per-process buckets)
+RATE_LIMIT_REDIS_URL: str = os.environ.get("MOCK_SOCIAL_RATE_LIMIT_REDIS_URL", "")
+
+# Comma-separated API keys that get their own bucket; other clients are limited by IP
+RATE_LIMIT_API_KEYS: frozenset[str] = frozenset(filter(None, os.environ.get("MOCK_SOCIAL_RATE_LIMIT_API_KEYS", "").split(",")))
+
+# Identify clients by the first X-Forwarded-For hop (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED_FOR: bool = os.environ.get("MOCK_SOCIAL_RATE_LIMIT_TRUST_FORWARDED_FOR", "") == "1"
+
+# Comma-separated upstream path prefixes /upstar forwards (empty: any path); other paths get a 404
+PROXY_PREFIXES: tuple[str, ...] = tuple(filter(None, os.environ.get("MOCK_SOCIAL_PROXY_PREFIXES", "").split(","))) or ("",)
+
+# Maximum concurrent /upstar calls, and how long a call may wait for a slot
+UPSTREAM_CONCURRENCY: int = int(os.environ.get("MOCK_SOCIAL_UPSTREAM_CONCURRENCY", "16"))
+UPSTREAM_MAX_WAIT: float = float(os.environ.get("MOCK_SOCIAL_UPSTREAM_MAX_WAIT", "2"))
+
+# Storage backend for the users: "memory" or "sqlite"
+STORE_BACKEND: str = os.environ.get("MOCK_SOCIAL_STORE", "memory")
+
+# SQLite database file, seeded with the mock dataset when empty
+SQLITE_PATH: str = os.environ.get("MOCK_SOCIAL_SQLITE_PATH", "mock_social.db")
+
+# Threads for blocking store and file calls
+EXECUTOR_THREADS: int = int(os.environ.get("MOCK_SOCIAL_EXECUTOR_THREADS", "8"))
+
+# Log whenever the event loop is blocked for longer than this many milliseconds
+LOOP_LAG_THRESHOLD_MS: float = float(os.environ.get("MOCK_SOCIAL_LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_LAG_INTERVAL: float = float(os.environ.get("MOCK_SOCIAL_LOOP_LAG_INTERVAL", "0.5"))
+
+# Serve approximate hashtag stats from sketches, keeping this many days of them
+HASHTAG_STATS_ENABLED: bool = os.environ.get("MOCK_SOCIAL_HASHTAG_STATS", "1") == "1"
+HASHTAG_STATS_RETENTION_DAYS: int = int(os.environ.get("MOCK_SOCIAL_HASHTAG_STATS_RETENTION_DAYS", "7"))
+
+# Longest time clients and CDNs may reuse a verification response without
+# revalidating it; never extends past the next Paris midnight
+HTTP_CACHE_MAX_AGE: int = int(os.environ.get("MOCK_SOCIAL_HTTP_CACHE_MAX_AGE", "60"))
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE: int = int(os.environ.get("MOCK_SOCIAL_COMPRESSION_MIN_SIZE", "500"))
+
+# Compression levels; brotli and zstd are only used when installed
+COMPRESSION_GZIP_LEVEL: int = int(os.environ.get("MOCK_SOCIAL_COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY: int = int(os.environ.get("MOCK_SOCIAL_COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL: int = int(os.environ.get("MOCK_SOCIAL_COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Requests worked on at once; at most UPSTREAM_CONCURRENCY of them may be proxied /upstar calls
+ADMISSION_MAX_IN_FLIGHT: int = int(os.environ.get("MOCK_SOCIAL_ADMISSION_MAX_IN_FLIGHT", "64"))
+
+# Requests each lane may queue, and how long one may wait unless its client sets a shorter deadline
+ADMISSION_QUEUE_SIZE: int = int(os.environ.get("MOCK_SOCIAL_ADMISSION_QUEUE_SIZE", "256"))
+ADMISSION_MAX_WAIT: float = float(os.environ.get("MOCK_SOCIAL_ADMISSION_MAX_WAIT", "1"))
+
+# Rows per record batch (Parquet row group) in exports, and exports run at once;
+# an export waits at most EXPORT_MAX_WAIT seconds for its turn
+EXPORT_BATCH_SIZE: int = int(os.environ.get("MOCK_SOCIAL_EXPORT_BATCH_SIZE", "10000"))
+EXPORT_CONCURRENCY: int = int(os.environ.get("MOCK_SOCIAL_EXPORT_CONCURRENCY", "2"))
+EXPORT_MAX_WAIT: float = float(os.environ.get("MOCK_SOCIAL_EXPORT_MAX_WAIT", "1"))
@@ -0,0 +1,92 @@
+"""
+Keeps blocking work off the event loop.
+
+Every endpoint runs on the same event loop, so a single blocking call (a
+SQLite query, a file write) or long computation stalls every other request.
+`run_blocking` sends blocking calls to a bounded thread pool, and `run_store`
+picks the right path for the configured store. `LoopLagMonitor` logs whenever
+the loop was blocked for longer than the configured threshold.
+
+There is deliberately no process pool: the heavier computations (leaderboard,
+hashtag sketch and rollup updates) all work on state that lives in this
+process, which would cost more to pickle to a worker and back than to update
+in place. They are kept incremental instead, so none of them holds the loop
+for long.
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import ParamSpec, TypeVar
+
+from mock_social_api import config
+from mock_social_api.store import get_store
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+_thread_pool: ThreadPoolExecutor | None = None
+
+
+def thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=config.EXECUTOR_THREADS, thread_name_prefix="blocking")
+    return _thread_pool
+
+
+async def run_blocking(fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Run a blocking call in the bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(thread_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_store(fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Call a store method, off the loop only when the store may block."""
+    if get_store().blocking:
+        return await run_blocking(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def shutdown_pools() -> None:
+    global _thread_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag by sleeping for `interval` seconds and checking how
+    late it wakes up. Any lag above `threshold` seconds means a callback held
+    the loop for roughly that long and is logged as a warning.
+    """
+
+    def __init__(self, interval: float, threshold: float, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.clock = clock
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+
+    def record(self, lag: float) -> None:
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self.slow_callbacks += 1
+            logger.warning("Event loop was blocked for %.1f ms", lag * 1000)
+
+    async def run(self) -> None:
+        while True:
+            started = self.clock()
+            await asyncio.sleep(self.interval)
+            self.record(self.clock() - started - self.interval)
+
+
+loop_lag_monitor = LoopLagMonitor(
+    interval=config.LOOP_LAG_INTERVAL,
+    threshold=config.LOOP_LAG_THRESHOLD_MS / 1000,
+)
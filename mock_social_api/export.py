@@ -0,0 +1,283 @@
+"""
+Columnar export of the dataset for offline analytics.
+
+A table (users, stories, posts or comments, see `EXPORT_COLUMNS`) is written as
+an Arrow IPC stream or a Parquet file, one record batch (one Parquet row group)
+per `EXPORT_BATCH_SIZE` rows. The store yields the rows a batch at a time with
+the hashtag, time range and user filters applied by its own indexes, so an
+export holds at most one batch and one user's rows in memory whatever the
+size of the dataset.
+
+Over HTTP the writer runs in the blocking thread pool and hands its output to
+the response through a small bounded queue: the event loop only moves
+finished chunks, and a slow client slows the writer down instead of letting
+chunks pile up. The export ends early, releasing its thread, when the client
+goes away, and a writer that fails aborts the response rather than ending it
+as if the file were complete.
+
+From the command line:
+
+    python -m mock_social_api.export posts posts.parquet --hashtag '#vacation' --since 2024-10-01
+
+`pyarrow` is an optional dependency, only imported when an export runs.
+"""
+import argparse
+import asyncio
+import enum
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import TYPE_CHECKING, BinaryIO
+
+from mock_social_api import config
+from mock_social_api.store import EXPORT_COLUMNS, ExportFilter, UserStore
+
+if TYPE_CHECKING:
+    import pyarrow
+
+logger = logging.getLogger(__name__)
+
+# Bytes handed to the response at a time, and chunks buffered ahead of a slow client
+_CHUNK_SIZE = 64 * 1024
+_QUEUED_CHUNKS = 4
+# Seconds between checks for a cancelled export while the writer waits on a full queue
+_CANCEL_POLL = 0.5
+
+
+class ExportTable(str, enum.Enum):
+    users = "users"
+    stories = "stories"
+    posts = "posts"
+    comments = "comments"
+
+
+class ExportFormat(str, enum.Enum):
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+MEDIA_TYPES = {
+    ExportFormat.arrow: "application/vnd.apache.arrow.stream",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+EXTENSIONS = {
+    ExportFormat.arrow: ".arrows",
+    ExportFormat.parquet: ".parquet",
+}
+
+
+class ExportUnavailable(RuntimeError):
+    """Raised when pyarrow is not installed."""
+
+
+class ExportFailed(RuntimeError):
+    """Raised by an `ExportStream` whose writer failed, in place of its remaining chunks."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ExportUnavailable("Exports need the optional pyarrow package") from None
+    return pyarrow
+
+
+def schema(table: ExportTable) -> "pyarrow.Schema":
+    pa = _pyarrow()
+    types = {
+        "username": pa.string(),
+        "private": pa.bool_(),
+        "followers": pa.int64(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "content": pa.string(),
+        "hashtags": pa.list_(pa.string()),
+        "likes": pa.int64(),
+        "link": pa.string(),
+        "post_username": pa.string(),
+        "post_timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(column, types[column]) for column in EXPORT_COLUMNS[table.value]])
+
+
+def write_export(
+    store: UserStore,
+    table: ExportTable,
+    filters: ExportFilter,
+    sink: str | BinaryIO,
+    format: ExportFormat,
+    batch_size: int | None = None,
+) -> int:
+    """Write the matching rows of `table` to `sink` (a path or binary file), returning the row count."""
+    pa = _pyarrow()
+    table_schema = schema(table)
+    if format is ExportFormat.parquet:
+        writer = pa.parquet.ParquetWriter(sink, table_schema, compression="zstd")
+    else:
+        compression = "zstd" if pa.Codec.is_available("zstd") else None
+        writer = pa.ipc.new_stream(sink, table_schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+    rows = 0
+    with writer:
+        for batch in store.export_rows(table.value, filters, batch_size or config.EXPORT_BATCH_SIZE):
+            columns = zip(*batch)
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, table_schema)],
+                schema=table_schema,
+            ))
+            rows += len(batch)
+    return rows
+
+
+class _Closed(Exception):
+    """The export was cancelled; raised inside the writer to stop it."""
+
+
+class _QueueSink:
+    """
+    Write-only file object feeding an asyncio queue from a worker thread.
+
+    Small writes are gathered into chunks of about `_CHUNK_SIZE` bytes, and a
+    full queue blocks the writer until the response has sent a chunk.
+    """
+
+    closed = False
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop) -> None:
+        self._queue = queue
+        self._loop = loop
+        self._buffer = bytearray()
+        self.cancelled = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= _CHUNK_SIZE:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self, error: Exception | None = None) -> None:
+        """Send what is left, then the end of the stream, or `error` in its place."""
+        try:
+            if self._buffer and error is None:
+                self._put(bytes(self._buffer))
+            self._buffer.clear()
+            self._put(error)
+        except _Closed:
+            pass
+
+    def _put(self, chunk: bytes | Exception | None) -> None:
+        if self.cancelled:
+            raise _Closed
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(chunk), self._loop)
+        while True:
+            try:
+                return future.result(timeout=_CANCEL_POLL)
+            except TimeoutError:
+                # Also gives up if the loop stopped before the response did
+                if self.cancelled or self._loop.is_closed():
+                    future.cancel()
+                    raise _Closed
+
+
+class ExportStream:
+    """
+    Chunks of an export, written by a worker thread while they are iterated.
+
+    `cancel` stops the writer. Iteration calls it when it ends early, but a
+    response cancelled mid-send never resumes its iterator, so the owner of
+    the response should call it too once the response is over.
+    """
+
+    def __init__(self, store: UserStore, table: ExportTable, filters: ExportFilter, format: ExportFormat) -> None:
+        self.store = store
+        self.table = table
+        self.filters = filters
+        self.format = format
+        # Chunks, then None once the export is complete or the error that stopped it
+        self._queue: asyncio.Queue[bytes | Exception | None] = asyncio.Queue(maxsize=_QUEUED_CHUNKS)
+        self._sink = _QueueSink(self._queue, asyncio.get_running_loop())
+        self._task: asyncio.Task | None = None
+
+    def _produce(self) -> int:
+        try:
+            rows = write_export(self.store, self.table, self.filters, self._sink, self.format)
+        except _Closed:
+            raise
+        except Exception as e:
+            self._sink.finish(e)
+            raise
+        self._sink.finish()
+        return rows
+
+    async def _run(self) -> None:
+        from mock_social_api.executor import run_blocking
+
+        try:
+            rows = await run_blocking(self._produce)
+            logger.info("Exported %d %s rows as %s", rows, self.table.value, self.format.value)
+        except _Closed:
+            logger.info("Export of %s cancelled", self.table.value)
+        except Exception:
+            logger.exception("Export of %s failed", self.table.value)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self._task = asyncio.create_task(self._run())
+        try:
+            while (chunk := await self._queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    # Aborts the response, so the client never takes a truncated file for a whole one
+                    raise ExportFailed(f"Export of {self.table.value} failed") from chunk
+                yield chunk
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        """Stop the writer; harmless once the export is complete."""
+        self._sink.cancelled = True
+        # Let a put the writer is blocked on (at most one) through without a reader
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m mock_social_api.export", description="Export a table of the dataset")
+    parser.add_argument("table", choices=[table.value for table in ExportTable])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--format", choices=[format.value for format in ExportFormat],
+        help="default: parquet for .parquet paths, arrow otherwise",
+    )
+    parser.add_argument("--user", action="append", dest="users", help="export only this user (repeatable)")
+    parser.add_argument("--hashtag", help="export only stories and posts tagged with it, and their comments")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="earliest timestamp (inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="latest timestamp (exclusive)")
+    parser.add_argument("--batch-size", type=int, default=config.EXPORT_BATCH_SIZE, help="rows per row group")
+    args = parser.parse_args()
+
+    from mock_social_api.hashtags import canonicalize_query
+    from mock_social_api.store import get_store
+
+    if args.format is not None:
+        format = ExportFormat(args.format)
+    else:
+        format = ExportFormat.parquet if args.path.endswith(EXTENSIONS[ExportFormat.parquet]) else ExportFormat.arrow
+    filters = ExportFilter(
+        usernames=frozenset(args.users) if args.users else None,
+        hashtag=canonicalize_query(args.hashtag) if args.hashtag else None,
+        since=args.since,
+        until=args.until,
+    )
+    rows = write_export(get_store(), ExportTable(args.table), filters, args.path, format, args.batch_size)
+    print(f"Wrote {rows} {args.table} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
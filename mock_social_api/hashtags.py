@@ -0,0 +1,91 @@
+"""
+Hashtag extraction and normalization.
+
+A hashtag is `#` followed by word characters, at the start of the text or
+after a non-word character (so `mail#tag` holds none). Its canonical form is
+`#` followed by its NFKC-normalized, case-folded text, so `#Vacation`,
+`#VACATION` and the full-width `＃ｖａｃａｔｉｏｎ` are all `#vacation`. Hashtags are normalized once on the way in, when a story or
+post is validated (the ones found in its content are added to its
+`hashtags`), and query input is canonicalized once per request with
+`canonicalize_query`, so everything downstream compares canonical forms.
+
+`registry` interns canonical hashtags to small integers. In-memory indexes key
+on those IDs, so matching a hashtag against an item is an int comparison.
+"""
+import re
+import threading
+import unicodedata
+from collections.abc import Iterable
+from urllib.parse import unquote
+
+# After NFKC the full-width `＃` is `#`; `\w` matches Unicode letters and digits
+HASHTAG_PATTERN = re.compile(r"(?<!\w)#(\w+)")
+
+
+def normalize(hashtag: str) -> str:
+    """
+    Canonical form of a single hashtag, with or without its leading `#`, read
+    with the same grammar as hashtags in content: `#Vacation!` is `#vacation`.
+    Text that starts with no hashtag gives "".
+    """
+    text = unicodedata.normalize("NFKC", hashtag).strip().casefold()
+    match = HASHTAG_PATTERN.match(text if text.startswith("#") else f"#{text}")
+    return f"#{match[1]}" if match else ""
+
+
+def extract_hashtags(content: str) -> list[str]:
+    """Canonical hashtags in `content`, in order of first appearance."""
+    if "#" not in content and "＃" not in content:
+        return []
+    text = unicodedata.normalize("NFKC", content).casefold()
+    return list(dict.fromkeys(f"#{match}" for match in HASHTAG_PATTERN.findall(text)))
+
+
+def merge_hashtags(hashtags: Iterable[str], content: str) -> list[str]:
+    """Canonicalize `hashtags` and add any more found in `content`, without duplicates or empty tags."""
+    listed = filter(None, (normalize(hashtag) for hashtag in hashtags))
+    return list(dict.fromkeys([*listed, *extract_hashtags(content)]))
+
+
+def canonicalize_query(hashtag: str) -> str:
+    """
+    Canonical form of a hashtag query parameter, which may arrive as
+    `#vacation`, `vacation`, `#Vacation` or, double-encoded, `%23vacation`.
+    A query that is no hashtag gives "", which matches nothing.
+    """
+    if "%" in hashtag:
+        hashtag = unquote(hashtag)
+    return normalize(hashtag)
+
+
+class HashtagRegistry:
+    """Interns canonical hashtags to integer IDs, stable for the process lifetime."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: dict[str, int] = {}
+        self._names: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, hashtag: str) -> int:
+        """ID of a canonical hashtag, assigning one on first sight."""
+        tag_id = self._ids.get(hashtag)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self._ids.get(hashtag)
+                if tag_id is None:
+                    tag_id = self._ids[hashtag] = len(self._names)
+                    self._names.append(hashtag)
+        return tag_id
+
+    def lookup(self, hashtag: str) -> int | None:
+        """ID of a canonical hashtag, or None if nothing ever used it."""
+        return self._ids.get(hashtag)
+
+    def name(self, tag_id: int) -> str:
+        return self._names[tag_id]
+
+
+registry = HashtagRegistry()
@@ -0,0 +1,64 @@
+"""
+HTTP validators for the verification endpoints.
+
+A verification response only changes when the user's data changes or the
+current timeframe rolls over at Paris midnight, so its ETag is derived from
+the request, the store's dataset epoch and data version of the users it
+reads, and today's midnight; processes serving the same data therefore agree
+on it. A request whose `If-None-Match` matches gets a 304 before the
+endpoint runs. `Cache-Control: max-age` lets clients and CDNs reuse a response
+for `HTTP_CACHE_MAX_AGE` seconds, but never past the next midnight rollover.
+"""
+from collections.abc import Callable
+from datetime import datetime, timezone
+from hashlib import blake2b
+
+from fastapi import HTTPException, Request, Response
+
+from mock_social_api import config
+from mock_social_api.store import get_store
+from mock_social_api.utils import get_france_midnight, get_france_next_midnight
+
+
+def compute_etag(request: Request, versions: list[str], epoch: str, boundary: datetime) -> str:
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    key = f"{request.url.path}?{query}|{epoch}|{versions}|{boundary.isoformat()}"
+    # Weak, since compression may change the bytes but not the meaning
+    return f'W/"{blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def cache_max_age(now: datetime) -> int:
+    """`max-age` at `now`: `HTTP_CACHE_MAX_AGE`, cut short by the next midnight rollover."""
+    seconds_to_rollover = int((get_france_next_midnight(now) - now).total_seconds())
+    return max(0, min(config.HTTP_CACHE_MAX_AGE, seconds_to_rollover))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def cache_validators(*accounts: str) -> Callable[[Request, Response], None]:
+    """
+    Dependency adding `ETag` and `Cache-Control` to a route, answering 304 when
+    the client's copy is current. The response is assumed to depend on the
+    `username` query parameter and on `accounts`.
+    """
+
+    # Not a coroutine, so FastAPI runs it in the thread pool: reading the store's
+    # epoch and versions may hash the dataset or hit the disk
+    def dependency(request: Request, response: Response) -> None:
+        store = get_store()
+        usernames = [request.query_params.get("username", ""), *accounts]
+        now = datetime.now(timezone.utc)
+        boundary = get_france_midnight(now)
+        etag = compute_etag(request, [store.version(username) for username in usernames], store.epoch, boundary)
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={cache_max_age(now)}"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
@@ -0,0 +1,223 @@
+"""
+Incrementally maintained top-K leaderboards.
+
+For each timeframe (since today's midnight, since last Sunday's midnight) we
+keep, per hashtag, the likes every user collected on stories and posts tagged
+with it, plus how often each hashtag was used. Scores live in `TopK`, a heap
+of (-score, key) entries, so a new like costs O(log n) and reading the top K
+entries O(K log n) however many users there are.
+
+The boards are built from the store on first use, in the thread pool since
+that scans every user, and stories and posts are fed in from store writes
+afterwards. Each window also remembers what every user contributed, so a
+replaced user is taken back out and added again without touching anyone
+else. When a timeframe boundary passes, that timeframe's boards are dropped
+and start again from zero; nothing published before the new boundary
+belongs in them.
+"""
+import threading
+from collections.abc import Callable
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+
+from mock_social_api.executor import run_blocking
+from mock_social_api.hashtags import registry
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store import StoreEvent, UserStore, as_utc, get_store
+from mock_social_api.utils import get_timeframe_start
+
+TIMEFRAMES = ("today_midnight", "last_sunday_midnight")
+
+
+class TopK:
+    """
+    Scores by key, ranked by (-score, key). Updates push a new heap entry and
+    leave the old one to be skipped as stale, so they cost O(log n); the heap
+    is rebuilt from the scores once stale entries outnumber live ones.
+    """
+
+    def __init__(self) -> None:
+        self._scores: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def add(self, key: str, delta: int) -> None:
+        score = self._scores.get(key, 0) + delta
+        self._scores[key] = score
+        heappush(self._heap, (-score, key))
+        self._compact()
+
+    def discard(self, key: str) -> None:
+        if self._scores.pop(key, None) is not None:
+            self._compact()
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._scores) + 16:
+            self._heap = [(-score, key) for key, score in self._scores.items()]
+            heapify(self._heap)
+
+    def score(self, key: str) -> int:
+        return self._scores.get(key, 0)
+
+    def top(self, k: int) -> list[tuple[str, int]]:
+        ranked: list[tuple[int, str]] = []
+        while self._heap and len(ranked) < k:
+            entry = heappop(self._heap)
+            neg_score, key = entry
+            # Stale entries (and duplicates of a live one) are dropped for good
+            if self._scores.get(key) == -neg_score and (not ranked or ranked[-1] != entry):
+                ranked.append(entry)
+        for entry in ranked:
+            heappush(self._heap, entry)
+        return [(key, -neg_score) for neg_score, key in ranked]
+
+
+class _Window:
+    def __init__(self, start: datetime) -> None:
+        self.start = start
+        self.start_utc = as_utc(start)
+        self.likes_by_hashtag: dict[int, TopK] = {}  # keyed by interned hashtag ID
+        self.hashtag_mentions = TopK()
+        # username -> hashtag ID -> [likes, mentions] that user added
+        self.contributions: dict[str, dict[int, list[int]]] = {}
+
+
+class Leaderboards:
+    """
+    Top users per hashtag and top hashtags, per timeframe.
+
+    `clock` returns the current time; it is injectable so rollovers can be
+    tested without waiting for midnight.
+    """
+
+    def __init__(self, store: UserStore, clock: Callable[[], datetime] | None = None) -> None:
+        self.store = store
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Held for a whole build, so concurrent first reads build once
+        self._build_lock = threading.Lock()
+        self._windows: dict[str, _Window] = {}
+        self._built = False
+        # Users written while a build scans the store, brought up to date once it is done
+        self._written_during_build: set[str] | None = None
+
+    def _now(self) -> datetime | None:
+        return self.clock() if self.clock is not None else None
+
+    def _window(self, timeframe: str) -> _Window:
+        """Return the timeframe's current window, rolling it over at the boundary."""
+        start = get_timeframe_start(timeframe, self._now())
+        window = self._windows.get(timeframe)
+        if window is None or window.start != start:
+            window = self._windows[timeframe] = _Window(start)
+        return window
+
+    def _add(self, windows: list[_Window], username: str, item: IPost | IStory) -> None:
+        if not item.hashtags:
+            return
+        timestamp = as_utc(item.timestamp)
+        for window in windows:
+            if timestamp < window.start_utc:
+                continue
+            for hashtag in set(item.hashtags):
+                tag_id = registry.intern(hashtag)
+                board = window.likes_by_hashtag.get(tag_id)
+                if board is None:
+                    board = window.likes_by_hashtag[tag_id] = TopK()
+                board.add(username, item.likes)
+                window.hashtag_mentions.add(hashtag, 1)
+                contribution = window.contributions.setdefault(username, {}).setdefault(tag_id, [0, 0])
+                contribution[0] += item.likes
+                contribution[1] += 1
+
+    def _replace_user(self, windows: list[_Window], username: str, user: IUser) -> None:
+        """Take out everything the user contributed, then add its current items."""
+        for window in windows:
+            for tag_id, (_, mentions) in window.contributions.pop(username, {}).items():
+                board = window.likes_by_hashtag[tag_id]
+                board.discard(username)
+                if not board:
+                    del window.likes_by_hashtag[tag_id]
+                hashtag = registry.name(tag_id)
+                if window.hashtag_mentions.score(hashtag) == mentions:
+                    window.hashtag_mentions.discard(hashtag)
+                else:
+                    window.hashtag_mentions.add(hashtag, -mentions)
+        for item in (*user.stories, *user.posts):
+            self._add(windows, username, item)
+
+    async def ready(self) -> None:
+        """Build the boards in the thread pool if needed, so the full scan never holds the event loop."""
+        if not self._built:
+            await run_blocking(self.build)
+
+    def build(self) -> None:
+        """Build the boards from every user in the store; writes keep flowing meanwhile."""
+        with self._build_lock:
+            with self._lock:
+                if self._built:
+                    return
+                self._written_during_build = set()
+            now = self._now()
+            windows = {timeframe: _Window(get_timeframe_start(timeframe, now)) for timeframe in TIMEFRAMES}
+            for username in self.store.usernames():
+                user = self.store.get_user(username)
+                if user is not None:
+                    for item in (*user.stories, *user.posts):
+                        self._add(list(windows.values()), username, item)
+            with self._lock:
+                # The scan may or may not have seen these writes; replacing the users settles it
+                for username in self._written_during_build:
+                    user = self.store.get_user(username)
+                    if user is not None:
+                        self._replace_user(list(windows.values()), username, user)
+                self._written_during_build = None
+                self._windows = windows
+                self._built = True
+
+    def on_store_event(self, event: StoreEvent) -> None:
+        """Store listener: fold each new story, post or replaced user into the boards."""
+        with self._lock:
+            if not self._built:
+                # The build in progress, or the first read, picks the write up
+                if self._written_during_build is not None:
+                    self._written_during_build.add(event.username)
+                return
+            windows = [self._window(timeframe) for timeframe in TIMEFRAMES]
+            if event.kind == "user":
+                self._replace_user(windows, event.username, event.item)
+            else:
+                self._add(windows, event.username, event.item)
+
+    def top_users(self, hashtag: str, timeframe: str, k: int) -> tuple[datetime, list[tuple[str, int]]]:
+        """The `k` users with the most likes on `hashtag` in the timeframe, and its start."""
+        if not self._built:
+            self.build()
+        with self._lock:
+            window = self._window(timeframe)
+            tag_id = registry.lookup(hashtag)
+            board = window.likes_by_hashtag.get(tag_id) if tag_id is not None else None
+            return window.start, board.top(k) if board is not None else []
+
+    def top_hashtags(self, timeframe: str, k: int) -> tuple[datetime, list[tuple[str, int]]]:
+        """The `k` most used hashtags in the timeframe, and its start."""
+        if not self._built:
+            self.build()
+        with self._lock:
+            window = self._window(timeframe)
+            return window.start, window.hashtag_mentions.top(k)
+
+
+_leaderboards: Leaderboards | None = None
+
+
+def get_leaderboards() -> Leaderboards:
+    """Return the leaderboards of the process-wide store, subscribing them on first use."""
+    global _leaderboards
+    store = get_store()
+    if _leaderboards is None or _leaderboards.store is not store:
+        _leaderboards = Leaderboards(store)
+        store.add_listener(_leaderboards.on_store_event)
+    return _leaderboards
@@ -1,8 +1,49 @@
-from fastapi import FastAPI, Request
-import httpx
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from mock_social_api import config
+from mock_social_api.admission import DEADLINE_HEADER, AdmissionMiddleware, remaining_budget
 from mock_social_api.api.v1.api import api_router as api_router_v1
+from mock_social_api.compression import CompressionMiddleware
+from mock_social_api.executor import loop_lag_monitor, shutdown_pools
+from mock_social_api.openapi import use_precomputed_openapi
+from mock_social_api.proxy import RESPONSE_HEADERS, canonical_query, forward_headers, match_route, project, proxy_methods
+from mock_social_api.ratelimit import RateLimitMiddleware, upstream_limiter
+from mock_social_api.rollups import daily_rollups
+from mock_social_api.store import close_store, get_store
+from mock_social_api.subscriptions import hub
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background tasks with the app and cancel them on shutdown."""
+    tasks = [asyncio.create_task(loop_lag_monitor.run())]
+    if config.SNAPSHOT_PATH and config.SNAPSHOT_INTERVAL > 0:
+        from mock_social_api.snapshot import snapshot_periodically
+
+        tasks.append(asyncio.create_task(
+            snapshot_periodically(get_store(), config.SNAPSHOT_PATH, config.SNAPSHOT_INTERVAL)
+        ))
+    hub.start()
+    daily_rollups.start()
+    yield
+    await daily_rollups.stop()
+    await hub.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    shutdown_pools()
+    close_store()
+
+
+app = FastAPI(lifespan=lifespan)
+# Innermost, so requests rejected by the rate limiter never take a slot or queue
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(RateLimitMiddleware)
+# Added last so it wraps everything, including rate limit responses
+app.add_middleware(CompressionMiddleware)
 
 TARGET_BASE_URL = "http://arntreal.upstar.club:2001"
 
@@ -18,34 +59,74 @@ def read_root() -> str:
     """
     return "Active"
 
-@app.api_route("/upstar/{path:path}", methods=["GET"])
+@app.api_route("/upstar/{path:path}", methods=proxy_methods())
 async def proxy(request: Request, path: str):
     """
-    This endpoint acts as a proxy, redirecting all incoming requests to the target base URL.
+    This endpoint acts as a proxy, redirecting incoming requests to the target base URL
+    as allowed by the matching route in `proxy.PROXY_ROUTES`.
     """
-    target_url = f"{TARGET_BASE_URL}/{path}?{request.query_params}"
+    import httpx  # only the proxy needs it, so keep it off the cold start path
+
+    route = match_route(path)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if request.method not in route.methods:
+        raise HTTPException(status_code=405, detail="Method Not Allowed")
+
+    query = canonical_query(route, request.query_params.multi_items())
+    target_url = f"{TARGET_BASE_URL}/{path}?{query}" if query else f"{TARGET_BASE_URL}/{path}"
     
     # Prepare the data for proxying the request
-    headers = dict(request.headers)
+    headers = forward_headers(route, request.headers)
+    # The body is relayed as the upstream encodes it, so only accept what the client does
+    headers.setdefault("accept-encoding", "identity")
     body = await request.body()
+
+    # Never wait on the upstream for longer than the client waits for us, and
+    # tell the upstream how long that is
+    timeout = route.timeout
+    remaining = remaining_budget(request)
+    if remaining is not None:
+        if remaining <= 0:
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+        timeout = min(timeout, remaining)
+        headers[DEADLINE_HEADER] = str(int(remaining * 1000))
     
+    # Held until the response is sent: the upstream slot, the client and its response
+    cleanup = AsyncExitStack()
+    streaming = False
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:  # Set timeout to 60 seconds
-            # Use request's method dynamically to forward the request
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=body
-            )
-        
-        # Forward the response back to the client
-        return response.json()
-
+        # Cap concurrent upstream calls so a slow upstream sheds load instead of piling up
+        await cleanup.enter_async_context(upstream_limiter.slot())
+        client = await cleanup.enter_async_context(httpx.AsyncClient(timeout=timeout))
+        # Use request's method dynamically to forward the request
+        upstream_request = client.build_request(method=request.method, url=target_url, headers=headers, content=body)
+        response = await client.send(upstream_request, stream=True)
+        cleanup.push_async_callback(response.aclose)
+        if route.fields is not None:
+            await response.aread()
+            # Only the fields clients use; compression happens on the way out
+            return JSONResponse(project(response.json(), route.fields), status_code=response.status_code)
+        streaming = True
     except httpx.RequestError as e:
         return {"error": "Proxy request failed", "detail": str(e)}
+    finally:
+        if not streaming:
+            await cleanup.aclose()
+
+    # Forward the response back to the client as it arrives, still encoded as the
+    # upstream sent it so it is neither decoded nor re-encoded here
+    forwarded = {name: value for name, value in response.headers.items() if name in RESPONSE_HEADERS}
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=forwarded,
+        background=BackgroundTask(cleanup.aclose),
+    )
 
 
 
 # Add Routers
-app.include_router(api_router_v1, prefix="/api/v1")
\ No newline at end of file
+app.include_router(api_router_v1, prefix="/api/v1")
+
+use_precomputed_openapi(app)
\ No newline at end of file
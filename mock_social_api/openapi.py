@@ -0,0 +1,47 @@
+"""
+Precomputed OpenAPI schema.
+
+FastAPI builds the schema on the first `/openapi.json` (and therefore `/docs`)
+request by walking every route and its models, which is noticeable on a cold
+serverless instance. The schema is generated ahead of time with
+
+    python -m mock_social_api.openapi
+
+and served from `openapi.json` next to this module. Regenerate it whenever a
+route or schema changes; `tests/test_startup.py` fails while it is stale.
+"""
+import json
+from pathlib import Path
+from typing import Any
+
+from fastapi import FastAPI
+
+OPENAPI_PATH = Path(__file__).with_name("openapi.json")
+
+
+def use_precomputed_openapi(app: FastAPI) -> None:
+    """Serve the precomputed schema for `app`, falling back to building it."""
+    build_openapi = app.openapi
+
+    def openapi() -> dict[str, Any]:
+        if app.openapi_schema is None:
+            if OPENAPI_PATH.exists():
+                app.openapi_schema = json.loads(OPENAPI_PATH.read_bytes())
+            else:
+                return build_openapi()
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+def dump_openapi(app: FastAPI) -> str:
+    """Build the schema for `app` from its routes and render it as JSON."""
+    app.openapi_schema = None
+    return json.dumps(FastAPI.openapi(app), indent=2, sort_keys=True) + "\n"
+
+
+if __name__ == "__main__":
+    from mock_social_api.main import app
+
+    OPENAPI_PATH.write_text(dump_openapi(app))
+    print(f"Wrote {OPENAPI_PATH}")
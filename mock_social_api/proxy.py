@@ -0,0 +1,99 @@
+"""
+Declarative route table for the `/upstar` proxy.
+
+Each `ProxyRoute` covers the upstream paths under a prefix and decides what
+may be forwarded there: which methods, which request headers, which query
+parameters (and their defaults, which are dropped), how long the upstream may
+take, and optionally which response fields clients actually use.
+
+Query strings are canonicalized (unknown and default-valued parameters
+dropped, the rest sorted), so requests that mean the same thing reach the
+upstream and any cache in front of it as the same URL. Only the headers in
+`FORWARDED_HEADERS` go upstream unless a route names its own, so cookies and
+other client state never leave this service. Routes are matched in order;
+after the declared ones come the prefixes in `config.PROXY_PREFIXES`, which
+forward any GET and default to the empty prefix, i.e. every path. A route for
+a hot upstream path would look like
+
+    ProxyRoute(
+        prefix="campaigns/",
+        timeout=10.0,
+        headers=frozenset({"accept", "accept-encoding", "authorization"}),
+        params=frozenset({"page", "size"}),
+        query_defaults={"page": "1"},
+        fields=("id", "name", "status"),
+    )
+"""
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlencode
+
+from mock_social_api import config
+
+# Never forwarded: they describe this hop, not the upstream request
+STRIPPED_HEADERS = frozenset({
+    "host", "content-length", "connection", "keep-alive", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "transfer-encoding", "upgrade",
+})
+
+# Request headers forwarded unless a route names its own: content negotiation and credentials
+FORWARDED_HEADERS = frozenset({"accept", "accept-encoding", "authorization", "content-type"})
+
+# Upstream response headers relayed to the client
+RESPONSE_HEADERS = ("content-type", "content-encoding", "vary")
+
+
+@dataclass(frozen=True)
+class ProxyRoute:
+    prefix: str  # upstream path prefix, without the leading slash
+    methods: frozenset[str] = frozenset({"GET"})
+    timeout: float = 60.0  # seconds
+    headers: frozenset[str] | None = FORWARDED_HEADERS  # request headers to forward, None for all
+    params: frozenset[str] | None = None  # query parameters to forward, None for all
+    query_defaults: Mapping[str, str] = field(default_factory=dict)  # dropped when sent with this value
+    fields: tuple[str, ...] | None = None  # top-level JSON fields to keep, None for the whole body
+
+
+# First matching prefix wins; paths no route covers get a 404
+PROXY_ROUTES: list[ProxyRoute] = [
+    # Declared routes go here, ahead of the configured prefixes
+    *(ProxyRoute(prefix=prefix) for prefix in config.PROXY_PREFIXES),
+]
+
+
+def proxy_methods(routes: list[ProxyRoute] = PROXY_ROUTES) -> list[str]:
+    return sorted(set().union(*(route.methods for route in routes)))
+
+
+def match_route(path: str, routes: list[ProxyRoute] = PROXY_ROUTES) -> ProxyRoute | None:
+    for route in routes:
+        if path.startswith(route.prefix):
+            return route
+    return None
+
+
+def forward_headers(route: ProxyRoute, headers: Mapping[str, str]) -> dict[str, str]:
+    return {
+        name: value for name, value in headers.items()
+        if name not in STRIPPED_HEADERS and (route.headers is None or name in route.headers)
+    }
+
+
+def canonical_query(route: ProxyRoute, items: list[tuple[str, str]]) -> str:
+    """Drop unknown and default-valued parameters and sort the rest by name."""
+    kept = [
+        (name, value) for name, value in items
+        if (route.params is None or name in route.params) and route.query_defaults.get(name) != value
+    ]
+    # A stable sort on the name keeps the order of a repeated parameter's values
+    return urlencode(sorted(kept, key=lambda item: item[0]))
+
+
+def project(payload: Any, fields: tuple[str, ...]) -> Any:
+    """Keep only `fields` of a JSON object, or of each object in a JSON array."""
+    if isinstance(payload, list):
+        return [project(item, fields) for item in payload]
+    if isinstance(payload, dict):
+        return {name: payload[name] for name in fields if name in payload}
+    return payload
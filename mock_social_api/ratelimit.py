@@ -0,0 +1,284 @@
+"""
+Token-bucket rate limiting and upstream concurrency control.
+
+Every request whose path matches a route policy takes one token from the
+bucket of its client: its API key when the key is one of the configured
+`RATE_LIMIT_API_KEYS`, its IP address otherwise, so made-up keys neither
+escape the limit nor crowd real clients out of the buckets. Buckets
+refill continuously at `rate` tokens per second up to `burst`. Responses carry
+`RateLimit-Limit`, `RateLimit-Remaining` and `RateLimit-Reset` headers, and a
+rejected request gets a 429 with `Retry-After`.
+
+Bucket state lives in a backend: `MemoryBackend` keeps it in-process, while
+`SharedBackend` keeps it in a Redis-compatible server so every worker draws
+from the same buckets. `LocalSharedClient` stands in for that server in tests
+and local development.
+"""
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from fastapi import HTTPException
+
+from mock_social_api import config
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    name: str
+    rate: float  # tokens added per second
+    burst: int  # bucket capacity
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    reset_after: float  # seconds until the bucket is full again
+    retry_after: float  # seconds until a request would be allowed (0 if allowed)
+
+
+# First matching path prefix wins; unmatched paths are not limited
+ROUTE_POLICIES: list[tuple[str, RateLimitPolicy]] = [
+    ("/upstar/", RateLimitPolicy(name="upstar", rate=config.RATE_LIMIT_UPSTAR_RATE, burst=config.RATE_LIMIT_UPSTAR_BURST)),
+    ("/api/v1/", RateLimitPolicy(name="api_v1", rate=config.RATE_LIMIT_API_RATE, burst=config.RATE_LIMIT_API_BURST)),
+]
+
+
+def take_token(tokens: float, updated_at: float, now: float, policy: RateLimitPolicy) -> tuple[float, RateLimitResult]:
+    """Refill a bucket up to `now` and try to take one token from it."""
+    tokens = min(policy.burst, tokens + (now - updated_at) * policy.rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return tokens, RateLimitResult(
+        allowed=allowed,
+        remaining=int(tokens),
+        reset_after=(policy.burst - tokens) / policy.rate,
+        retry_after=0.0 if allowed else (1 - tokens) / policy.rate,
+    )
+
+
+class RateLimitBackend(Protocol):
+    async def acquire(self, key: str, policy: RateLimitPolicy) -> RateLimitResult: ...
+
+
+class MemoryBackend:
+    """Per-process buckets, evicting the least recently used beyond `max_keys`."""
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        now = self.clock()
+        bucket_key = f"{policy.name}:{key}"
+        tokens, updated_at = self._buckets.pop(bucket_key, (policy.burst, now))
+        tokens, result = take_token(tokens, updated_at, now, policy)
+        self._buckets[bucket_key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return result
+
+
+# Same algorithm as `take_token`, run atomically inside the shared server.
+# Returns [allowed, tokens * 1000] so no precision is lost to integer replies.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, math.floor(tokens * 1000)}
+"""
+
+
+class SharedClient(Protocol):
+    """The subset of `redis.asyncio.Redis` used by `SharedBackend`."""
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any: ...
+
+
+class SharedBackend:
+    """Buckets shared by every worker, stored in a Redis-compatible server."""
+
+    def __init__(self, client: SharedClient, prefix: str = "ratelimit") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def acquire(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        allowed, millitokens = await self.client.eval(
+            TOKEN_BUCKET_SCRIPT, 1, f"{self.prefix}:{policy.name}:{key}", policy.rate, policy.burst
+        )
+        tokens = int(millitokens) / 1000
+        return RateLimitResult(
+            allowed=bool(int(allowed)),
+            remaining=int(tokens),
+            reset_after=(policy.burst - tokens) / policy.rate,
+            retry_after=0.0 if int(allowed) else (1 - tokens) / policy.rate,
+        )
+
+
+class LocalSharedClient:
+    """
+    In-process stand-in for the shared server.
+
+    It only understands `TOKEN_BUCKET_SCRIPT`, which it evaluates with
+    `take_token` against its own dict, so several `SharedBackend`s pointing at
+    one instance behave like workers sharing one server.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.clock = clock
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> list[int]:
+        if script != TOKEN_BUCKET_SCRIPT:
+            raise NotImplementedError("LocalSharedClient only runs TOKEN_BUCKET_SCRIPT")
+        key, rate, burst = keys_and_args
+        policy = RateLimitPolicy(name=key, rate=float(rate), burst=int(burst))
+        now = self.clock()
+        tokens, updated_at = self.buckets.get(key, (policy.burst, now))
+        tokens, result = take_token(tokens, updated_at, now, policy)
+        self.buckets[key] = (tokens, now)
+        return [int(result.allowed), math.floor(tokens * 1000)]
+
+
+def create_backend() -> RateLimitBackend:
+    """Use the shared server when `RATE_LIMIT_REDIS_URL` is set, else in-process buckets."""
+    if config.RATE_LIMIT_REDIS_URL:
+        import redis.asyncio  # optional dependency, only needed for the shared backend
+
+        return SharedBackend(redis.asyncio.from_url(config.RATE_LIMIT_REDIS_URL))
+    return MemoryBackend()
+
+
+def client_key(scope: dict, api_keys: frozenset[str] = frozenset()) -> str:
+    """Identify the caller by API key if it is one of `api_keys`, else by its IP address."""
+    headers = dict(scope["headers"])
+    api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+    if api_key and api_key in api_keys:
+        return f"key:{api_key}"
+    forwarded_for = headers.get(b"x-forwarded-for")
+    if config.RATE_LIMIT_TRUST_FORWARDED_FOR and forwarded_for:
+        return f"ip:{forwarded_for.decode('latin-1').split(',')[0].strip()}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def rate_limit_headers(policy: RateLimitPolicy, result: RateLimitResult) -> list[tuple[bytes, bytes]]:
+    headers = [
+        (b"ratelimit-limit", str(policy.burst).encode()),
+        (b"ratelimit-remaining", str(result.remaining).encode()),
+        (b"ratelimit-reset", str(math.ceil(result.reset_after)).encode()),
+    ]
+    if not result.allowed:
+        headers.append((b"retry-after", str(math.ceil(result.retry_after)).encode()))
+    return headers
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying `ROUTE_POLICIES` to HTTP requests."""
+
+    def __init__(
+        self,
+        app: Callable[..., Awaitable[None]],
+        backend: RateLimitBackend | None = None,
+        policies: list[tuple[str, RateLimitPolicy]] | None = None,
+        api_keys: frozenset[str] | None = None,
+    ) -> None:
+        self.app = app
+        self.backend = backend if backend is not None else create_backend()
+        self.policies = ROUTE_POLICIES if policies is None else policies
+        self.api_keys = config.RATE_LIMIT_API_KEYS if api_keys is None else api_keys
+
+    def policy_for(self, path: str) -> RateLimitPolicy | None:
+        for prefix, policy in self.policies:
+            if path.startswith(prefix):
+                return policy
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        policy = self.policy_for(scope["path"]) if scope["type"] == "http" else None
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        result = await self.backend.acquire(client_key(scope, self.api_keys), policy)
+        headers = rate_limit_headers(policy, result)
+        if not result.allowed:
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight calls to a shared resource.
+
+    A call that cannot get a slot within `max_wait` seconds is rejected with a
+    503 instead of queueing behind the others indefinitely.
+    """
+
+    def __init__(self, limit: int, max_wait: float, detail: str = "Upstream is busy, try again shortly") -> None:
+        self.limit = limit
+        self.max_wait = max_wait
+        self.detail = detail
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail=self.detail,
+                headers={"Retry-After": str(max(1, math.ceil(self.max_wait)))},
+            )
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+upstream_limiter = ConcurrencyLimiter(config.UPSTREAM_CONCURRENCY, config.UPSTREAM_MAX_WAIT)
+export_limiter = ConcurrencyLimiter(
+    config.EXPORT_CONCURRENCY, config.EXPORT_MAX_WAIT, detail="Too many exports running, try again shortly",
+)
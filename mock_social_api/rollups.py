@@ -0,0 +1,285 @@
+"""
+Precomputed daily activity rollups.
+
+`daily-activity` summarizes, per user and hashtag, the stories and posts
+published since today's midnight in Paris, and participants ask for it over
+and over all day. Instead of scanning the user's items on every request, a
+rollup per user keeps, for each hashtag used in the current window, how many
+stories and posts carry it and the likes they collected, so a request costs a
+couple of dict lookups.
+
+A user's rollup is computed the first time it is asked for, and the
+scheduler started with the app keeps it current from then on:
+
+- new stories and posts are added to their user's rollup as they are stored;
+- a replaced user is marked dirty and recomputed by a background task;
+- at Paris midnight every rollup computed so far is recomputed for the new
+  window.
+
+A rollup that is missing, dirty or from a previous window is never served:
+the reader recomputes that one user on demand instead, so answers are correct
+even while the scheduler is catching up or not running at all.
+"""
+import asyncio
+import logging
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from mock_social_api.executor import run_store
+from mock_social_api.hashtags import registry
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store import StoreEvent, UserStore, as_utc, get_store
+from mock_social_api.utils import get_france_midnight, get_france_next_midnight
+
+logger = logging.getLogger(__name__)
+
+# Users recomputed between yields to the event loop during a rebuild
+_REBUILD_CHUNK = 100
+
+# Identifies a story or post, so applying the same one twice counts it once
+_ItemKey = tuple[str, datetime, str]
+
+
+class HashtagCounts:
+    __slots__ = ("stories", "posts", "story_likes", "post_likes")
+
+    def __init__(self) -> None:
+        self.stories = 0
+        self.posts = 0
+        self.story_likes = 0
+        self.post_likes = 0
+
+
+_NO_ACTIVITY = HashtagCounts()
+
+
+class UserRollup:
+    """One user's activity per hashtag since `since`, current as of `updated_at`."""
+
+    __slots__ = ("since", "updated_at", "followers", "private", "_counts", "_seen")
+
+    def __init__(self, user: IUser, since: datetime, now: datetime) -> None:
+        self.since = since
+        self.updated_at = now
+        self.followers = user.followers
+        self.private = user.private
+        self._counts: dict[int, HashtagCounts] = {}  # keyed by interned hashtag ID
+        self._seen: set[_ItemKey] = set()
+        since_utc = as_utc(since)
+        for story in user.stories:
+            self.add("story", story, since_utc)
+        for post in user.posts:
+            self.add("post", post, since_utc)
+
+    def add(self, kind: str, item: IStory | IPost, since_utc: datetime) -> bool:
+        """Count a story or post if it falls in the window and is not counted yet."""
+        timestamp = as_utc(item.timestamp)
+        if timestamp < since_utc or not item.hashtags:
+            return False
+        key = (kind, timestamp, item.content)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        for hashtag in set(item.hashtags):
+            tag_id = registry.intern(hashtag)
+            counts = self._counts.get(tag_id)
+            if counts is None:
+                counts = self._counts[tag_id] = HashtagCounts()
+            if kind == "story":
+                counts.stories += 1
+                counts.story_likes += item.likes
+            else:
+                counts.posts += 1
+                counts.post_likes += item.likes
+        return True
+
+    def counts(self, hashtag: str) -> HashtagCounts:
+        """Activity on a canonical hashtag; read-only."""
+        tag_id = registry.lookup(hashtag)
+        if tag_id is None:
+            return _NO_ACTIVITY
+        return self._counts.get(tag_id, _NO_ACTIVITY)
+
+
+class DailyActivityRollups:
+    """
+    Rollups of every user for the current Paris day.
+
+    Everything runs on the event loop; store writes on other threads are
+    handed over with `call_soon_threadsafe`. `clock` returns the current
+    time and is injectable so tests can move through midnight.
+    """
+
+    def __init__(self, store: UserStore | None = None, clock: Callable[[], datetime] | None = None) -> None:
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._store = store
+        self._source: UserStore | None = None
+        self._rollups: dict[str, UserRollup] = {}
+        self._dirty: set[str] = set()
+        # Items stored while their user is being recomputed, added once it is done
+        self._pending: dict[str, list[tuple[str, IStory | IPost]]] = {}
+        self._refreshing: dict[str, asyncio.Future] = {}
+        self._since: datetime | None = None
+        self._until: datetime | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._listening: UserStore | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.rebuilt_at: datetime | None = None
+
+    def _current_store(self) -> UserStore:
+        store = self._store if self._store is not None else get_store()
+        if store is not self._source:
+            # Rollups of another store (replaced in tests) say nothing about this one
+            self._rollups.clear()
+            self._dirty.clear()
+            self._source = store
+            if self._loop is not None:
+                self._listen(store)
+        return store
+
+    def _listen(self, store: UserStore | None) -> None:
+        """Follow `store`'s writes instead of those of the store followed so far."""
+        if self._listening is not None:
+            self._listening.remove_listener(self.on_store_event)
+        self._listening = store
+        if store is not None:
+            store.add_listener(self.on_store_event)
+
+    def window(self) -> datetime:
+        """Start of the current window, today's midnight in Paris."""
+        now = self.clock()
+        if self._since is None or not self._since <= now < self._until:
+            self._since = get_france_midnight(now)
+            self._until = get_france_next_midnight(now)
+        return self._since
+
+    def get(self, username: str) -> UserRollup | None:
+        """The user's rollup if it is current, in O(1); None if it must be recomputed."""
+        self._current_store()
+        rollup = self._rollups.get(username)
+        if rollup is None or username in self._dirty or rollup.since != self.window():
+            return None
+        return rollup
+
+    async def activity(self, username: str) -> UserRollup | None:
+        """The user's current rollup, recomputing it if needed; None if the user does not exist."""
+        rollup = self.get(username)
+        if rollup is None:
+            rollup = await self.refresh(username)
+        return rollup
+
+    async def refresh(self, username: str) -> UserRollup | None:
+        """Recompute one user's rollup from the store, sharing a recomputation already running."""
+        task = self._refreshing.get(username)
+        if task is None:
+            task = self._refreshing[username] = asyncio.ensure_future(self._recompute(username))
+            task.add_done_callback(lambda _: self._refreshing.pop(username, None))
+        # A reader going away must not cancel the recomputation other readers wait on
+        return await asyncio.shield(task)
+
+    async def _recompute(self, username: str) -> UserRollup | None:
+        store = self._current_store()
+        self._dirty.discard(username)
+        pending = self._pending[username] = []
+        try:
+            user = await run_store(store.get_user, username)
+        finally:
+            del self._pending[username]
+        if user is None or store is not self._source:
+            self._rollups.pop(username, None)
+            return None
+        since = self.window()
+        rollup = self._rollups[username] = UserRollup(user, since, self.clock())
+        # Stored during the read: already counted if the read saw them, added otherwise
+        since_utc = as_utc(since)
+        for kind, item in pending:
+            rollup.add(kind, item, since_utc)
+        return rollup
+
+    async def rebuild(self) -> None:
+        """
+        Recompute the rollups computed so far for the current window. Users no
+        reader asked for are left to be computed on demand, and those gone from
+        the store are dropped.
+        """
+        self._current_store()
+        usernames = list(self._rollups)
+        for start in range(0, len(usernames), _REBUILD_CHUNK):
+            for username in usernames[start:start + _REBUILD_CHUNK]:
+                await self.refresh(username)
+            await asyncio.sleep(0)
+        self.rebuilt_at = self.clock()
+        logger.info("Rebuilt daily activity rollups of %d users since %s", len(usernames), self._since)
+
+    def on_store_event(self, event: StoreEvent) -> None:
+        """Store listener; writes may happen on worker threads, so hop to the loop."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.apply, event)
+
+    def apply(self, event: StoreEvent) -> None:
+        """Fold a store write into the rollups."""
+        username = event.username
+        if event.kind == "user":
+            self._mark_dirty(username)
+            return
+        pending = self._pending.get(username)
+        if pending is not None:
+            pending.append((event.kind, event.item))
+        rollup = self._rollups.get(username)
+        if rollup is None or rollup.since != self.window():
+            self._mark_dirty(username)
+        elif rollup.add(event.kind, event.item, as_utc(rollup.since)):
+            rollup.updated_at = self.clock()
+
+    def _mark_dirty(self, username: str) -> None:
+        self._dirty.add(username)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Keep the rollups current until `stop`; they are built as readers ask for them."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Until a reader first uses the store there are no rollups to keep current
+        if self._source is not None:
+            self._listen(self._source)
+        self._tasks = [
+            asyncio.create_task(self._rebuild_at_midnight()),
+            asyncio.create_task(self._refresh_dirty()),
+        ]
+
+    async def stop(self) -> None:
+        self._listen(None)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._wakeup = None
+
+    async def _rebuild_at_midnight(self) -> None:
+        # Nothing is built at startup: readers recompute missing rollups on demand,
+        # so booting never waits on, or loads, the whole dataset
+        while True:
+            next_midnight = get_france_next_midnight(self.clock())
+            await asyncio.sleep(max(0.0, (next_midnight - self.clock()).total_seconds()))
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("Failed to rebuild daily activity rollups")
+
+    async def _refresh_dirty(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._dirty:
+                username = next(iter(self._dirty))
+                try:
+                    await self.refresh(username)
+                except Exception:
+                    self._dirty.discard(username)
+                    logger.exception("Failed to refresh the daily activity rollup of %s", username)
+
+
+daily_rollups = DailyActivityRollups()
@@ -1,7 +1,18 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, ValidationInfo, model_validator
 from typing import Optional
 from datetime import datetime
 
+from mock_social_api.hashtags import merge_hashtags
+
+# Validation context for data the store already validated when it was ingested.
+# Type checks run in pydantic-core and are cheap; the hashtag normalization below
+# is the Python part of validation, so trusted data skips it.
+TRUSTED = {"trusted": True}
+
+
+def _is_trusted(info: ValidationInfo) -> bool:
+    return bool(info.context) and info.context.get("trusted", False)
+
 class IComment(BaseModel):
     username: str  # The username of the person who made the comment
     content: str  # The content of the comment
@@ -16,6 +27,13 @@ class IPost(BaseModel):
     link: Optional[HttpUrl] = None  # Optional if not all posts have a link
     comments: list[IComment] = []  # Assuming comments are a list of strings
 
+    @model_validator(mode="after")
+    def normalize_hashtags(self, info: ValidationInfo) -> "IPost":
+        # Canonical forms, plus any hashtag written in the content but not listed
+        if not _is_trusted(info):
+            self.hashtags = merge_hashtags(self.hashtags, self.content)
+        return self
+
 # Define a model for Story
 class IStory(BaseModel):
     content: str
@@ -23,6 +41,12 @@ class IStory(BaseModel):
     timestamp: datetime
     likes: int
 
+    @model_validator(mode="after")
+    def normalize_hashtags(self, info: ValidationInfo) -> "IStory":
+        if not _is_trusted(info):
+            self.hashtags = merge_hashtags(self.hashtags, self.content)
+        return self
+
 # Define a model for User
 class IUser(BaseModel):
     stories: list[IStory] = []
@@ -1,22 +1,23 @@
-from math import ceil
+import sys
+from datetime import date, datetime
 from typing import Any, Generic, TypeVar
-from collections.abc import Sequence
-from fastapi_pagination import Params, Page
-from fastapi_pagination.bases import AbstractPage, AbstractParams
-from pydantic import Field, HttpUrl
+from pydantic import HttpUrl
 from pydantic import BaseModel
 
 DataType = TypeVar("DataType")
 T = TypeVar("T")
 
+# fastapi_pagination is slow to import; the paginated schemas live in
+# pagination_schema and are only loaded when something asks for them.
+_PAGINATION_SCHEMAS = ("PageBase", "IGetResponsePaginated")
 
-class PageBase(Page[T], Generic[T]):
-    previous_page: int | None = Field(
-        default=None, description="Page number of the previous page"
-    )
-    next_page: int | None = Field(
-        default=None, description="Page number of the next page"
-    )
+
+def __getattr__(name: str):
+    if name in _PAGINATION_SCHEMAS:
+        from mock_social_api.schemas import pagination_schema
+
+        return getattr(pagination_schema, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class IResponseBase(BaseModel, Generic[T]):
@@ -25,38 +26,6 @@ class IResponseBase(BaseModel, Generic[T]):
     data: T | None = None
 
 
-class IGetResponsePaginated(AbstractPage[T], Generic[T]):
-    message: str | None = ""
-    meta: dict = {}
-    data: PageBase[T]
-
-    __params_type__ = Params  # Set params related to Page
-
-    @classmethod
-    def create(
-        cls,
-        items: Sequence[T],
-        total: int,
-        params: AbstractParams,
-    ) -> PageBase[T] | None:
-        if params.size is not None and total is not None and params.size != 0:
-            pages = ceil(total / params.size)
-        else:
-            pages = 0
-
-        return cls(
-            data=PageBase[T](
-                items=items,
-                page=params.page,
-                size=params.size,
-                total=total,
-                pages=pages,
-                next_page=params.page + 1 if params.page < pages else None,
-                previous_page=params.page - 1 if params.page > 1 else None,
-            )
-        )
-
-
 class IGetResponseBase(IResponseBase[DataType], Generic[DataType]):
     message: str | None = "Data got correctly"
 
@@ -78,14 +47,16 @@ def create_response(
     message: str | None = None,
     meta: dict | Any | None = {},
 ) -> (
-    IResponseBase[DataType]
-    | IGetResponsePaginated[DataType]
-    | IGetResponseBase[DataType]
-    | IPutResponseBase[DataType]
-    | IDeleteResponseBase[DataType]
-    | IPostResponseBase[DataType]
+    "IResponseBase[DataType]"
+    "| IGetResponsePaginated[DataType]"
+    "| IGetResponseBase[DataType]"
+    "| IPutResponseBase[DataType]"
+    "| IDeleteResponseBase[DataType]"
+    "| IPostResponseBase[DataType]"
 ):
-    if isinstance(data, IGetResponsePaginated):
+    # Paginated data can only exist once pagination_schema has been imported
+    pagination_schema = sys.modules.get("mock_social_api.schemas.pagination_schema")
+    if pagination_schema is not None and isinstance(data, pagination_schema.IGetResponsePaginated):
         data.message = "Data paginated correctly" if message is None else message
         data.meta = meta
         return data
@@ -109,12 +80,17 @@ class IResponseCounter(BaseModel):
     result: int
     username: str | None = None  
 
+class IActivityMeta(BaseModel):
+    since: datetime  # start of the counted window, today's midnight in Paris
+    updated_at: datetime  # when the precomputed rollup was last brought up to date
+
 class IResponseActivity(BaseModel):
     followers: int
     stories_with_hashtag: int
     posts_with_hashtag: int
     total_likes: int
     username: str
+    meta: IActivityMeta | None = None
 
 class ITiktokResponseActivity(BaseModel):
     followers: int
@@ -122,3 +98,33 @@ class ITiktokResponseActivity(BaseModel):
     total_likes: int
     username: str
 
+
+class ILeaderboardUser(BaseModel):
+    username: str
+    likes: int
+
+class IResponseUserLeaderboard(BaseModel):
+    hashtag: str
+    since: datetime
+    users: list[ILeaderboardUser]
+
+class ILeaderboardHashtag(BaseModel):
+    hashtag: str
+    mentions: int
+
+class IResponseHashtagLeaderboard(BaseModel):
+    since: datetime
+    hashtags: list[ILeaderboardHashtag]
+
+class IResponseHashtagReach(BaseModel):
+    hashtag: str
+    day: date
+    unique_users: int  # approximate
+    relative_error: float  # relative standard error of unique_users
+
+class IResponseHashtagMentions(BaseModel):
+    hashtag: str
+    day: date
+    mentions: int  # approximate, never below the exact count
+    error_bound: int  # mentions exceeds the exact count by more than this with probability at most error_probability
+    error_probability: float
@@ -0,0 +1,390 @@
+"""
+Approximate hashtag statistics with mergeable sketches.
+
+Exact per-hashtag counts need memory proportional to the number of distinct
+users and hashtags. The sketches here use a fixed, small amount of memory
+instead, at the cost of a bounded error:
+
+- `HyperLogLog` estimates distinct users per hashtag per day. Most hashtags
+  are only used by a few users a day, so a sketch starts out as an exact set
+  of value hashes and only switches to 2**p one-byte registers once the set
+  would outgrow them (past 2**p / 64 values). Dense sketches have a relative
+  standard error of 1.04 / sqrt(2**p): about 1.6% for the default p=12, in
+  4 KiB per hashtag per day.
+- `CountMinSketch` estimates how many stories and posts used each hashtag per
+  day. It never underestimates, and overestimates by more than epsilon * N
+  (N = all mentions that day) with probability at most delta. The defaults
+  (epsilon=0.001, delta=0.01) use 2719 x 5 counters, about 106 KiB per day.
+
+Both hash with blake2b rather than `hash()`, so sketches built by different
+workers or processes agree and can be merged (`merge`) after being shipped
+around with `to_bytes` / `from_bytes`.
+"""
+import math
+import struct
+import threading
+from array import array
+from collections.abc import Callable
+from datetime import date, datetime
+from hashlib import blake2b
+
+from mock_social_api import config
+from mock_social_api.executor import run_blocking
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store import StoreEvent, UserStore, as_utc, get_store
+from mock_social_api.utils import get_france_midnight
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    # Flags the precision byte of `to_bytes` output holding exact hashes
+    _EXACT = 0x80
+
+    def __init__(self, p: int = 12) -> None:
+        if not 4 <= p <= 16:
+            raise ValueError("p must be between 4 and 16")
+        self.p = p
+        self.m = 1 << p
+        # A set of this many hashes takes about as much memory as the registers
+        self.exact_limit = max(16, self.m // 64)
+        self.registers: bytearray | None = None
+        self._hashes: set[int] | None = set()
+
+    @property
+    def exact(self) -> bool:
+        """True while `count()` is exact (below `exact_limit` values)."""
+        return self._hashes is not None
+
+    @property
+    def relative_error(self) -> float:
+        """Relative standard error of `count()`."""
+        return 0.0 if self.exact else 1.04 / math.sqrt(self.m)
+
+    def add(self, value: str) -> None:
+        self._insert(_hash64(value))
+
+    def _insert(self, x: int) -> None:
+        if self._hashes is not None:
+            self._hashes.add(x)
+            if len(self._hashes) > self.exact_limit:
+                self._densify()
+            return
+        index = x & (self.m - 1)
+        rest = x >> self.p
+        # Position of the lowest set bit in the remaining 64 - p bits
+        rank = (rest & -rest).bit_length() if rest else 64 - self.p + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self) -> None:
+        hashes, self._hashes = self._hashes, None
+        self.registers = bytearray(self.m)
+        for x in hashes:
+            self._insert(x)
+
+    def discard(self, value: str) -> bool:
+        """Forget a value; only possible while exact, so returns whether it could."""
+        if self._hashes is None:
+            return False
+        self._hashes.discard(_hash64(value))
+        return True
+
+    def count(self) -> int:
+        if self._hashes is not None:
+            return len(self._hashes)
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction: linear counting is more accurate here
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        if other._hashes is not None:
+            for x in other._hashes:
+                self._insert(x)
+            return
+        if self._hashes is not None:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_bytes(self) -> bytes:
+        if self._hashes is not None:
+            return bytes([self.p | self._EXACT]) + struct.pack(f"<{len(self._hashes)}Q", *sorted(self._hashes))
+        return bytes([self.p]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        sketch = cls(data[0] & ~cls._EXACT)
+        if data[0] & cls._EXACT:
+            sketch._hashes = set(struct.unpack_from(f"<{(len(data) - 1) // 8}Q", data, 1))
+        else:
+            sketch._hashes = None
+            sketch.registers = bytearray(data[1:])
+        return sketch
+
+
+class CountMinSketch:
+    _HEADER = struct.Struct("<IIQ")
+
+    def __init__(self, epsilon: float = 0.001, delta: float = 0.01) -> None:
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = self.depth_for(delta)
+        self.total = 0
+        self.rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    @staticmethod
+    def depth_for(delta: float) -> int:
+        """Rows needed to exceed the error bound with probability at most `delta`."""
+        return math.ceil(math.log(1 / delta))
+
+    @property
+    def error_bound(self) -> int:
+        """Overestimate that `estimate()` exceeds with probability at most `delta`."""
+        return math.ceil(self.epsilon * self.total)
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> None:
+        self.total += count
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += count
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge CountMinSketches of different dimensions")
+        self.total += other.total
+        for row, other_row in zip(self.rows, other.rows):
+            for i, value in enumerate(other_row):
+                if value:
+                    row[i] += value
+
+    def to_bytes(self) -> bytes:
+        return self._HEADER.pack(self.width, self.depth, self.total) + b"".join(row.tobytes() for row in self.rows)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountMinSketch":
+        width, depth, total = cls._HEADER.unpack_from(data)
+        sketch = cls.__new__(cls)
+        sketch.width, sketch.depth, sketch.total = width, depth, total
+        offset = cls._HEADER.size
+        sketch.rows = []
+        for _ in range(depth):
+            row = array("Q")
+            row.frombytes(data[offset:offset + 8 * width])
+            sketch.rows.append(row)
+            offset += 8 * width
+        return sketch
+
+
+class HashtagStats:
+    """
+    Per-day sketches of hashtag usage: a `HyperLogLog` of distinct users per
+    hashtag and one `CountMinSketch` of mentions across all hashtags. Days are
+    Paris calendar days; only the last `retention_days` are kept.
+
+    The sketches are built from the store on first use, in the thread pool
+    since that scans every user, and follow store writes afterwards.
+    """
+
+    def __init__(
+        self,
+        store: UserStore,
+        retention_days: int = 7,
+        clock: Callable[[], datetime] | None = None,
+        epsilon: float = 0.001,
+        delta: float = 0.01,
+    ) -> None:
+        self.store = store
+        self.retention_days = retention_days
+        self.clock = clock
+        self.epsilon = epsilon  # of the mentions sketches
+        self.delta = delta
+        self._lock = threading.Lock()
+        # Held for a whole build, so concurrent first reads build once
+        self._build_lock = threading.Lock()
+        self._reach: dict[date, dict[str, HyperLogLog]] = {}
+        self._mentions: dict[date, CountMinSketch] = {}
+        self._built = False
+        # Users written while a build scans the store, brought up to date once it is done
+        self._written_during_build: set[str] | None = None
+
+    def today(self) -> date:
+        return get_france_midnight(self.clock() if self.clock is not None else None).date()
+
+    def retains(self, day: date) -> bool:
+        """Whether `day` is one of the retained days, today included."""
+        return self._oldest_day() <= day <= self.today()
+
+    @staticmethod
+    def _day(item: IPost | IStory) -> date:
+        return get_france_midnight(as_utc(item.timestamp)).date()
+
+    def _add(self, username: str, item: IPost | IStory, oldest: date) -> None:
+        if not item.hashtags:
+            return
+        day = self._day(item)
+        if day < oldest:
+            return
+        reach = self._reach.setdefault(day, {})
+        mentions = self._mentions.get(day)
+        if mentions is None:
+            mentions = self._mentions[day] = CountMinSketch(self.epsilon, self.delta)
+        for hashtag in set(item.hashtags):
+            sketch = reach.get(hashtag)
+            if sketch is None:
+                sketch = reach[hashtag] = HyperLogLog()
+            sketch.add(username)
+            mentions.add(hashtag)
+
+    def _replace_user(self, username: str, previous: IUser | None, user: IUser, oldest: date) -> None:
+        """Take a replaced user's stories and posts back out, then add the current ones."""
+        if previous is not None:
+            kept = {
+                (self._day(item), hashtag)
+                for item in (*user.stories, *user.posts) for hashtag in item.hashtags
+            }
+            for item in (*previous.stories, *previous.posts):
+                if not item.hashtags or (day := self._day(item)) < oldest:
+                    continue
+                mentions = self._mentions.get(day)
+                reach = self._reach.get(day, {})
+                for hashtag in set(item.hashtags):
+                    # Never below zero, should the write have raced the first build
+                    if mentions is not None and mentions.estimate(hashtag) > 0:
+                        mentions.add(hashtag, -1)
+                    sketch = reach.get(hashtag)
+                    if sketch is not None and (day, hashtag) not in kept:
+                        # Dense sketches cannot forget a user, which overcounts by
+                        # at most one per replaced user, well within their error
+                        sketch.discard(username)
+        for item in (*user.stories, *user.posts):
+            self._add(username, item, oldest)
+
+    def _oldest_day(self) -> date:
+        return date.fromordinal(self.today().toordinal() - self.retention_days + 1)
+
+    def _expire(self, oldest: date) -> None:
+        for day in [day for day in self._mentions if day < oldest]:
+            del self._mentions[day]
+            self._reach.pop(day, None)
+
+    async def ready(self) -> None:
+        """Build the sketches in the thread pool if needed, so the full scan never holds the event loop."""
+        if not self._built:
+            await run_blocking(self.build)
+
+    def build(self) -> None:
+        """Build the sketches from every user in the store; writes keep flowing meanwhile."""
+        with self._build_lock:
+            with self._lock:
+                if self._built:
+                    return
+                self._written_during_build = set()
+                self._reach.clear()
+                self._mentions.clear()
+            oldest = self._oldest_day()
+            scanned: dict[str, IUser] = {}
+            for username in self.store.usernames():
+                user = self.store.get_user(username)
+                if user is None:
+                    continue
+                scanned[username] = user
+                with self._lock:
+                    for item in (*user.stories, *user.posts):
+                        self._add(username, item, oldest)
+            with self._lock:
+                # Swap what the scan saw of a user written meanwhile for what it is now
+                for username in self._written_during_build:
+                    user = self.store.get_user(username)
+                    if user is not None and user is not scanned.get(username):
+                        self._replace_user(username, scanned.get(username), user, oldest)
+                self._written_during_build = None
+                self._built = True
+
+    def on_store_event(self, event: StoreEvent) -> None:
+        """Store listener: add each new story, post or replaced user to the sketches."""
+        with self._lock:
+            if not self._built:
+                # The build in progress, or the first read, picks the write up
+                if self._written_during_build is not None:
+                    self._written_during_build.add(event.username)
+                return
+            if event.kind == "user":
+                self._replace_user(event.username, event.previous, event.item, self._oldest_day())
+            else:
+                self._add(event.username, event.item, self._oldest_day())
+
+    def reach(self, hashtag: str, day: date) -> tuple[int, float]:
+        """Estimated distinct users who used `hashtag` on `day`, and the relative standard error."""
+        if not self._built:
+            self.build()
+        with self._lock:
+            self._expire(self._oldest_day())
+            sketch = self._reach.get(day, {}).get(hashtag)
+            if sketch is None:
+                return 0, 0.0
+            return sketch.count(), sketch.relative_error
+
+    def mentions(self, hashtag: str, day: date) -> tuple[int, int, float]:
+        """Estimated mentions of `hashtag` on `day`, the error bound, and the probability of exceeding it."""
+        if not self._built:
+            self.build()
+        with self._lock:
+            self._expire(self._oldest_day())
+            sketch = self._mentions.get(day)
+            if sketch is None:
+                # The bound a sketch of the configured depth would give, without allocating one
+                return 0, 0, math.exp(-CountMinSketch.depth_for(self.delta))
+            return sketch.estimate(hashtag), sketch.error_bound, sketch.delta
+
+    def merge(self, other: "HashtagStats") -> None:
+        """Fold another worker's sketches into these ones."""
+        with self._lock:
+            for day, sketches in other._reach.items():
+                reach = self._reach.setdefault(day, {})
+                for hashtag, sketch in sketches.items():
+                    if hashtag in reach:
+                        reach[hashtag].merge(sketch)
+                    else:
+                        reach[hashtag] = HyperLogLog.from_bytes(sketch.to_bytes())
+            for day, sketch in other._mentions.items():
+                if day in self._mentions:
+                    self._mentions[day].merge(sketch)
+                else:
+                    self._mentions[day] = CountMinSketch.from_bytes(sketch.to_bytes())
+
+
+_hashtag_stats: HashtagStats | None = None
+
+
+def get_hashtag_stats() -> HashtagStats:
+    """Return the sketches of the process-wide store, subscribing them on first use."""
+    global _hashtag_stats
+    store = get_store()
+    if _hashtag_stats is None or _hashtag_stats.store is not store:
+        _hashtag_stats = HashtagStats(store, retention_days=config.HASHTAG_STATS_RETENTION_DAYS)
+        store.add_listener(_hashtag_stats.on_store_event)
+    return _hashtag_stats
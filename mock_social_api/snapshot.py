@@ -0,0 +1,425 @@
+"""
+Versioned binary snapshot of the mock dataset.
+
+A snapshot is written once from the live data and memory-mapped at startup.
+Nothing is decoded up front: the directory and the hashtag index are sorted
+fixed-width tables searched in place, and a user record is only turned into an
+`IUser` the first time it is requested. Startup cost is therefore a single
+`mmap` call no matter how many users the snapshot holds.
+
+Layout (all integers little-endian):
+
+    header      magic "MSAS", u16 version, u16 reserved, u32 user count,
+                u64 directory offset, u64 index offset, u32 hashtag count
+    records     one variable-length record per user (see `_encode_user`)
+    directory   user count entries of (u64 name offset, u32 name length,
+                u64 record offset, u32 record length), sorted by username
+    names       utf-8 usernames and hashtags referenced by the tables
+    index       hashtag count entries of (u64 tag offset, u32 tag length,
+                u64 list offset, u32 list length), sorted by hashtag, each
+                pointing to a list of u32 directory positions
+"""
+import argparse
+import asyncio
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from hashlib import blake2b
+
+from mock_social_api.schemas.instagram_schema import TRUSTED, IUser
+from mock_social_api.store.base import UserStore
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MSAS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIQQI")
+_ENTRY = struct.Struct("<QIQI")
+_USER = struct.Struct("<?QHH")
+_ITEM = struct.Struct("<qhQ")
+_TIMESTAMP = struct.Struct("<qh")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+_NAIVE = -32768  # utc offset marker for naive datetimes
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_UTC_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotError(ValueError):
+    """Raised when a file is not a readable snapshot."""
+
+
+# ---------------------------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------------------------
+
+def _pack_str(out: bytearray, value: str) -> None:
+    data = value.encode()
+    out += _U32.pack(len(data))
+    out += data
+
+
+def _pack_timestamp(value: datetime) -> tuple[int, int]:
+    offset = value.utcoffset()
+    if offset is None:
+        return (value - _NAIVE_EPOCH) // _MICROSECOND, _NAIVE
+    return (value - _UTC_EPOCH) // _MICROSECOND, offset // timedelta(minutes=1)
+
+
+def _pack_hashtags(out: bytearray, hashtags: list[str]) -> None:
+    out += _U16.pack(len(hashtags))
+    for hashtag in hashtags:
+        _pack_str(out, hashtag)
+
+
+def _encode_user(user: IUser) -> bytes:
+    """
+    Encode a user as: private, followers, story count, post count, then every
+    story (timestamp, likes, content, hashtags) and every post (timestamp,
+    likes, content, hashtags, link, comments).
+    """
+    out = bytearray(_USER.pack(user.private, user.followers, len(user.stories), len(user.posts)))
+    for story in user.stories:
+        out += _ITEM.pack(*_pack_timestamp(story.timestamp), story.likes)
+        _pack_str(out, story.content)
+        _pack_hashtags(out, story.hashtags)
+    for post in user.posts:
+        out += _ITEM.pack(*_pack_timestamp(post.timestamp), post.likes)
+        _pack_str(out, post.content)
+        _pack_hashtags(out, post.hashtags)
+        _pack_str(out, str(post.link) if post.link is not None else "")
+        out += _U16.pack(len(post.comments))
+        for comment in post.comments:
+            out += _TIMESTAMP.pack(*_pack_timestamp(comment.timestamp))
+            _pack_str(out, comment.username)
+            _pack_str(out, comment.content)
+    return bytes(out)
+
+
+def dump_snapshot(users: Mapping[str, IUser], base: "SnapshotUsers | None" = None) -> bytes:
+    """
+    Serialize `users` into the snapshot format. The users of `base` that are
+    not in `users` are carried over too, copied as they are encoded in it
+    rather than decoded and encoded again.
+    """
+    names = set(users)
+    if base is not None:
+        names.update(base)
+    usernames = sorted(names, key=str.encode)
+    records = bytearray()
+    record_spans: list[tuple[int, int]] = []
+    hashtag_users: dict[str, list[int]] = {}
+    for position, username in enumerate(usernames):
+        user = users.get(username)
+        if user is None:
+            record = base.record(username)
+        else:
+            record = _encode_user(user)
+            for hashtag in {tag for item in (*user.stories, *user.posts) for tag in item.hashtags}:
+                hashtag_users.setdefault(hashtag, []).append(position)
+        record_spans.append((_HEADER.size + len(records), len(record)))
+        records += record
+    if base is not None:
+        positions = {username: position for position, username in enumerate(usernames)}
+        for hashtag, tagged in base.hashtag_users():
+            carried = [positions[username] for username in tagged if username not in users]
+            if carried:
+                hashtag_users.setdefault(hashtag, []).extend(carried)
+        for tagged in hashtag_users.values():
+            tagged.sort()
+
+    hashtags = sorted(hashtag_users, key=str.encode)
+    directory_offset = _HEADER.size + len(records)
+    names_offset = directory_offset + _ENTRY.size * len(usernames)
+
+    names = bytearray()
+    directory = bytearray()
+    for username, (record_offset, record_length) in zip(usernames, record_spans):
+        data = username.encode()
+        directory += _ENTRY.pack(names_offset + len(names), len(data), record_offset, record_length)
+        names += data
+    tag_spans = []
+    for hashtag in hashtags:
+        data = hashtag.encode()
+        tag_spans.append((names_offset + len(names), len(data)))
+        names += data
+
+    index_offset = names_offset + len(names)
+    lists_offset = index_offset + _ENTRY.size * len(hashtags)
+    index = bytearray()
+    lists = bytearray()
+    for hashtag, (tag_offset, tag_length) in zip(hashtags, tag_spans):
+        positions = hashtag_users[hashtag]
+        index += _ENTRY.pack(tag_offset, tag_length, lists_offset + len(lists), len(positions))
+        lists += struct.pack(f"<{len(positions)}I", *positions)
+
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(usernames), directory_offset, index_offset, len(hashtags))
+    return b"".join((header, records, directory, names, index, lists))
+
+
+def write_snapshot(users: Mapping[str, IUser], path: str, base: "SnapshotUsers | None" = None) -> int:
+    """
+    Atomically write a snapshot of `users` (over `base`, see `dump_snapshot`)
+    to `path` and return its size.
+
+    The file is written next to its destination and renamed into place, so a
+    server that has the previous snapshot mapped keeps reading a consistent file.
+    """
+    data = dump_snapshot(users, base)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+# ---------------------------------------------------------------------------
+# Decoding
+# ---------------------------------------------------------------------------
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: memoryview, pos: int = 0) -> None:
+        self.buf = buf
+        self.pos = pos
+
+    def unpack(self, fmt: struct.Struct) -> tuple:
+        values = fmt.unpack_from(self.buf, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def text(self) -> str:
+        (length,) = self.unpack(_U32)
+        start = self.pos
+        self.pos += length
+        return str(self.buf[start:self.pos], "utf-8")
+
+    def timestamp(self, micros: int, offset: int) -> datetime:
+        if offset == _NAIVE:
+            return _NAIVE_EPOCH + micros * _MICROSECOND
+        return (_UTC_EPOCH + micros * _MICROSECOND).astimezone(timezone(timedelta(minutes=offset)))
+
+    def hashtags(self) -> list[str]:
+        (count,) = self.unpack(_U16)
+        return [self.text() for _ in range(count)]
+
+
+def _decode_user(buf: memoryview) -> IUser:
+    # Snapshots are written from validated users, so the decoded fields are
+    # validated in one trusted pass rather than model by model
+    reader = _Reader(buf)
+    private, followers, n_stories, n_posts = reader.unpack(_USER)
+    stories = []
+    for _ in range(n_stories):
+        micros, offset, likes = reader.unpack(_ITEM)
+        stories.append({
+            "content": reader.text(),
+            "hashtags": reader.hashtags(),
+            "timestamp": reader.timestamp(micros, offset),
+            "likes": likes,
+        })
+    posts = []
+    for _ in range(n_posts):
+        micros, offset, likes = reader.unpack(_ITEM)
+        content = reader.text()
+        hashtags = reader.hashtags()
+        link = reader.text() or None
+        (n_comments,) = reader.unpack(_U16)
+        comments = []
+        for _ in range(n_comments):
+            comment_timestamp = reader.timestamp(*reader.unpack(_TIMESTAMP))
+            comments.append({"username": reader.text(), "content": reader.text(), "timestamp": comment_timestamp})
+        posts.append({
+            "content": content,
+            "hashtags": hashtags,
+            "timestamp": reader.timestamp(micros, offset),
+            "likes": likes,
+            "link": link,
+            "comments": comments,
+        })
+    return IUser.model_validate(
+        {"stories": stories, "posts": posts, "private": private, "followers": followers}, context=TRUSTED,
+    )
+
+
+class _Table:
+    """Sorted fixed-width (name, span) table read in place; supports `bisect`."""
+
+    def __init__(self, buf: memoryview, offset: int, count: int) -> None:
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def entry(self, i: int) -> tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._buf, self._offset + i * _ENTRY.size)
+
+    def __getitem__(self, i: int) -> bytes:
+        name_offset, name_length, _, _ = self.entry(i)
+        return bytes(self._buf[name_offset:name_offset + name_length])
+
+    def find(self, key: str) -> int | None:
+        data = key.encode()
+        i = bisect_left(self, data)
+        if i < self._count and self[i] == data:
+            return i
+        return None
+
+
+class SnapshotUsers(Mapping[str, IUser]):
+    """
+    Read-only `mock_users` mapping backed by a memory-mapped snapshot.
+
+    Users are decoded on first access and cached afterwards.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise SnapshotError(f"{path} is not a snapshot") from e
+        self.path = path
+        buf = memoryview(self._mmap)
+        if len(buf) < _HEADER.size:
+            raise SnapshotError(f"{path} is not a snapshot")
+        magic, version, _, user_count, directory_offset, index_offset, hashtag_count = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {version} (expected {VERSION})")
+        self._buf = buf
+        self._users = _Table(buf, directory_offset, user_count)
+        self._hashtags = _Table(buf, index_offset, hashtag_count)
+        self._cache: dict[str, IUser] = {}
+
+    def __getitem__(self, username: str) -> IUser:
+        user = self._cache.get(username)
+        if user is not None:
+            return user
+        user = self._cache[username] = _decode_user(self.record(username))
+        return user
+
+    def record(self, username: str) -> memoryview:
+        """The user's encoded record, read in place without decoding it."""
+        i = self._users.find(username)
+        if i is None:
+            raise KeyError(username)
+        _, _, record_offset, record_length = self._users.entry(i)
+        return self._buf[record_offset:record_offset + record_length]
+
+    def __contains__(self, username: object) -> bool:
+        return isinstance(username, str) and (username in self._cache or self._users.find(username) is not None)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self._users)):
+            yield self._users[i].decode()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @cached_property
+    def digest(self) -> str:
+        """Digest of the snapshot's bytes, identifying its dataset; reads the whole file once."""
+        return blake2b(self._buf, digest_size=8).hexdigest()
+
+    @property
+    def hashtag_count(self) -> int:
+        """Number of distinct hashtags in the index."""
+        return len(self._hashtags)
+
+    def users_with_hashtag(self, hashtag: str) -> list[str]:
+        """Usernames with at least one story or post tagged `hashtag` (canonical), in snapshot order."""
+        i = self._hashtags.find(hashtag)
+        if i is None:
+            return []
+        return self._tagged(i)
+
+    def hashtag_users(self) -> Iterator[tuple[str, list[str]]]:
+        """Every hashtag in the index with the usernames tagged with it."""
+        for i in range(len(self._hashtags)):
+            yield self._hashtags[i].decode(), self._tagged(i)
+
+    def _tagged(self, i: int) -> list[str]:
+        _, _, list_offset, list_length = self._hashtags.entry(i)
+        positions = struct.unpack_from(f"<{list_length}I", self._buf, list_offset)
+        return [self._users[position].decode() for position in positions]
+
+
+def open_snapshot(path: str) -> SnapshotUsers:
+    """Memory-map the snapshot at `path`."""
+    return SnapshotUsers(path)
+
+
+async def snapshot_periodically(store: UserStore, path: str, interval: float) -> None:
+    """
+    Rewrite the snapshot at `path` every `interval` seconds until cancelled,
+    skipping intervals without store writes. Users still as the mapped
+    snapshot holds them are copied from it without being decoded.
+    """
+    from mock_social_api.executor import run_blocking
+
+    _, base = store.layers()
+    # A store read from this very file has nothing to add until it is written to
+    changed = not (isinstance(base, SnapshotUsers) and os.path.abspath(base.path) == os.path.abspath(path))
+
+    def on_write(event) -> None:
+        nonlocal changed
+        changed = True
+
+    store.add_listener(on_write)
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            if not changed:
+                continue
+            changed = False
+            users, base = store.layers()
+            try:
+                size = await run_blocking(
+                    write_snapshot, users, path, base if isinstance(base, SnapshotUsers) else None,
+                )
+            except OSError:
+                changed = True
+                logger.exception("Failed to write snapshot to %s", path)
+            else:
+                logger.info("Wrote %d byte snapshot to %s", size, path)
+    finally:
+        store.remove_listener(on_write)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m mock_social_api.snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    write = commands.add_parser("write", help="Write a snapshot of the live dataset")
+    write.add_argument("path")
+    info = commands.add_parser("info", help="Describe an existing snapshot")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        from mock_social_api.store import get_store
+
+        users = get_store().users()
+        size = write_snapshot(users, args.path)
+        print(f"Wrote {len(users)} users ({size} bytes) to {args.path}")
+    else:
+        users = open_snapshot(args.path)
+        print(f"{args.path}: version {VERSION}, {len(users)} users, {users.hashtag_count} hashtags")
+
+
+if __name__ == "__main__":
+    main()
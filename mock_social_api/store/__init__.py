@@ -0,0 +1,51 @@
+from mock_social_api import config
+from mock_social_api.store.base import (
+    EXPORT_COLUMNS, ExportFilter, HashtagActivity, StoreEvent, StoreListener, UserStore, as_utc,
+)
+from mock_social_api.store.memory import MemoryStore
+
+__all__ = [
+    "EXPORT_COLUMNS", "ExportFilter", "HashtagActivity", "MemoryStore", "StoreEvent", "StoreListener", "UserStore",
+    "as_utc", "close_store", "create_store", "get_store", "set_store",
+]
+
+_store: UserStore | None = None
+
+
+def create_store() -> UserStore:
+    """Build the store selected by `MOCK_SOCIAL_STORE`."""
+    from mock_social_api import constants
+
+    if config.STORE_BACKEND == "sqlite":
+        from mock_social_api.store.sqlite import SQLiteStore
+
+        store = SQLiteStore(config.SQLITE_PATH)
+        if store.is_empty():
+            for username, user in constants.mock_users.items():
+                store.put_user(username, user)
+        return store
+    if config.STORE_BACKEND == "memory":
+        return MemoryStore(constants.mock_users, version=config.DATASET_VERSION)
+    raise ValueError(f"Unknown store backend {config.STORE_BACKEND!r}")
+
+
+def get_store() -> UserStore:
+    """Return the process-wide store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+
+def set_store(store: UserStore | None) -> None:
+    """Replace the process-wide store (None recreates it on next use)."""
+    global _store
+    _store = store
+
+
+def close_store() -> None:
+    """Close the process-wide store if it was ever created."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
@@ -0,0 +1,205 @@
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Mapping
+from datetime import datetime, timezone
+from hashlib import blake2b
+from typing import NamedTuple
+
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+
+
+class HashtagActivity(NamedTuple):
+    stories_with_hashtag: int
+    posts_with_hashtag: int
+    total_likes: int  # likes of the matching stories and posts
+
+
+class StoreEvent(NamedTuple):
+    kind: str  # "user", "post" or "story"
+    username: str
+    item: IUser | IPost | IStory
+    previous: IUser | None = None  # the user a "user" event replaced, if anyone listened
+
+
+StoreListener = Callable[[StoreEvent], None]
+
+# Columns of each export table, in the order `UserStore.export_rows` yields them.
+# Comments are keyed to their post by the post's owner and timestamp.
+EXPORT_COLUMNS: dict[str, tuple[str, ...]] = {
+    "users": ("username", "private", "followers"),
+    "stories": ("username", "timestamp", "content", "hashtags", "likes"),
+    "posts": ("username", "timestamp", "content", "hashtags", "likes", "link"),
+    "comments": ("post_username", "post_timestamp", "username", "timestamp", "content"),
+}
+
+
+def as_utc(value: datetime) -> datetime:
+    """Make timestamps comparable; naive timestamps in the dataset are UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class ExportFilter(NamedTuple):
+    """
+    Rows to export. `usernames` selects the owners of the exported rows (None
+    for everyone); `hashtag` (canonical) keeps stories and posts tagged with it
+    and the comments on such posts; `since` (inclusive) and `until`
+    (exclusive) bound the timestamp of each exported story, post or comment.
+    Users rows only honour `usernames`.
+    """
+
+    usernames: frozenset[str] | None = None
+    hashtag: str | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+    def in_range(self, timestamp: datetime) -> bool:
+        timestamp = as_utc(timestamp)
+        return (self.since is None or timestamp >= as_utc(self.since)) and (
+            self.until is None or timestamp < as_utc(self.until)
+        )
+
+    def matches(self, hashtags: list[str], timestamp: datetime) -> bool:
+        return (self.hashtag is None or self.hashtag in hashtags) and self.in_range(timestamp)
+
+
+class UserStore(ABC):
+    """
+    Storage behind the mock users.
+
+    Readers get fully validated `IUser` objects; aggregate queries are answered
+    by the store so backends can use their own indexes.
+    """
+
+    # True when calls may block (disk or network I/O) and should not run on the event loop
+    blocking: bool = False
+
+    # Identifies the dataset the store started from, the same in every process serving it
+    epoch: str
+
+    def __init__(self) -> None:
+        self._listeners: list[StoreListener] = []
+        self._versions: dict[str, str] = {}
+
+    def version(self, username: str) -> str:
+        """
+        Data version of a user, changed by every write to it ("" if never
+        written). Processes that applied the same writes to the same dataset
+        agree on it.
+        """
+        return self._versions.get(username, "")
+
+    def _record_write(self, kind: str, username: str, item: IUser | IPost | IStory) -> None:
+        # Chained over the writes themselves rather than counted, so two processes
+        # that took different writes never end up with the same version
+        digest = blake2b(f"{self._versions.get(username, '')}|{kind}|".encode(), digest_size=8)
+        digest.update(item.model_dump_json().encode())
+        self._versions[username] = digest.hexdigest()
+
+    def add_listener(self, listener: StoreListener) -> None:
+        """
+        Call `listener` after every write. Listeners run synchronously on the
+        writing thread, so they must be quick and thread-safe.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: StoreListener) -> None:
+        self._listeners.remove(listener)
+
+    def _notify(self, kind: str, username: str, item: IUser | IPost | IStory, previous: IUser | None = None) -> None:
+        self._record_write(kind, username, item)
+        event = StoreEvent(kind, username, item, previous)
+        for listener in self._listeners:
+            listener(event)
+
+    @abstractmethod
+    def get_user(self, username: str) -> IUser | None:
+        """Return the user, or None if the account does not exist."""
+
+    @abstractmethod
+    def usernames(self) -> list[str]:
+        """Return every username in the store."""
+
+    @abstractmethod
+    def users(self) -> Mapping[str, IUser]:
+        """Return a read-only mapping view of every user."""
+
+    def layers(self) -> tuple[Mapping[str, IUser], Mapping[str, IUser] | None]:
+        """
+        The users as (written since the store was built, read-only mapping it
+        was built from), the first taking precedence. Backends that keep no
+        such split return every user and None.
+        """
+        return self.users(), None
+
+    @abstractmethod
+    def put_user(self, username: str, user: IUser) -> None:
+        """Create or replace a user with all of its stories and posts."""
+
+    @abstractmethod
+    def add_post(self, username: str, post: IPost) -> None:
+        """Append a post to an existing user."""
+
+    @abstractmethod
+    def add_story(self, username: str, story: IStory) -> None:
+        """Append a story to an existing user."""
+
+    @abstractmethod
+    def count_posts(self, username: str, hashtag: str, since: datetime) -> int:
+        """Count the user's posts tagged `hashtag` published at or after `since`."""
+
+    @abstractmethod
+    def count_stories(self, username: str, hashtag: str, since: datetime) -> int:
+        """Count the user's stories tagged `hashtag` published at or after `since`."""
+
+    @abstractmethod
+    def hashtag_activity(self, username: str, hashtag: str, since: datetime) -> HashtagActivity:
+        """Summarize the user's stories and posts tagged `hashtag` since `since`."""
+
+    def export_rows(self, table: str, filters: ExportFilter, batch_size: int) -> Iterator[list[tuple]]:
+        """
+        Yield the rows of an export table (see `EXPORT_COLUMNS`) matching
+        `filters`, in batches of `batch_size` rows, one user at a time so
+        memory stays bounded by the largest user. Timestamps are in UTC.
+        """
+        batch: list[tuple] = []
+        for username in self._export_usernames(table, filters):
+            batch.extend(self._export_user_rows(table, username, filters))
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            yield batch
+
+    def _export_usernames(self, table: str, filters: ExportFilter) -> list[str]:
+        """Users whose rows may match; backends with a hashtag index narrow this down."""
+        return sorted(filters.usernames) if filters.usernames is not None else self.usernames()
+
+    def _export_user_rows(self, table: str, username: str, filters: ExportFilter) -> list[tuple]:
+        """Rows of `table` owned by one user; backends override this to query their indexes."""
+        user = self.get_user(username)
+        if user is None:
+            return []
+        if table == "users":
+            return [(username, user.private, user.followers)]
+        if table == "stories":
+            return [
+                (username, as_utc(story.timestamp), story.content, story.hashtags, story.likes)
+                for story in user.stories if filters.matches(story.hashtags, story.timestamp)
+            ]
+        if table == "posts":
+            return [
+                (username, as_utc(post.timestamp), post.content, post.hashtags, post.likes,
+                 str(post.link) if post.link is not None else None)
+                for post in user.posts if filters.matches(post.hashtags, post.timestamp)
+            ]
+        if table == "comments":
+            return [
+                (username, as_utc(post.timestamp), comment.username, as_utc(comment.timestamp), comment.content)
+                for post in user.posts if filters.hashtag is None or filters.hashtag in post.hashtags
+                for comment in post.comments if filters.in_range(comment.timestamp)
+            ]
+        raise ValueError(f"Unknown export table {table!r}")
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
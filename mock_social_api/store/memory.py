@@ -0,0 +1,139 @@
+from collections import ChainMap
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime
+from functools import cached_property
+from hashlib import blake2b
+from types import MappingProxyType
+
+from mock_social_api.hashtags import registry
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store.base import ExportFilter, HashtagActivity, UserStore, as_utc
+
+# (timestamp in UTC, likes, interned hashtag IDs) of each story or post
+_Entry = tuple[datetime, int, frozenset[int]]
+
+
+def _index(items: list[IPost] | list[IStory]) -> list[_Entry]:
+    return [
+        (as_utc(item.timestamp), item.likes, frozenset(registry.intern(tag) for tag in item.hashtags))
+        for item in items
+    ]
+
+
+class MemoryStore(UserStore):
+    """
+    Users held in a dict, or layered over a read-only mapping such as a
+    memory-mapped snapshot, in which case writes go to an in-memory overlay.
+    """
+
+    def __init__(self, users: Mapping[str, IUser], version: str = "") -> None:
+        super().__init__()
+        self._version = version
+        if isinstance(users, MutableMapping):
+            self._users = users
+            # Writes replace entries of the dict in place, so keep its pristine entries
+            # for the digest; users are copied on write, so this copies no user
+            self._initial = users if version else dict(users)
+        else:
+            self._initial = users
+            self._users = ChainMap({}, users)
+        # Per-user hashtag index, valid while the cached user object is current
+        self._indexes: dict[str, tuple[IUser, list[_Entry], list[_Entry]]] = {}
+
+    @cached_property
+    def epoch(self) -> str:
+        # The configured version, or a digest of the dataset computed once
+        # something asks for it: the ETag dependency, which runs in the thread pool
+        if self._version:
+            return self._version
+        digest = getattr(self._initial, "digest", None)
+        if digest is not None:
+            return digest
+        hasher = blake2b(digest_size=8)
+        for username in sorted(self._initial):
+            hasher.update(f"{username}|".encode())
+            hasher.update(self._initial[username].model_dump_json().encode())
+        return hasher.hexdigest()
+
+    def get_user(self, username: str) -> IUser | None:
+        return self._users.get(username)
+
+    def usernames(self) -> list[str]:
+        return list(self._users)
+
+    def users(self) -> Mapping[str, IUser]:
+        return MappingProxyType(self._users)
+
+    def layers(self) -> tuple[Mapping[str, IUser], Mapping[str, IUser] | None]:
+        # Copies of the written users, so the caller may read them off the loop while writes go on
+        if isinstance(self._users, ChainMap):
+            overlay, base = self._users.maps
+            return dict(overlay), base
+        return dict(self._users), None
+
+    def put_user(self, username: str, user: IUser) -> None:
+        # Only read the replaced user (decoding it from a snapshot) when someone listens
+        previous = self._users.get(username) if self._listeners else None
+        self._users[username] = user
+        self._notify("user", username, user, previous)
+
+    def _require_user(self, username: str) -> IUser:
+        user = self._users.get(username)
+        if user is None:
+            raise KeyError(username)
+        return user
+
+    def add_post(self, username: str, post: IPost) -> None:
+        user = self._require_user(username)
+        # Copy on write so readers holding the previous user never see it change
+        self._users[username] = user.model_copy(update={"posts": [*user.posts, post]})
+        self._notify("post", username, post)
+
+    def add_story(self, username: str, story: IStory) -> None:
+        user = self._require_user(username)
+        self._users[username] = user.model_copy(update={"stories": [*user.stories, story]})
+        self._notify("story", username, story)
+
+    def count_posts(self, username: str, hashtag: str, since: datetime) -> int:
+        return self.hashtag_activity(username, hashtag, since).posts_with_hashtag
+
+    def count_stories(self, username: str, hashtag: str, since: datetime) -> int:
+        return self.hashtag_activity(username, hashtag, since).stories_with_hashtag
+
+    def _user_index(self, user: IUser, username: str) -> tuple[list[_Entry], list[_Entry]]:
+        # Writes replace the user object, so identity tells whether the index is stale
+        cached = self._indexes.get(username)
+        if cached is None or cached[0] is not user:
+            cached = self._indexes[username] = (user, _index(user.stories), _index(user.posts))
+        return cached[1], cached[2]
+
+    def hashtag_activity(self, username: str, hashtag: str, since: datetime) -> HashtagActivity:
+        user = self._users.get(username)
+        if user is None:
+            return HashtagActivity(0, 0, 0)
+        # Indexing interns the user's hashtags, so look the query up afterwards
+        stories, posts = self._user_index(user, username)
+        tag_id = registry.lookup(hashtag)
+        if tag_id is None:
+            return HashtagActivity(0, 0, 0)
+        since = as_utc(since)
+        stories = [likes for timestamp, likes, tags in stories if tag_id in tags and timestamp >= since]
+        posts = [likes for timestamp, likes, tags in posts if tag_id in tags and timestamp >= since]
+        return HashtagActivity(
+            stories_with_hashtag=len(stories),
+            posts_with_hashtag=len(posts),
+            total_likes=sum(stories) + sum(posts),
+        )
+
+    def _export_usernames(self, table: str, filters: ExportFilter) -> list[str]:
+        usernames = super()._export_usernames(table, filters)
+        if table == "users" or filters.hashtag is None or not isinstance(self._users, ChainMap):
+            return usernames
+        overlay, base = self._users.maps
+        users_with_hashtag = getattr(base, "users_with_hashtag", None)
+        if users_with_hashtag is None:
+            return usernames
+        # Only users tagged in the snapshot or written since can match, and the
+        # others are never decoded
+        candidates = set(users_with_hashtag(filters.hashtag)).union(overlay)
+        return [username for username in usernames if username in candidates]
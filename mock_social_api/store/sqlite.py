@@ -0,0 +1,363 @@
+"""
+SQLite backed user store.
+
+The database runs in WAL mode so readers never wait for the single writer.
+Each thread gets its own connection (a thread-local pool sized by the executor
+that calls into the store), and all SQL is kept in module constants so
+sqlite3's per-connection statement cache reuses the prepared statements.
+
+Hashtag occurrences are denormalized into `post_hashtags` / `story_hashtags`
+with covering indexes on (user, hashtag, timestamp, likes), so the count and
+activity queries are answered from the index alone. Exports filtered by
+hashtag and time range read the same index to find the matching rows.
+"""
+import secrets
+import sqlite3
+import threading
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timedelta, timezone
+
+from mock_social_api.schemas.instagram_schema import TRUSTED, IPost, IStory, IUser
+from mock_social_api.store.base import ExportFilter, HashtagActivity, UserStore, as_utc
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# Bounds of the `ts` column, for open-ended time ranges
+_TS_MIN = -(2**63)
+_TS_MAX = 2**63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    private INTEGER NOT NULL,
+    followers INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    likes INTEGER NOT NULL,
+    link TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_user ON posts(user_id, id);
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    likes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stories_user ON stories(user_id, id);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_post ON comments(post_id, id);
+CREATE TABLE IF NOT EXISTS post_hashtags (
+    post_id INTEGER NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    hashtag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS post_hashtags_user_tag_ts ON post_hashtags(user_id, hashtag, ts, likes);
+CREATE INDEX IF NOT EXISTS post_hashtags_post ON post_hashtags(post_id, position);
+CREATE TABLE IF NOT EXISTS story_hashtags (
+    story_id INTEGER NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    hashtag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS story_hashtags_user_tag_ts ON story_hashtags(user_id, hashtag, ts, likes);
+CREATE INDEX IF NOT EXISTS story_hashtags_story ON story_hashtags(story_id, position);
+"""
+
+_SELECT_USER = "SELECT id, private, followers FROM users WHERE username = ?"
+_SELECT_USER_ID = "SELECT id FROM users WHERE username = ?"
+_SELECT_VERSION = "SELECT version FROM users WHERE username = ?"
+_BUMP_VERSION = "UPDATE users SET version = version + 1 WHERE id = ?"
+_INSERT_EPOCH = "INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)"
+_SELECT_EPOCH = "SELECT value FROM meta WHERE key = 'epoch'"
+_SELECT_USERNAMES = "SELECT username FROM users ORDER BY username"
+_COUNT_USERS = "SELECT count(*) FROM users"
+_SELECT_STORIES = "SELECT id, content, timestamp, likes FROM stories WHERE user_id = ? ORDER BY id"
+_SELECT_STORY_HASHTAGS = "SELECT hashtag FROM story_hashtags WHERE story_id = ? ORDER BY position"
+_SELECT_POSTS = "SELECT id, content, timestamp, likes, link FROM posts WHERE user_id = ? ORDER BY id"
+_SELECT_POST_HASHTAGS = "SELECT hashtag FROM post_hashtags WHERE post_id = ? ORDER BY position"
+_SELECT_COMMENTS = "SELECT username, content, timestamp FROM comments WHERE post_id = ? ORDER BY id"
+_DELETE_USER = "DELETE FROM users WHERE username = ?"
+_INSERT_USER = "INSERT INTO users (username, private, followers, version) VALUES (?, ?, ?, ?)"
+_INSERT_POST = "INSERT INTO posts (user_id, content, timestamp, likes, link) VALUES (?, ?, ?, ?, ?)"
+_INSERT_POST_HASHTAG = "INSERT INTO post_hashtags (post_id, user_id, hashtag, ts, likes, position) VALUES (?, ?, ?, ?, ?, ?)"
+_INSERT_COMMENT = "INSERT INTO comments (post_id, username, content, timestamp) VALUES (?, ?, ?, ?)"
+_INSERT_STORY = "INSERT INTO stories (user_id, content, timestamp, likes) VALUES (?, ?, ?, ?)"
+_INSERT_STORY_HASHTAG = "INSERT INTO story_hashtags (story_id, user_id, hashtag, ts, likes, position) VALUES (?, ?, ?, ?, ?, ?)"
+_POST_ACTIVITY = """
+SELECT count(*), coalesce(sum(likes), 0) FROM post_hashtags
+WHERE user_id = (SELECT id FROM users WHERE username = ?) AND hashtag = ? AND ts >= ?
+"""
+_STORY_ACTIVITY = """
+SELECT count(*), coalesce(sum(likes), 0) FROM story_hashtags
+WHERE user_id = (SELECT id FROM users WHERE username = ?) AND hashtag = ? AND ts >= ?
+"""
+_EXPORT_TAGGED_STORIES = """
+SELECT s.id, s.content, s.timestamp, s.likes FROM story_hashtags h JOIN stories s ON s.id = h.story_id
+WHERE h.user_id = ? AND h.hashtag = ? AND h.ts >= ? AND h.ts < ? ORDER BY s.id
+"""
+_EXPORT_TAGGED_POSTS = """
+SELECT p.id, p.content, p.timestamp, p.likes, p.link FROM post_hashtags h JOIN posts p ON p.id = h.post_id
+WHERE h.user_id = ? AND h.hashtag = ? AND h.ts >= ? AND h.ts < ? ORDER BY p.id
+"""
+
+
+def _ts(value: datetime) -> int:
+    """Microseconds since the epoch, the indexed form of a timestamp."""
+    return (as_utc(value) - _EPOCH) // _MICROSECOND
+
+
+class _SQLiteUsers(Mapping[str, IUser]):
+    def __init__(self, store: "SQLiteStore") -> None:
+        self._store = store
+
+    def __getitem__(self, username: str) -> IUser:
+        user = self._store.get_user(username)
+        if user is None:
+            raise KeyError(username)
+        return user
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.usernames())
+
+    def __len__(self) -> int:
+        return self._store._connection().execute(_COUNT_USERS).fetchone()[0]
+
+
+class SQLiteStore(UserStore):
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.executescript(SCHEMA)
+        columns = {name for _, name, *_ in connection.execute("PRAGMA table_info(users)")}
+        with self._write_lock, connection:
+            if "version" not in columns:
+                # Databases from before user versions were persisted
+                connection.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            # Created with the database, so every process serving it shares one epoch
+            connection.execute(_INSERT_EPOCH, (secrets.token_hex(8),))
+        self.epoch = connection.execute(_SELECT_EPOCH).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def is_empty(self) -> bool:
+        return self._connection().execute(_COUNT_USERS).fetchone()[0] == 0
+
+    def get_user(self, username: str) -> IUser | None:
+        db = self._connection()
+        row = db.execute(_SELECT_USER, (username,)).fetchone()
+        if row is None:
+            return None
+        user_id, private, followers = row
+        # Rows were written from validated users, so validate them in one trusted pass
+        stories = [
+            {
+                "content": content,
+                "hashtags": [tag for (tag,) in db.execute(_SELECT_STORY_HASHTAGS, (story_id,))],
+                "timestamp": timestamp,
+                "likes": likes,
+            }
+            for story_id, content, timestamp, likes in db.execute(_SELECT_STORIES, (user_id,)).fetchall()
+        ]
+        posts = [
+            {
+                "content": content,
+                "hashtags": [tag for (tag,) in db.execute(_SELECT_POST_HASHTAGS, (post_id,))],
+                "timestamp": timestamp,
+                "likes": likes,
+                "link": link,
+                "comments": [
+                    {"username": c_username, "content": c_content, "timestamp": c_timestamp}
+                    for c_username, c_content, c_timestamp in db.execute(_SELECT_COMMENTS, (post_id,))
+                ],
+            }
+            for post_id, content, timestamp, likes, link in db.execute(_SELECT_POSTS, (user_id,)).fetchall()
+        ]
+        return IUser.model_validate(
+            {"stories": stories, "posts": posts, "private": bool(private), "followers": followers}, context=TRUSTED,
+        )
+
+    def usernames(self) -> list[str]:
+        return [username for (username,) in self._connection().execute(_SELECT_USERNAMES)]
+
+    def users(self) -> Mapping[str, IUser]:
+        return _SQLiteUsers(self)
+
+    def _insert_post(self, db: sqlite3.Connection, user_id: int, post: IPost) -> None:
+        link = str(post.link) if post.link is not None else None
+        post_id = db.execute(_INSERT_POST, (user_id, post.content, post.timestamp.isoformat(), post.likes, link)).lastrowid
+        ts = _ts(post.timestamp)
+        db.executemany(_INSERT_POST_HASHTAG, [
+            (post_id, user_id, tag, ts, post.likes, position) for position, tag in enumerate(dict.fromkeys(post.hashtags))
+        ])
+        db.executemany(_INSERT_COMMENT, [
+            (post_id, c.username, c.content, c.timestamp.isoformat()) for c in post.comments
+        ])
+
+    def _insert_story(self, db: sqlite3.Connection, user_id: int, story: IStory) -> None:
+        story_id = db.execute(_INSERT_STORY, (user_id, story.content, story.timestamp.isoformat(), story.likes)).lastrowid
+        ts = _ts(story.timestamp)
+        db.executemany(_INSERT_STORY_HASHTAG, [
+            (story_id, user_id, tag, ts, story.likes, position) for position, tag in enumerate(dict.fromkeys(story.hashtags))
+        ])
+
+    def _user_id(self, db: sqlite3.Connection, username: str) -> int:
+        row = db.execute(_SELECT_USER_ID, (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return row[0]
+
+    def version(self, username: str) -> str:
+        # Persisted, so processes sharing the database agree and see each other's writes
+        row = self._connection().execute(_SELECT_VERSION, (username,)).fetchone()
+        return str(row[0]) if row is not None and row[0] else ""
+
+    def _record_write(self, kind: str, username: str, item: IUser | IPost | IStory) -> None:
+        # Versions are bumped in the write's own transaction
+        pass
+
+    def put_user(self, username: str, user: IUser) -> None:
+        db = self._connection()
+        with self._write_lock, db:
+            previous = self.get_user(username) if self._listeners else None
+            row = db.execute(_SELECT_VERSION, (username,)).fetchone()
+            version = row[0] + 1 if row is not None else 1
+            db.execute(_DELETE_USER, (username,))
+            user_id = db.execute(_INSERT_USER, (username, user.private, user.followers, version)).lastrowid
+            for story in user.stories:
+                self._insert_story(db, user_id, story)
+            for post in user.posts:
+                self._insert_post(db, user_id, post)
+        self._notify("user", username, user, previous)
+
+    def add_post(self, username: str, post: IPost) -> None:
+        db = self._connection()
+        with self._write_lock, db:
+            user_id = self._user_id(db, username)
+            self._insert_post(db, user_id, post)
+            db.execute(_BUMP_VERSION, (user_id,))
+        self._notify("post", username, post)
+
+    def add_story(self, username: str, story: IStory) -> None:
+        db = self._connection()
+        with self._write_lock, db:
+            user_id = self._user_id(db, username)
+            self._insert_story(db, user_id, story)
+            db.execute(_BUMP_VERSION, (user_id,))
+        self._notify("story", username, story)
+
+    def _export_user_rows(self, table: str, username: str, filters: ExportFilter) -> list[tuple]:
+        db = self._connection()
+        row = db.execute(_SELECT_USER, (username,)).fetchone()
+        if row is None:
+            return []
+        user_id, private, followers = row
+        if table == "users":
+            return [(username, bool(private), followers)]
+
+        if table == "stories":
+            if filters.hashtag is None:
+                stories = db.execute(_SELECT_STORIES, (user_id,))
+            else:
+                # The (user, hashtag, ts) index applies both the hashtag and the time range
+                stories = db.execute(_EXPORT_TAGGED_STORIES, (
+                    user_id, filters.hashtag,
+                    _TS_MIN if filters.since is None else _ts(filters.since),
+                    _TS_MAX if filters.until is None else _ts(filters.until),
+                ))
+            rows = []
+            for story_id, content, timestamp, likes in stories.fetchall():
+                timestamp = as_utc(datetime.fromisoformat(timestamp))
+                if filters.in_range(timestamp):
+                    hashtags = [tag for (tag,) in db.execute(_SELECT_STORY_HASHTAGS, (story_id,))]
+                    rows.append((username, timestamp, content, hashtags, likes))
+            return rows
+
+        if table not in ("posts", "comments"):
+            raise ValueError(f"Unknown export table {table!r}")
+        if filters.hashtag is None:
+            posts = db.execute(_SELECT_POSTS, (user_id,))
+        elif table == "posts":
+            posts = db.execute(_EXPORT_TAGGED_POSTS, (
+                user_id, filters.hashtag,
+                _TS_MIN if filters.since is None else _ts(filters.since),
+                _TS_MAX if filters.until is None else _ts(filters.until),
+            ))
+        else:
+            # The time range applies to the comments, not to the posts they are on
+            posts = db.execute(_EXPORT_TAGGED_POSTS, (user_id, filters.hashtag, _TS_MIN, _TS_MAX))
+        rows = []
+        for post_id, content, timestamp, likes, link in posts.fetchall():
+            timestamp = as_utc(datetime.fromisoformat(timestamp))
+            if table == "posts":
+                if filters.in_range(timestamp):
+                    hashtags = [tag for (tag,) in db.execute(_SELECT_POST_HASHTAGS, (post_id,))]
+                    rows.append((username, timestamp, content, hashtags, likes, link))
+                continue
+            for c_username, c_content, c_timestamp in db.execute(_SELECT_COMMENTS, (post_id,)):
+                c_timestamp = as_utc(datetime.fromisoformat(c_timestamp))
+                if filters.in_range(c_timestamp):
+                    rows.append((username, timestamp, c_username, c_timestamp, c_content))
+        return rows
+
+    def count_posts(self, username: str, hashtag: str, since: datetime) -> int:
+        return self._connection().execute(_POST_ACTIVITY, (username, hashtag, _ts(since))).fetchone()[0]
+
+    def count_stories(self, username: str, hashtag: str, since: datetime) -> int:
+        return self._connection().execute(_STORY_ACTIVITY, (username, hashtag, _ts(since))).fetchone()[0]
+
+    def hashtag_activity(self, username: str, hashtag: str, since: datetime) -> HashtagActivity:
+        db = self._connection()
+        ts = _ts(since)
+        posts, post_likes = db.execute(_POST_ACTIVITY, (username, hashtag, ts)).fetchone()
+        stories, story_likes = db.execute(_STORY_ACTIVITY, (username, hashtag, ts)).fetchone()
+        return HashtagActivity(
+            stories_with_hashtag=stories,
+            posts_with_hashtag=posts,
+            total_likes=post_likes + story_likes,
+        )
@@ -0,0 +1,188 @@
+"""
+Push mission status changes to subscribed clients.
+
+Clients register a (username, hashtag, check) topic instead of polling the
+check endpoints. A topic's result is recomputed, with the same code as the
+matching endpoint, only when something can have changed it: a store write for
+that username, or a timeframe boundary (Paris midnight) passing. Subscribers
+are only woken when the result differs from the last one they were sent.
+
+An idle subscriber is a coroutine blocked on a one-slot queue, so a single
+event loop can hold tens of thousands of them; topics are shared between
+subscribers and evaluated once per change however many clients follow them.
+"""
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import datetime
+from enum import Enum
+
+from fastapi import HTTPException
+
+from mock_social_api.store import StoreEvent, get_store
+from mock_social_api.utils import get_france_next_midnight
+
+logger = logging.getLogger(__name__)
+
+# Idle streams send an SSE comment this often so proxies keep them open
+KEEPALIVE_SECONDS = 15.0
+
+
+class CheckType(str, Enum):
+    check_story = "check_story"
+    count_stories = "count_stories"
+    count_posts = "count_posts"
+    check_follow = "check_follow"
+
+
+Topic = tuple[str, str, CheckType]
+
+
+async def evaluate(topic: Topic) -> dict:
+    """Compute a topic's current result exactly as its endpoint would."""
+    from mock_social_api.api.v1.endpoints import instagram
+
+    username, hashtag, check = topic
+    try:
+        if check == CheckType.check_story:
+            result = await instagram.check_story(username, hashtag)
+        elif check == CheckType.count_stories:
+            result = await instagram.count_stories(username, hashtag)
+        elif check == CheckType.count_posts:
+            result = await instagram.count_posts(username, hashtag)
+        else:
+            result = await instagram.check_follow(username)
+    except HTTPException as e:
+        return {"status_code": e.status_code, "detail": e.detail}
+    return {"status_code": 200, **result.model_dump(mode="json")}
+
+
+class _TopicState:
+    __slots__ = ("last", "queues")
+
+    def __init__(self) -> None:
+        self.last: dict | None = None
+        self.queues: set[asyncio.Queue] = set()
+
+
+class SubscriptionHub:
+    def __init__(self, evaluator: Callable[[Topic], Awaitable[dict]] = evaluate) -> None:
+        self.evaluator = evaluator
+        self._topics: dict[Topic, _TopicState] = {}
+        self._topics_by_username: dict[str, set[Topic]] = {}
+        self._refreshes: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._rollover_task: asyncio.Task | None = None
+        self._store = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(state.queues) for state in self._topics.values())
+
+    def start(self) -> None:
+        """Start listening for timeframe rollovers, and for store writes once there are subscribers."""
+        self._loop = asyncio.get_running_loop()
+        self._rollover_task = asyncio.create_task(self._refresh_at_midnight())
+
+    async def stop(self) -> None:
+        if self._store is not None:
+            self._store.remove_listener(self.on_store_event)
+            self._store = None
+        if self._rollover_task is not None:
+            self._rollover_task.cancel()
+            await asyncio.gather(self._rollover_task, return_exceptions=True)
+            self._rollover_task = None
+
+    def _follow_store(self) -> None:
+        """Listen to the process-wide store's writes, moving over if it was replaced."""
+        store = get_store()
+        if store is not self._store:
+            if self._store is not None:
+                self._store.remove_listener(self.on_store_event)
+            self._store = store
+            store.add_listener(self.on_store_event)
+
+    def on_store_event(self, event: StoreEvent) -> None:
+        """Store listener; writes may happen on worker threads, so hop to the loop."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._schedule_refresh, event.username)
+
+    def _schedule_refresh(self, username: str) -> None:
+        topics = self._topics_by_username.get(username)
+        if topics:
+            task = asyncio.create_task(self.refresh(list(topics)))
+            self._refreshes.add(task)
+            task.add_done_callback(self._refreshes.discard)
+
+    async def _refresh_at_midnight(self) -> None:
+        while True:
+            next_midnight = get_france_next_midnight()
+            await asyncio.sleep(max(0.0, (next_midnight - datetime.now(next_midnight.tzinfo)).total_seconds()))
+            await self.refresh(list(self._topics))
+
+    async def refresh(self, topics: list[Topic]) -> None:
+        """Re-evaluate `topics` and push to their subscribers where the result changed."""
+        for topic in topics:
+            state = self._topics.get(topic)
+            if state is None:
+                continue
+            try:
+                result = await self.evaluator(topic)
+            except Exception:
+                logger.exception("Failed to evaluate subscription %s", topic)
+                continue
+            if result != state.last:
+                state.last = result
+                for queue in state.queues:
+                    _put_latest(queue, result)
+
+    async def subscribe(self, topic: Topic) -> AsyncIterator[dict | None]:
+        """
+        Yield the topic's current result, then every change to it. Yields None
+        after `KEEPALIVE_SECONDS` without a change.
+        """
+        state = self._topics.get(topic)
+        if state is None:
+            state = self._topics[topic] = _TopicState()
+            self._topics_by_username.setdefault(topic[0], set()).add(topic)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        state.queues.add(queue)
+        if self._loop is not None:
+            # Loading the store waits for the first subscriber rather than startup
+            self._follow_store()
+        try:
+            if state.last is None:
+                state.last = await self.evaluator(topic)
+            yield state.last
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            state.queues.discard(queue)
+            if not state.queues:
+                self._topics.pop(topic, None)
+                topics = self._topics_by_username.get(topic[0])
+                if topics is not None:
+                    topics.discard(topic)
+                    if not topics:
+                        del self._topics_by_username[topic[0]]
+
+
+def _put_latest(queue: asyncio.Queue, result: dict) -> None:
+    """Replace any undelivered result: a slow client only needs the newest one."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(result)
+
+
+def format_event(result: dict | None) -> str:
+    """Render a result (or a keepalive, for None) as a server-sent event."""
+    if result is None:
+        return ": keepalive\n\n"
+    return f"event: result\ndata: {json.dumps(result)}\n\n"
+
+
+hub = SubscriptionHub()
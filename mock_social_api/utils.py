@@ -1,25 +1,59 @@
-from datetime import datetime
-from mock_social_api.constants import mock_users
+from datetime import datetime, timedelta
 from fastapi import HTTPException
-import pytz
 
 from mock_social_api.schemas.instagram_schema import IUser
+from mock_social_api.executor import run_store
+from mock_social_api.store import get_store
 
 
 def get_user_data(username: str) -> IUser:
     """Retrieve user data or raise an error if not found."""
-    if username not in mock_users:
+    user_data = get_store().get_user(username)
+    if user_data is None:
         raise HTTPException(status_code=404, detail="Account does not exist")
-    return mock_users[username]
+    return user_data
+
+async def fetch_user_data(username: str) -> IUser:
+    """Retrieve user data without blocking the event loop, or raise an error if not found."""
+    store = get_store()
+    user_data = await run_store(store.get_user, username)
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="Account does not exist")
+    return user_data
 
 def check_privacy(user_data: IUser) -> None:
     """Check if the user's account is private."""
     if user_data.private:
         raise HTTPException(status_code=403, detail="It seems like you have a private account. Your account needs to be public to complete the missions.")
     
-def get_france_midnight() -> datetime:
-    """Get today's midnight in France timezone."""
+def get_france_midnight(now: datetime | None = None) -> datetime:
+    """Get today's midnight in France timezone (today as of `now`, if given)."""
+    import pytz  # imported on first use to keep cold start fast
+
     france_tz = pytz.timezone("Europe/Paris")
-    now = datetime.now(france_tz)
-    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    now = datetime.now(france_tz) if now is None else now.astimezone(france_tz)
+    # Localize the wall-clock midnight so DST days get the right offset
+    return france_tz.localize(now.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0))
+
+def get_france_next_midnight(now: datetime | None = None) -> datetime:
+    """Get the next midnight in France timezone, when today's timeframes roll over."""
+    # A day plus an hour past today's midnight is always tomorrow, even on DST days
+    return get_france_midnight(get_france_midnight(now) + timedelta(days=1, hours=1))
+
+def get_france_last_sunday_midnight(now: datetime | None = None) -> datetime:
+    """Get the most recent Sunday midnight in France timezone (today if it is Sunday)."""
+    import pytz
+
+    midnight = get_france_midnight(now)
+    days_since_sunday = (midnight.weekday() + 1) % 7
+    sunday = midnight.replace(tzinfo=None) - timedelta(days=days_since_sunday)
+    return pytz.timezone("Europe/Paris").localize(sunday)
+
+def get_timeframe_start(timeframe: str, now: datetime | None = None) -> datetime:
+    """Get the start of a `TimeFrame` ("today_midnight" or "last_sunday_midnight")."""
+    if timeframe == "today_midnight":
+        return get_france_midnight(now)
+    if timeframe == "last_sunday_midnight":
+        return get_france_last_sunday_midnight(now)
+    raise ValueError(f"Unknown timeframe {timeframe!r}")
 
@@ -0,0 +1,46 @@
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+
+import pytest
+
+from mock_social_api import constants
+from mock_social_api.store import MemoryStore, UserStore, set_store
+
+
+class Clock:
+    """A clock for code that takes a `clock` callable; tests move `now` by hand."""
+
+    def __init__(self, now) -> None:
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Clock:
+    """Wall-clock time, starting at 14:00 in Paris on Thursday October 3rd, 2024."""
+    return Clock(datetime(2024, 10, 3, 12, tzinfo=timezone.utc))
+
+
+@pytest.fixture
+def monotonic_clock() -> Clock:
+    """Seconds, like `time.monotonic`."""
+    return Clock(1000.0)
+
+
+@pytest.fixture
+def use_store() -> Iterator[Callable[[UserStore], UserStore]]:
+    """Install stores as the process-wide store; the default one is back after the test."""
+    def install(store: UserStore) -> UserStore:
+        set_store(store)
+        return store
+
+    yield install
+    set_store(None)
+
+
+@pytest.fixture
+def store(use_store) -> MemoryStore:
+    """The mock dataset in a store of its own, installed as the process-wide store."""
+    return use_store(MemoryStore(dict(constants.mock_users)))
@@ -0,0 +1,166 @@
+import asyncio
+
+import httpx
+import pytest
+
+from mock_social_api import config
+from mock_social_api.admission import ROUTE_LANES, AdmissionController, AdmissionMiddleware, Lane, Overloaded
+
+API = Lane(name="api", priority=0, max_in_flight=2, max_queue=4, max_wait=1.0)
+UPSTAR = Lane(name="upstar", priority=1, max_in_flight=1, max_queue=1, max_wait=1.0)
+PROXIED = Lane(name="proxied", priority=1, max_in_flight=1, max_queue=1, max_wait=1.0, hold_until_done=True)
+
+
+async def queued(controller: AdmissionController, lane: Lane, budget: float = 1.0) -> asyncio.Task:
+    """Start an acquire and let it reach the queue."""
+    task = asyncio.create_task(controller.acquire(lane, budget))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_upstar_lane_matches_the_upstream_limit():
+    lanes = dict(ROUTE_LANES)
+    assert lanes["/upstar/"].max_in_flight == config.UPSTREAM_CONCURRENCY
+    assert lanes["/upstar/"].hold_until_done
+
+
+def test_requests_queue_until_a_slot_is_released():
+    async def run():
+        controller = AdmissionController(max_in_flight=2)
+        await controller.acquire(API, 1.0)
+        await controller.acquire(API, 1.0)
+        waiting = await queued(controller, API)
+        assert not waiting.done() and controller.in_flight == 2
+
+        controller.release(API, 0.01)
+        await asyncio.wait_for(waiting, 1)
+        assert controller.in_flight == 2 and controller.shed == 0
+
+    asyncio.run(run())
+
+
+def test_lane_cap_leaves_room_for_other_lanes():
+    async def run():
+        controller = AdmissionController(max_in_flight=2)
+        await controller.acquire(UPSTAR, 1.0)
+        upstar = await queued(controller, UPSTAR)
+        assert not upstar.done()
+        # The global limit still has room, so other lanes get in
+        await asyncio.wait_for(controller.acquire(API, 1.0), 1)
+
+        controller.release(UPSTAR, 0.01)
+        await asyncio.wait_for(upstar, 1)
+
+    asyncio.run(run())
+
+
+def test_freed_slots_go_to_the_higher_priority_lane():
+    async def run():
+        controller = AdmissionController(max_in_flight=1)
+        await controller.acquire(API, 1.0)
+        upstar = await queued(controller, UPSTAR)
+        api = await queued(controller, API)
+
+        controller.release(API, 0.01)
+        await asyncio.wait_for(api, 1)
+        assert not upstar.done()
+        controller.release(API, 0.01)
+        await asyncio.wait_for(upstar, 1)
+
+    asyncio.run(run())
+
+
+def test_requests_are_shed_rather_than_left_waiting():
+    async def run():
+        controller = AdmissionController(max_in_flight=1)
+        await controller.acquire(UPSTAR, 1.0)
+
+        # The budget runs out while queued
+        with pytest.raises(Overloaded):
+            await controller.acquire(UPSTAR, 0.05)
+        # The queue is full
+        first = await queued(controller, UPSTAR)
+        with pytest.raises(Overloaded):
+            await controller.acquire(UPSTAR, 1.0)
+        assert controller.shed == 2
+
+        # Slots have been held for 0.5 s, so a 0.1 s budget is rejected without queueing
+        controller.release(UPSTAR, 0.5)
+        await asyncio.wait_for(first, 1)
+        with pytest.raises(Overloaded) as excinfo:
+            await controller.acquire(UPSTAR, 0.1)
+        assert excinfo.value.retry_after == pytest.approx(0.5)
+        assert controller.shed == 3 and not controller._queues[UPSTAR]
+
+    asyncio.run(run())
+
+
+def test_middleware_sheds_with_503_and_releases_at_response_start():
+    state = {}
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        state["in_flight"] = controller.in_flight
+        await state["release"].wait()
+        await send({"type": "http.response.body", "body": b"done"})
+
+    controller = AdmissionController(max_in_flight=1)
+    middleware = AdmissionMiddleware(app, controller, lanes=[("/upstar/", UPSTAR)])
+
+    async def run():
+        state["release"] = asyncio.Event()
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            slow = asyncio.create_task(client.get("/upstar/slow"))
+            await asyncio.sleep(0.05)
+            # The slot was handed back once the response started
+            assert state["in_flight"] == 0 and controller.in_flight == 0
+
+            await controller.acquire(UPSTAR, 1.0)
+            response = await client.get("/upstar/other", headers={"X-Request-Deadline-Ms": "50"})
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == "1"
+            assert response.json() == {"detail": "Server is overloaded, try again shortly"}
+
+            # Paths outside every lane are never held up
+            state["release"].set()
+            assert (await client.get("/")).status_code == 200
+            assert (await slow).content == b"done"
+
+    asyncio.run(run())
+
+
+def test_proxied_slots_are_held_until_the_body_is_sent():
+    state = {"started": []}
+
+    async def app(scope, receive, send):
+        # Like the proxy, which keeps its upstream slot while the body streams
+        state["started"].append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"first", "more_body": True})
+        if scope["path"] == "/upstar/slow":
+            await state["release"].wait()
+        await send({"type": "http.response.body", "body": b"rest"})
+
+    controller = AdmissionController(max_in_flight=4)
+    middleware = AdmissionMiddleware(app, controller, lanes=[("/upstar/", PROXIED)])
+
+    async def run():
+        state["release"] = asyncio.Event()
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            slow = asyncio.create_task(client.get("/upstar/slow"))
+            await asyncio.sleep(0.05)
+            assert controller.in_flight == 1
+
+            # The next call waits in the admission queue, not inside the app
+            queued = asyncio.create_task(client.get("/upstar/next"))
+            await asyncio.sleep(0.05)
+            assert state["started"] == ["/upstar/slow"] and len(controller._queues[PROXIED]) == 1
+
+            state["release"].set()
+            assert (await slow).content == b"firstrest"
+            assert (await queued).content == b"firstrest"
+            assert state["started"] == ["/upstar/slow", "/upstar/next"] and controller.in_flight == 0
+
+    asyncio.run(run())
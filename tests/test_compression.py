@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from mock_social_api import compression
+from mock_social_api.compression import CompressionMiddleware, negotiate
+
+BODY = b'{"users": []}' * 100
+
+
+@pytest.mark.parametrize(("accept_encoding", "expected"), [
+    ("gzip", "gzip"),
+    ("br, gzip;q=0.5", "br"),
+    ("zstd;q=0.2, br;q=0.9, gzip;q=0.5", "br"),
+    ("zstd, br, gzip", "zstd"),
+    ("gzip;q=0", None),
+    ("*", "zstd"),
+    ("*;q=0.5, zstd;q=0", "br"),
+    ("*;q=0", None),
+    ("gzip;q=oops", None),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiation_follows_q_values(monkeypatch, accept_encoding, expected):
+    monkeypatch.setattr(compression, "available_encodings", lambda: ("zstd", "br", "gzip"))
+    assert negotiate(accept_encoding) == expected
+
+
+def respond(status: int = 200, headers: list[tuple[bytes, bytes]] | None = None, chunks: tuple[bytes, ...] = (BODY,)):
+    """An app answering every request with `chunks` as the body."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": headers or [(b"content-type", b"application/json")]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    return app
+
+
+async def fetch(middleware: CompressionMiddleware, path: str = "/", accept_encoding: str = "gzip") -> httpx.Response:
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        request = client.build_request("GET", path, headers={"accept-encoding": accept_encoding})
+        response = await client.send(request, stream=True)
+        await response.aread()
+        return response
+
+
+def test_bodies_under_the_minimum_size_are_sent_as_they_are():
+    async def run():
+        response = await fetch(CompressionMiddleware(respond(), minimum_size=len(BODY) + 1))
+        assert "content-encoding" not in response.headers and response.content == BODY
+
+        response = await fetch(CompressionMiddleware(respond(), minimum_size=len(BODY)))
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < len(BODY)
+        assert response.content == BODY
+
+        # Clients that accept no available encoding get the body as it is
+        response = await fetch(CompressionMiddleware(respond(), minimum_size=0), accept_encoding="identity")
+        assert "content-encoding" not in response.headers and response.content == BODY
+
+    asyncio.run(run())
+
+
+def test_vary_is_merged_with_accept_encoding():
+    async def run():
+        headers = [(b"content-type", b"application/json"), (b"vary", b"Origin")]
+        response = await fetch(CompressionMiddleware(respond(headers=headers), minimum_size=0))
+        assert response.headers.get_list("vary") == ["Origin, Accept-Encoding"]
+
+        response = await fetch(CompressionMiddleware(respond(), minimum_size=0))
+        assert response.headers.get_list("vary") == ["Accept-Encoding"]
+
+    asyncio.run(run())
+
+
+def test_streamed_bodies_are_compressed_incrementally():
+    async def run():
+        response = await fetch(CompressionMiddleware(respond(chunks=(BODY, BODY, b"")), minimum_size=0))
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.content == BODY * 2
+
+    asyncio.run(run())
+
+
+def test_immutable_responses_are_compressed_once(monkeypatch):
+    calls = []
+    real_compress = compression.compress
+
+    def counting(data, encoding):
+        calls.append(encoding)
+        return real_compress(data, encoding)
+
+    monkeypatch.setattr(compression, "compress", counting)
+
+    async def run():
+        middleware = CompressionMiddleware(respond(), minimum_size=0)
+        for _ in range(3):
+            assert (await fetch(middleware, "/openapi.json")).content == BODY
+        assert calls == ["gzip"] and len(middleware._immutable_cache) == 1
+
+        # Other paths are compressed every time
+        await fetch(middleware, "/api/v1/instagram/profile")
+        await fetch(middleware, "/api/v1/instagram/profile")
+        assert len(calls) == 3
+
+        # A different schema is never answered from the cache
+        middleware.app = respond(chunks=(BODY + b" ",))
+        assert (await fetch(middleware, "/openapi.json")).content == BODY + b" "
+        assert len(calls) == 4 and len(middleware._immutable_cache) == 2
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(("status", "content_type"), [
+    (200, b"text/event-stream"),
+    (200, b"application/vnd.apache.parquet"),
+    (200, b"application/vnd.apache.arrow.stream"),
+    (304, b"application/json"),
+])
+def test_passthrough_responses_are_untouched(status, content_type):
+    async def run():
+        body = b"" if status == 304 else BODY
+        app = respond(status=status, headers=[(b"content-type", content_type)], chunks=(body,))
+        response = await fetch(CompressionMiddleware(app, minimum_size=0))
+        assert response.status_code == status
+        assert "content-encoding" not in response.headers and "vary" not in response.headers
+        assert response.content == body
+
+    asyncio.run(run())
+
+
+def test_encoded_upstream_bodies_are_not_compressed_again():
+    async def run():
+        compressed = gzip.compress(BODY)
+        headers = [(b"content-type", b"application/json"), (b"content-encoding", b"gzip")]
+        response = await fetch(CompressionMiddleware(respond(headers=headers, chunks=(compressed,)), minimum_size=0))
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.num_bytes_downloaded == len(compressed)
+        assert response.content == BODY
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import threading
+import time
+
+from mock_social_api.executor import LoopLagMonitor, run_blocking
+
+
+def test_loop_lag_monitor_reports_blocking_callbacks(caplog):
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        task = asyncio.create_task(monitor.run())
+        try:
+            await asyncio.sleep(0.05)
+            assert monitor.slow_callbacks == 0
+
+            # A callback holding the loop past the threshold
+            asyncio.get_running_loop().call_soon(time.sleep, 0.12)
+            await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+        return monitor
+
+    with caplog.at_level(logging.WARNING, logger="mock_social_api.executor"):
+        monitor = asyncio.run(run())
+    assert monitor.slow_callbacks == 1
+    assert 0.05 < monitor.max_lag < 0.5
+    assert "Event loop was blocked for" in caplog.text
+
+
+def test_loop_lag_monitor_threshold():
+    monitor = LoopLagMonitor(interval=1, threshold=0.1)
+    monitor.record(0.1)
+    monitor.record(0.02)
+    assert (monitor.slow_callbacks, monitor.max_lag) == (0, 0.1)
+    monitor.record(0.3)
+    assert (monitor.slow_callbacks, monitor.max_lag) == (1, 0.3)
+
+
+def test_run_blocking_keeps_the_loop_free():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        task = asyncio.create_task(monitor.run())
+        try:
+            thread = await run_blocking(lambda: (time.sleep(0.12), threading.current_thread())[1])
+        finally:
+            task.cancel()
+        assert thread is not threading.main_thread()
+        assert monitor.slow_callbacks == 0
+
+    asyncio.run(run())
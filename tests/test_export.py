@@ -0,0 +1,143 @@
+import asyncio
+import io
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+from mock_social_api import export as export_module
+from mock_social_api.export import ExportFailed, ExportFormat, ExportStream, ExportTable, write_export
+from mock_social_api.main import app
+from mock_social_api.ratelimit import export_limiter
+from mock_social_api.schemas.instagram_schema import IComment, IPost, IStory, IUser
+from mock_social_api.store import ExportFilter, MemoryStore
+
+NOW = datetime(2024, 10, 3, 12, tzinfo=timezone.utc)
+
+
+def dataset(n: int = 3) -> MemoryStore:
+    return MemoryStore({
+        f"user{i}": IUser(
+            stories=[IStory(content=f"#sun day {i}", timestamp=NOW - timedelta(days=i), likes=i)],
+            posts=[IPost(
+                content="#travel" if i % 2 else "#food",
+                timestamp=NOW - timedelta(days=i),
+                likes=10 * i,
+                comments=[IComment(username="fan", content="nice", timestamp=NOW)],
+            )],
+            private=False,
+            followers=100 + i,
+        )
+        for i in range(n)
+    })
+
+
+def test_write_export_applies_filters():
+    store = dataset()
+    sink = io.BytesIO()
+    filters = ExportFilter(hashtag="#travel")
+    assert write_export(store, ExportTable.posts, filters, sink, ExportFormat.parquet, batch_size=1) == 1
+    sink.seek(0)
+    table = pyarrow.parquet.read_table(sink)
+    assert table.column_names == ["username", "timestamp", "content", "hashtags", "likes", "link"]
+    assert table.column("username").to_pylist() == ["user1"]
+    assert table.column("hashtags").to_pylist() == [["#travel"]]
+
+    sink = io.BytesIO()
+    filters = ExportFilter(usernames=frozenset({"user0", "user2"}), since=NOW - timedelta(days=1))
+    assert write_export(store, ExportTable.stories, filters, sink, ExportFormat.arrow) == 1
+    table = pyarrow.ipc.open_stream(sink.getvalue()).read_all()
+    assert table.column("username").to_pylist() == ["user0"]
+    assert table.column("timestamp").to_pylist() == [NOW]
+
+    sink = io.BytesIO()
+    assert write_export(store, ExportTable.comments, ExportFilter(), sink, ExportFormat.arrow, batch_size=2) == 3
+    assert pyarrow.ipc.open_stream(sink.getvalue()).read_all().num_rows == 3
+
+
+def test_export_stream_stops_its_writer_when_cancelled(monkeypatch, caplog):
+    # One chunk per write, so the writer fills the queue and waits on the reader
+    monkeypatch.setattr(export_module, "_CHUNK_SIZE", 1)
+
+    async def run():
+        stream = ExportStream(dataset(200), ExportTable.posts, ExportFilter(), ExportFormat.arrow)
+        chunks = stream.__aiter__()
+        assert await chunks.__anext__()
+        await chunks.aclose()
+        await asyncio.wait_for(stream._task, 5)
+
+        # The owner of a response cancelled mid-send stops it without iterating
+        stream = ExportStream(dataset(200), ExportTable.posts, ExportFilter(), ExportFormat.arrow)
+        chunks = stream.__aiter__()
+        assert await chunks.__anext__()
+        stream.cancel()
+        await asyncio.wait_for(stream._task, 5)
+
+    with caplog.at_level(logging.INFO, logger=export_module.__name__):
+        asyncio.run(run())
+    assert [record.getMessage() for record in caplog.records] == ["Export of posts cancelled"] * 2
+
+
+def test_failed_export_aborts_the_response(monkeypatch, use_store):
+    def failing(store, table, filters, sink, format, batch_size=None):
+        sink.write(b"partial")
+        raise OSError("disk on fire")
+
+    monkeypatch.setattr(export_module, "write_export", failing)
+
+    async def run():
+        stream = ExportStream(dataset(), ExportTable.users, ExportFilter(), ExportFormat.arrow)
+        received = []
+        with pytest.raises(ExportFailed) as excinfo:
+            async for chunk in stream:
+                received.append(chunk)
+        assert isinstance(excinfo.value.__cause__, OSError)
+        # What was written before the failure is dropped with the rest
+        assert received == []
+
+        transport = httpx.ASGITransport(app=app, client=("10.0.40.1", 123))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # The app raises instead of ending the response, so the server aborts it
+            with pytest.raises(Exception):
+                await client.get("/api/v1/export/users", params={"format": "arrow"})
+        assert export_limiter.in_flight == 0
+
+    use_store(dataset())
+    asyncio.run(run())
+
+
+def test_export_endpoint_streams_and_releases_its_slot(use_store):
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("10.0.40.2", 123))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/export/users", params={"username": ["user1", "user2"]})
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/vnd.apache.parquet"
+            assert response.headers["content-disposition"] == 'attachment; filename="users.parquet"'
+            table = pyarrow.parquet.read_table(io.BytesIO(response.content))
+            assert table.column("followers").to_pylist() == [101, 102]
+        assert export_limiter.in_flight == 0
+
+    use_store(dataset())
+    asyncio.run(run())
+
+
+def test_export_without_pyarrow_is_501(monkeypatch):
+    # A None entry makes the import fail as if the package were missing
+    for module in ("pyarrow", "pyarrow.ipc", "pyarrow.parquet"):
+        monkeypatch.setitem(sys.modules, module, None)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("10.0.40.3", 123))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/export/users")
+            assert response.status_code == 501
+            assert response.json() == {"detail": "Exports need the optional pyarrow package"}
+        assert export_limiter.in_flight == 0
+
+    asyncio.run(run())
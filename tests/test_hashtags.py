@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from mock_social_api.hashtags import HashtagRegistry, canonicalize_query, extract_hashtags, merge_hashtags, normalize
+from mock_social_api.schemas.instagram_schema import IPost
+
+
+@pytest.mark.parametrize(("hashtag", "expected"), [
+    ("#Vacation", "#vacation"),
+    ("vacation", "#vacation"),
+    ("  #VACATION ", "#vacation"),
+    ("＃ｖａｃａｔｉｏｎ", "#vacation"),
+    ("#Vacation!", "#vacation"),
+    ("#été_2024", "#été_2024"),
+    ("", ""),
+    ("#", ""),
+    ("!vacation", ""),
+])
+def test_normalize(hashtag, expected):
+    assert normalize(hashtag) == expected
+
+
+def test_extract_hashtags():
+    content = "#Travel to the beach! #sun,#SUN and #travel again (#Été) ＃ＴＲＡＶＥＬ"
+    assert extract_hashtags(content) == ["#travel", "#sun", "#été"]
+    # Only at the start of the text or after a non-word character
+    assert extract_hashtags("mail me at me#home or abc＃def") == []
+    assert extract_hashtags("no tags here") == []
+
+
+def test_merge_hashtags_reads_listed_tags_like_content():
+    assert merge_hashtags(["#Vacation!", "", "#"], "Sunny #vacation #beach") == ["#vacation", "#beach"]
+    post = IPost(content="At the #Beach", timestamp=datetime.now(timezone.utc), likes=1, hashtags=["Sun!", "#BEACH"])
+    assert post.hashtags == ["#sun", "#beach"]
+
+
+@pytest.mark.parametrize("query", ["#Vacation", "vacation", "%23vacation", "%23Vacation", "＃ｖａｃａｔｉｏｎ"])
+def test_canonicalize_query(query):
+    assert canonicalize_query(query) == "#vacation"
+
+
+def test_canonicalize_query_without_a_hashtag_matches_nothing():
+    assert canonicalize_query("") == ""
+    assert canonicalize_query("%23") == ""
+
+
+def test_registry_interns_hashtags():
+    registry = HashtagRegistry()
+    assert registry.lookup("#travel") is None
+    travel, sun = registry.intern("#travel"), registry.intern("#sun")
+    assert (travel, sun) == (0, 1)
+    assert registry.intern("#travel") == travel and registry.lookup("#sun") == sun
+    assert registry.name(sun) == "#sun" and len(registry) == 2
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from mock_social_api import config, constants
+from mock_social_api.http_cache import cache_max_age
+from mock_social_api.main import app
+from mock_social_api.schemas.instagram_schema import IPost, IStory
+from mock_social_api.snapshot import open_snapshot, write_snapshot
+from mock_social_api.store import MemoryStore
+from mock_social_api.store.sqlite import SQLiteStore
+
+PATH = "/api/v1/instagram/count-posts"
+PARAMS = {"username": "user2", "hashtag": "#travel"}
+
+
+def fresh_store() -> MemoryStore:
+    return MemoryStore(constants._build_mock_users())
+
+
+def test_max_age_never_extends_past_paris_midnight():
+    assert config.HTTP_CACHE_MAX_AGE == 60
+    # 14:00 and 23:59:30 in Paris (UTC+2)
+    assert cache_max_age(datetime(2024, 10, 3, 12, tzinfo=timezone.utc)) == 60
+    assert cache_max_age(datetime(2024, 10, 3, 21, 59, 30, tzinfo=timezone.utc)) == 30
+    assert cache_max_age(datetime(2024, 10, 3, 22, tzinfo=timezone.utc)) == 60
+    # The night clocks go back, midnight is still 23:00 UTC the day before (UTC+1)
+    assert cache_max_age(datetime(2024, 10, 27, 22, 59, 50, tzinfo=timezone.utc)) == 10
+
+
+def test_not_modified_across_processes_until_a_write(use_store):
+    async def run():
+        store = use_store(fresh_store())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(PATH, params=PARAMS)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert etag.startswith('W/"')
+            assert response.headers["cache-control"].startswith("public, max-age=")
+
+            response = await client.get(PATH, params=PARAMS, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.headers["etag"] == etag and response.content == b""
+            response = await client.get(PATH, params=PARAMS, headers={"If-None-Match": f'"other", {etag}'})
+            assert response.status_code == 304
+            response = await client.get(PATH, params={**PARAMS, "timeframe": "today_midnight"}, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+
+            # Another process serving the same dataset accepts the ETag
+            use_store(fresh_store())
+            response = await client.get(PATH, params=PARAMS, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+            # A write to the user invalidates it, and the same write elsewhere gives the same ETag
+            post = IPost(content="#travel", timestamp=datetime.now(timezone.utc), likes=1)
+            store.add_post("user2", post)
+            use_store(store)
+            response = await client.get(PATH, params=PARAMS, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            written = response.headers["etag"]
+            assert written != etag
+
+            other = fresh_store()
+            other.add_post("user2", post)
+            use_store(other)
+            assert (await client.get(PATH, params=PARAMS)).headers["etag"] == written
+
+            # A different write never collides with it
+            other = fresh_store()
+            other.add_story("user2", IStory(content="#travel", timestamp=post.timestamp, likes=1))
+            use_store(other)
+            assert (await client.get(PATH, params=PARAMS)).headers["etag"] not in (etag, written)
+
+    asyncio.run(run())
+
+
+def test_epoch_comes_from_the_dataset(tmp_path):
+    assert fresh_store().epoch == fresh_store().epoch
+    changed = constants._build_mock_users()
+    changed["user1"] = changed["user1"].model_copy(update={"followers": 151})
+    assert MemoryStore(changed).epoch != fresh_store().epoch
+
+    # The digest is of the dataset the store started from, however late it is asked for
+    written = fresh_store()
+    written.put_user("user1", changed["user1"])
+    assert written.epoch == fresh_store().epoch
+    assert MemoryStore(changed, version="2024-10").epoch == "2024-10"
+
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(constants._build_mock_users(), path)
+    first, second = MemoryStore(open_snapshot(path)), MemoryStore(open_snapshot(path))
+    assert first.epoch == second.epoch
+    write_snapshot(changed, path)
+    assert MemoryStore(open_snapshot(path)).epoch != first.epoch
+
+
+def test_sqlite_versions_are_persisted(tmp_path):
+    path = str(tmp_path / "users.db")
+    first = SQLiteStore(path)
+    for username, user in constants._build_mock_users().items():
+        first.put_user(username, user)
+    second = SQLiteStore(path)
+    try:
+        assert first.epoch == second.epoch
+        assert first.version("user2") == second.version("user2") == "1"
+        assert second.version("nobody") == ""
+
+        first.add_story("user2", IStory(content="#travel", timestamp=datetime.now(timezone.utc) - timedelta(hours=1), likes=1))
+        assert second.version("user2") == "2"
+        second.put_user("user2", first.get_user("user2"))
+        assert first.version("user2") == "3"
+        assert first.version("user1") == "1"
+    finally:
+        first.close()
+        second.close()
+    assert SQLiteStore(str(tmp_path / "other.db")).epoch != first.epoch
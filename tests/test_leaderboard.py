@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+from mock_social_api.leaderboard import TIMEFRAMES, Leaderboards, TopK
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store import MemoryStore
+
+
+def at(day: int, hour: int) -> datetime:
+    return datetime(2024, 10, day, hour, tzinfo=timezone.utc)
+
+
+def make_store() -> MemoryStore:
+    return MemoryStore({
+        "a": IUser(
+            stories=[IStory(content="#x", timestamp=at(1, 12), likes=3)],
+            posts=[IPost(content="#x", timestamp=at(3, 10), likes=5)],
+            private=False,
+            followers=1,
+        ),
+        "b": IUser(stories=[], posts=[IPost(content="#x", timestamp=at(3, 9), likes=8)], private=False, followers=1),
+        "c": IUser(
+            stories=[],
+            posts=[IPost(content="#x #y", timestamp=datetime(2024, 9, 30, 12, tzinfo=timezone.utc), likes=10)],
+            private=False,
+            followers=1,
+        ),
+    })
+
+
+def subscribed(store: MemoryStore, clock: Callable[[], datetime]) -> Leaderboards:
+    leaderboards = Leaderboards(store, clock)
+    store.add_listener(leaderboards.on_store_event)
+    return leaderboards
+
+
+def snapshot(leaderboards: Leaderboards) -> dict:
+    return {
+        timeframe: (
+            leaderboards.top_hashtags(timeframe, 100),
+            {tag: leaderboards.top_users(tag, timeframe, 100) for tag in ("#x", "#y")},
+        )
+        for timeframe in TIMEFRAMES
+    }
+
+
+def test_top_k_orders_by_score_then_key():
+    board = TopK()
+    for key, delta in [("b", 5), ("a", 5), ("c", 7), ("d", 1), ("a", 3)]:
+        board.add(key, delta)
+    assert board.top(10) == [("a", 8), ("c", 7), ("b", 5), ("d", 1)]
+    assert board.top(2) == [("a", 8), ("c", 7)]
+
+    board.add("c", -7)
+    board.discard("d")
+    board.discard("missing")
+    assert board.top(10) == [("a", 8), ("b", 5), ("c", 0)]
+    assert (len(board), board.score("d")) == (3, 0)
+
+
+def test_top_k_heap_stays_bounded():
+    board = TopK()
+    for i in range(10_000):
+        board.add(f"user{i % 10}", 1)
+    assert len(board._heap) <= 2 * len(board) + 16
+    assert board.top(3) == [("user0", 1000), ("user1", 1000), ("user2", 1000)]
+    # Reading does not lose entries
+    assert board.top(10) == board.top(10) and len(board.top(10)) == 10
+
+
+def test_leaderboards_rank_users_and_hashtags(clock):
+    # Thursday October 3rd, 14:00 in Paris
+    leaderboards = Leaderboards(make_store(), clock)
+    since, users = leaderboards.top_users("#x", "last_sunday_midnight", 10)
+    assert since == datetime(2024, 9, 28, 22, tzinfo=timezone.utc)
+    assert users == [("c", 10), ("a", 8), ("b", 8)]
+    assert leaderboards.top_users("#x", "last_sunday_midnight", 1)[1] == [("c", 10)]
+    assert leaderboards.top_users("#x", "today_midnight", 10)[1] == [("b", 8), ("a", 5)]
+    assert leaderboards.top_users("#unused", "today_midnight", 10)[1] == []
+    assert leaderboards.top_hashtags("last_sunday_midnight", 10)[1] == [("#x", 4), ("#y", 1)]
+    assert leaderboards.top_hashtags("today_midnight", 10)[1] == [("#x", 2)]
+
+
+def test_replaced_users_are_updated_in_place(clock):
+    store = make_store()
+    leaderboards = subscribed(store, clock)
+    leaderboards.top_hashtags("today_midnight", 10)
+    windows = dict(leaderboards._windows)
+
+    store.put_user("b", IUser(stories=[], posts=[], private=False, followers=1))
+    store.put_user("c", IUser(stories=[IStory(content="#y", timestamp=at(3, 11), likes=1)], posts=[], private=False, followers=1))
+    store.add_post("a", IPost(content="#y", timestamp=at(3, 11), likes=2))
+
+    # Nothing was rebuilt, yet the boards match ones built from scratch
+    assert leaderboards._windows == windows
+    assert leaderboards.top_users("#x", "last_sunday_midnight", 10)[1] == [("a", 8)]
+    assert leaderboards.top_users("#y", "today_midnight", 10)[1] == [("a", 2), ("c", 1)]
+    assert leaderboards.top_hashtags("today_midnight", 10)[1] == [("#y", 2), ("#x", 1)]
+    assert snapshot(leaderboards) == snapshot(Leaderboards(store, clock))
+
+
+def test_windows_roll_over_at_their_boundary(clock):
+    store = make_store()
+    leaderboards = subscribed(store, clock)
+    assert leaderboards.top_hashtags("today_midnight", 10)[1] == [("#x", 2)]
+
+    # 00:30 on Friday in Paris: today's boards start again, the week's go on
+    clock.now = at(3, 22) + timedelta(minutes=30)
+    since, hashtags = leaderboards.top_hashtags("today_midnight", 10)
+    assert (since, hashtags) == (at(3, 22), [])
+    store.add_post("b", IPost(content="#y", timestamp=clock.now, likes=4))
+    assert leaderboards.top_users("#y", "today_midnight", 10)[1] == [("b", 4)]
+    assert leaderboards.top_hashtags("last_sunday_midnight", 10)[1] == [("#x", 4), ("#y", 2)]
+
+    # 00:30 on Monday: the week starts again too
+    clock.now = at(6, 22) + timedelta(minutes=30)
+    since, hashtags = leaderboards.top_hashtags("last_sunday_midnight", 10)
+    assert (since, hashtags) == (at(5, 22), [])
+    assert leaderboards.top_users("#x", "last_sunday_midnight", 10)[1] == []
+
+
+def test_first_read_builds_off_the_loop_and_keeps_concurrent_writes(clock):
+    store = make_store()
+    leaderboards = subscribed(store, clock)
+    threads = []
+    written = set()
+    get_user = store.get_user
+
+    def scanning_get_user(username):
+        threads.append(threading.current_thread())
+        if username == "c" and "c" not in written:
+            # A write to a user the build has already scanned
+            written.add("c")
+            store.add_post("a", IPost(content="#y", timestamp=at(3, 11), likes=6))
+        return get_user(username)
+
+    store.get_user = scanning_get_user
+
+    async def run():
+        await leaderboards.ready()
+
+    asyncio.run(run())
+    assert threads and threading.main_thread() not in threads
+    store.get_user = get_user
+    assert leaderboards.top_users("#y", "today_midnight", 10)[1] == [("a", 6)]
+    assert snapshot(leaderboards) == snapshot(Leaderboards(store, clock))
@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from mock_social_api.main import app
+from mock_social_api.proxy import PROXY_ROUTES, ProxyRoute
+from mock_social_api.ratelimit import upstream_limiter
+
+RealAsyncClient = httpx.AsyncClient
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Route the proxy's upstream calls to a handler the test sets, recording each request."""
+    state = {"requests": [], "handler": None}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        state["requests"].append(request)
+        return await state["handler"](request)
+
+    def client(**kwargs):
+        return RealAsyncClient(transport=httpx.MockTransport(handle), **kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", client)
+    return state
+
+
+async def streamed(*chunks: bytes):
+    """A body the way a real transport delivers it, rather than already read."""
+    for chunk in chunks:
+        yield chunk
+
+
+def test_upstream_gets_the_client_encoding_or_identity(upstream):
+    payload = b'{"campaigns": []}' * 64
+    compressed = gzip.compress(payload)
+
+    async def handler(request):
+        if request.headers["accept-encoding"] == "identity":
+            return httpx.Response(200, content=streamed(payload), headers={"content-type": "application/json"})
+        return httpx.Response(200, content=streamed(compressed), headers={"content-type": "application/json", "content-encoding": "gzip"})
+
+    upstream["handler"] = handler
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("10.0.35.1", 123))
+        async with RealAsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/upstar/campaigns", headers={"accept-encoding": "gzip"})
+            assert upstream["requests"][-1].headers["accept-encoding"] == "gzip"
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.content == payload
+
+            # Without Accept-Encoding the upstream must not pick one the client cannot read
+            request = client.build_request("GET", "/upstar/campaigns")
+            del request.headers["accept-encoding"]
+            response = await client.send(request)
+            assert upstream["requests"][-1].headers["accept-encoding"] == "identity"
+            assert "content-encoding" not in response.headers
+            assert response.content == payload
+        assert upstream_limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_bodies_are_streamed_as_they_arrive(upstream):
+    chunk = b"x" * 1024
+
+    async def handler(request):
+        async def body():
+            yield chunk
+            await upstream["release"].wait()
+            yield chunk
+
+        return httpx.Response(200, content=body(), headers={"content-type": "application/octet-stream"})
+
+    upstream["handler"] = handler
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        received = asyncio.Queue()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/upstar/files", "raw_path": b"/upstar/files", "root_path": "",
+            "query_string": b"", "headers": [(b"host", b"test")], "client": ("10.0.35.2", 123),
+            "server": ("test", 80),
+        }
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # The client stays connected until the response is done
+            await asyncio.Event().wait()
+
+        async def send(message):
+            await received.put(message)
+
+        task = asyncio.create_task(app(scope, receive, send))
+        assert (await asyncio.wait_for(received.get(), 1))["status"] == 200
+        first = await asyncio.wait_for(received.get(), 1)
+        # The first chunk reached the client while the upstream still holds the second
+        assert first["body"] == chunk and first["more_body"]
+        assert upstream_limiter.in_flight == 1
+
+        upstream["release"].set()
+        rest = b""
+        while True:
+            message = await asyncio.wait_for(received.get(), 1)
+            rest += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        assert rest == chunk
+        await asyncio.wait_for(task, 1)
+        assert upstream_limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_only_allowed_headers_and_routes_are_forwarded(upstream):
+    async def handler(request):
+        return httpx.Response(200, content=streamed(b"{}"), headers={"content-type": "application/json"})
+
+    upstream["handler"] = handler
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("10.0.36.1", 123))
+        async with RealAsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/upstar/campaigns", headers={
+                "authorization": "Bearer token", "cookie": "session=secret", "x-forwarded-for": "1.2.3.4",
+            })
+            assert response.status_code == 200
+            forwarded = upstream["requests"][-1].headers
+            assert forwarded["authorization"] == "Bearer token"
+            assert "cookie" not in forwarded and "x-forwarded-for" not in forwarded
+
+            assert (await client.post("/upstar/campaigns")).status_code == 405
+
+            # Once the upstream's paths are configured, anything else is unknown
+            default = PROXY_ROUTES[:]
+            PROXY_ROUTES[:] = [ProxyRoute(prefix="campaigns/")]
+            try:
+                assert (await client.get("/upstar/campaigns/1")).status_code == 200
+                assert (await client.get("/upstar/admin")).status_code == 404
+            finally:
+                PROXY_ROUTES[:] = default
+        assert len(upstream["requests"]) == 2
+
+    asyncio.run(run())
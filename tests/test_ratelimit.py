@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+
+from mock_social_api.ratelimit import (
+    LocalSharedClient, MemoryBackend, RateLimitMiddleware, RateLimitPolicy, SharedBackend, client_key
+)
+
+POLICY = RateLimitPolicy(name="test", rate=2, burst=3)
+
+
+async def ok(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def limited_client(backend, api_keys: frozenset[str] = frozenset()) -> httpx.AsyncClient:
+    app = RateLimitMiddleware(ok, backend=backend, policies=[("/limited/", POLICY)], api_keys=api_keys)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_bucket_empties_and_refills(monotonic_clock):
+    clock = monotonic_clock
+
+    async def run():
+        async with limited_client(SharedBackend(LocalSharedClient(clock))) as client:
+            for remaining in (2, 1, 0):
+                response = await client.get("/limited/a")
+                assert response.status_code == 200
+                assert response.headers["ratelimit-limit"] == "3"
+                assert response.headers["ratelimit-remaining"] == str(remaining)
+                assert "retry-after" not in response.headers
+            assert response.headers["ratelimit-reset"] == "2"  # 3 tokens at 2 per second
+
+            response = await client.get("/limited/a")
+            assert response.status_code == 429
+            assert response.json() == {"detail": "Too many requests"}
+            assert response.headers["retry-after"] == "1"
+            assert response.headers["ratelimit-remaining"] == "0"
+
+            # Half a second buys one token back
+            clock.now += 0.5
+            response = await client.get("/limited/a")
+            assert response.status_code == 200 and response.headers["ratelimit-remaining"] == "0"
+
+            # A full bucket never holds more than the burst
+            clock.now += 60
+            response = await client.get("/limited/a")
+            assert response.headers["ratelimit-remaining"] == "2"
+
+            # Other paths are not limited
+            response = await client.get("/free")
+            assert response.status_code == 200 and "ratelimit-limit" not in response.headers
+
+    asyncio.run(run())
+
+
+def test_shared_backends_draw_from_one_bucket(monotonic_clock):
+    async def run():
+        server = LocalSharedClient(monotonic_clock)
+        async with limited_client(SharedBackend(server)) as worker1, limited_client(SharedBackend(server)) as worker2:
+            assert (await worker1.get("/limited/a")).headers["ratelimit-remaining"] == "2"
+            assert (await worker2.get("/limited/a")).headers["ratelimit-remaining"] == "1"
+            assert (await worker1.get("/limited/a")).status_code == 200
+            assert (await worker2.get("/limited/a")).status_code == 429
+        assert list(server.buckets) == ["ratelimit:test:ip:127.0.0.1"]
+
+    asyncio.run(run())
+
+
+def test_only_known_api_keys_get_their_own_bucket(monotonic_clock):
+    scope = {"headers": [(b"x-api-key", b"known")], "client": ("10.0.0.1", 1234)}
+    assert client_key(scope, frozenset({"known"})) == "key:known"
+    assert client_key(scope) == "ip:10.0.0.1"
+    assert client_key({"headers": [], "client": None}, frozenset({""})) == "ip:unknown"
+
+    async def run():
+        backend = MemoryBackend(max_keys=2, clock=monotonic_clock)
+        async with limited_client(backend, api_keys=frozenset({"known"})) as client:
+            for _ in range(3):
+                await client.get("/limited/a")
+            # Rotating unknown keys neither resets the caller's bucket nor evicts others
+            for i in range(10):
+                response = await client.get("/limited/a", headers={"X-API-Key": f"made-up-{i}"})
+                assert response.status_code == 429
+            response = await client.get("/limited/a", headers={"X-API-Key": "known"})
+            assert response.status_code == 200
+        assert list(backend._buckets) == ["test:ip:127.0.0.1", "test:key:known"]
+
+    asyncio.run(run())
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from mock_social_api import constants
+from mock_social_api.main import app
+from mock_social_api.rollups import DailyActivityRollups
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.store import MemoryStore, StoreEvent
+
+
+def make_store() -> MemoryStore:
+    return MemoryStore(dict(constants.mock_users))
+
+
+async def settle() -> None:
+    """Let listener callbacks and the dirty-user task run."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_rollups_match_store_activity(clock):
+    async def run():
+        store = make_store()
+        rollups = DailyActivityRollups(store, clock)
+        since = rollups.window()
+        assert since == datetime(2024, 10, 2, 22, tzinfo=timezone.utc)
+        for username, user in store.users().items():
+            rollup = await rollups.activity(username)
+            assert rollup is not None and rollup.followers == user.followers
+            for hashtag in ("#vacation", "#travel", "#unused"):
+                counts = rollup.counts(hashtag)
+                activity = store.hashtag_activity(username, hashtag, since)
+                assert (counts.stories, counts.posts, counts.story_likes + counts.post_likes) == activity
+
+        user1 = rollups.get("user1").counts("#vacation")
+        assert (user1.stories, user1.posts, user1.story_likes, user1.post_likes) == (2, 1, 8, 7)
+        assert rollups.get("nobody") is None
+        assert await rollups.activity("nobody") is None
+
+    asyncio.run(run())
+
+
+def test_ingest_updates_rollups_incrementally(clock):
+    async def run():
+        store = make_store()
+        rollups = DailyActivityRollups(store, clock)
+        rollups.start()
+        try:
+            # Nothing is built, nor the store followed, until a reader needs it
+            await settle()
+            assert rollups.rebuilt_at is None and rollups.on_store_event not in store._listeners
+            assert rollups.get("user2") is None
+
+            before = await rollups.activity("user2")
+            assert before is not None and before.counts("#travel").posts == 0
+            assert rollups.get("user2") is before
+
+            clock.now += timedelta(minutes=5)
+            post = IPost(content="Back on the road #Travel", timestamp=clock.now, likes=4)
+            store.add_post("user2", post)
+            await settle()
+            rollup = rollups.get("user2")
+            # Folded into the same rollup rather than recomputed
+            assert rollup is before
+            assert rollup.updated_at == clock.now
+            assert (rollup.counts("#travel").posts, rollup.counts("#travel").post_likes) == (1, 4)
+
+            # The same item seen twice is counted once
+            rollups.apply(StoreEvent("post", "user2", post))
+            assert rollup.counts("#travel").posts == 1
+
+            # A replaced user is recomputed by the background task
+            store.put_user("user2", IUser(stories=[], posts=[], private=False, followers=42))
+            await settle()
+            rollup = rollups.get("user2")
+            assert rollup is not None and rollup.followers == 42
+            assert rollup.counts("#travel").posts == 0
+
+            # Stories before the window are not counted
+            store.add_story("user2", IStory(content="#travel", timestamp=clock.now - timedelta(days=2), likes=9))
+            await settle()
+            assert rollups.get("user2").counts("#travel").stories == 0
+        finally:
+            await rollups.stop()
+
+    asyncio.run(run())
+
+
+def test_rollups_roll_over_at_paris_midnight(clock):
+    async def run():
+        store = make_store()
+        # 23:30 in Paris on October 3rd
+        clock.now = datetime(2024, 10, 3, 21, 30, tzinfo=timezone.utc)
+        rollups = DailyActivityRollups(store, clock)
+        assert (await rollups.activity("user1")).counts("#vacation").stories == 2
+        assert (await rollups.activity("user2")) is not None
+
+        clock.now += timedelta(hours=1)
+        # Yesterday's rollups are never served once midnight has passed
+        assert rollups.get("user1") is None
+        rollup = await rollups.activity("user1")
+        assert rollup.since == datetime(2024, 10, 3, 22, tzinfo=timezone.utc)
+        assert rollup.counts("#vacation").stories == 1
+
+        # Only the rollups readers asked for are rebuilt, and users gone from the store are dropped
+        store._users.pop("user2")
+        await rollups.rebuild()
+        assert rollups.rebuilt_at == clock.now
+        assert rollups.get("user1").since == rollup.since
+        assert list(rollups._rollups) == ["user1"]
+
+    asyncio.run(run())
+
+
+def test_daily_activity_endpoints_fall_back_to_rollups(store):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Scripted scenarios are unchanged
+            response = await client.get("/api/v1/instagram/daily-activity", params={"username": "user1", "hashtag": "#vacation"})
+            assert response.json() == {
+                "followers": 150, "stories_with_hashtag": 2, "posts_with_hashtag": 1, "total_likes": 18, "username": "user1",
+            }
+
+            response = await client.get("/api/v1/instagram/daily-activity", params={"username": "user2", "hashtag": "travel"})
+            body = response.json()
+            assert response.status_code == 200
+            assert body["username"] == "user2" and body["followers"] == 0
+            assert set(body["meta"]) == {"since", "updated_at"}
+
+            # TikTok has no stored data to fall back to
+            response = await client.get("/api/v1/tiktok/daily-activity", params={"username": "user2", "hashtag": "#travel"})
+            assert response.status_code == 404
+
+            response = await client.get("/api/v1/instagram/daily-activity", params={"username": "user3", "hashtag": "#travel"})
+            assert response.status_code == 403
+            response = await client.get("/api/v1/tiktok/daily-activity", params={"username": "nobody", "hashtag": "#travel"})
+            assert response.status_code == 404
+
+    asyncio.run(run())
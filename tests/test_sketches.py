@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from datetime import date, datetime, timezone
+
+import httpx
+import pytest
+
+from mock_social_api.main import app
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.sketches import CountMinSketch, HashtagStats, HyperLogLog
+from mock_social_api.store import MemoryStore
+
+
+def users(start: int, stop: int) -> list[str]:
+    return [f"user{i}" for i in range(start, stop)]
+
+
+def filled(values: list[str], p: int = 12) -> HyperLogLog:
+    sketch = HyperLogLog(p)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_hyperloglog_is_exact_for_few_values():
+    sketch = filled(users(0, 64) * 2)
+    assert sketch.exact and sketch.count() == 64 and sketch.relative_error == 0.0
+    assert sketch.discard("user3") and sketch.count() == 63
+
+    sketch.add("user3")
+    sketch.add("user64")
+    assert not sketch.exact and sketch.relative_error == pytest.approx(0.01625)
+    assert abs(sketch.count() - 65) <= 2
+    assert not sketch.discard("user3")
+
+
+@pytest.mark.parametrize("n", [1_000, 20_000, 200_000])
+def test_hyperloglog_error_is_within_three_standard_errors(n):
+    sketch = filled(users(0, n))
+    assert abs(sketch.count() - n) / n < 3 * sketch.relative_error
+
+
+def test_hyperloglog_merge():
+    left = filled(users(0, 30_000))
+    right = filled(users(15_000, 45_000))
+    left.merge(right)
+    assert abs(left.count() - 45_000) / 45_000 < 3 * left.relative_error
+    assert left.count() == filled(users(0, 45_000)).count()
+
+    # Exact sketches stay exact until their union is too large
+    small = filled(users(0, 10))
+    small.merge(filled(users(5, 20)))
+    assert small.exact and small.count() == 20
+    small.merge(filled(users(20, 100)))
+    assert not small.exact and small.count() == filled(users(0, 100)).count()
+
+    # Either side may be the dense one
+    dense = filled(users(0, 1_000))
+    dense.merge(filled(users(1_000, 1_010)))
+    exact = filled(users(1_000, 1_010))
+    exact.merge(filled(users(0, 1_000)))
+    assert dense.registers == exact.registers
+
+    with pytest.raises(ValueError):
+        dense.merge(HyperLogLog(10))
+
+
+@pytest.mark.parametrize("n", [0, 40, 5_000])
+def test_hyperloglog_bytes_round_trip(n):
+    sketch = filled(users(0, n), p=10)
+    data = sketch.to_bytes()
+    copy = HyperLogLog.from_bytes(data)
+    assert (copy.p, copy.exact, copy.count()) == (10, sketch.exact, sketch.count())
+    assert copy.to_bytes() == data
+    copy.add("someone else")
+    assert copy.count() >= sketch.count()
+    if sketch.exact:
+        assert len(data) == 1 + 8 * n
+    else:
+        assert len(data) == 1 + 2**10
+
+
+def test_count_min_sketch():
+    sketch = CountMinSketch()
+    exact = {f"#tag{i}": i % 17 + 1 for i in range(3_000)}
+    for key, count in exact.items():
+        sketch.add(key, count)
+    assert sketch.total == sum(exact.values())
+    overcounts = [sketch.estimate(key) - count for key, count in exact.items()]
+    assert min(overcounts) >= 0
+    assert sum(overcount > sketch.error_bound for overcount in overcounts) <= 3 * sketch.delta * len(exact)
+
+    copy = CountMinSketch.from_bytes(sketch.to_bytes())
+    assert copy.to_bytes() == sketch.to_bytes()
+    copy.merge(sketch)
+    assert copy.total == 2 * sketch.total
+    assert copy.estimate("#tag5") == 2 * sketch.estimate("#tag5")
+
+
+def test_hashtag_stats_follow_replaced_users():
+    now = datetime(2024, 10, 3, 12, tzinfo=timezone.utc)
+    store = MemoryStore({
+        "a": IUser(stories=[IStory(content="#x", timestamp=now, likes=1)], posts=[], private=False, followers=1),
+        "b": IUser(stories=[], posts=[IPost(content="#x #y", timestamp=now, likes=1)], private=False, followers=1),
+    })
+    stats = HashtagStats(store, clock=lambda: now)
+    store.add_listener(stats.on_store_event)
+    today = date(2024, 10, 3)
+    assert stats.reach("#x", today) == (2, 0.0)
+    assert stats.mentions("#x", today)[0] == 2
+
+    store.put_user("b", IUser(stories=[], posts=[IPost(content="#y", timestamp=now, likes=1)], private=False, followers=1))
+    assert stats._built
+    assert stats.reach("#x", today) == (1, 0.0)
+    assert stats.reach("#y", today) == (1, 0.0)
+    assert stats.mentions("#x", today)[0] == 1
+    assert stats.mentions("#y", today)[0] == 1
+
+    store.add_story("b", IStory(content="#x again", timestamp=now, likes=1))
+    assert stats.reach("#x", today) == (2, 0.0)
+    assert stats.mentions("#x", today)[0] == 2
+
+    assert stats.retains(today) and stats.retains(date(2024, 9, 27))
+    assert not stats.retains(date(2024, 9, 26)) and not stats.retains(date(2024, 10, 4))
+
+
+def test_hashtag_stats_build_off_the_loop_and_keep_concurrent_writes(monkeypatch):
+    now = datetime(2024, 10, 3, 12, tzinfo=timezone.utc)
+    today = date(2024, 10, 3)
+
+    def user(content: str) -> IUser:
+        return IUser(stories=[], posts=[IPost(content=content, timestamp=now, likes=1)], private=False, followers=1)
+
+    store = MemoryStore({"a": user("#x"), "b": user("#x"), "c": user("#x")})
+    stats = HashtagStats(store, clock=lambda: now)
+    store.add_listener(stats.on_store_event)
+    threads, written = set(), []
+    get_user = store.get_user
+
+    def scanning(username):
+        threads.add(threading.current_thread())
+        if username == "c" and not written:
+            # "a" was already scanned and changes before the build is done
+            written.append("a")
+            store.put_user("a", user("#y"))
+        return get_user(username)
+
+    monkeypatch.setattr(store, "get_user", scanning)
+
+    async def run():
+        await stats.ready()
+        assert written and threading.main_thread() not in threads
+
+    asyncio.run(run())
+    assert stats.reach("#x", today) == (2, 0.0) and stats.mentions("#x", today)[0] == 2
+    assert stats.reach("#y", today) == (1, 0.0) and stats.mentions("#y", today)[0] == 1
+
+
+def test_hashtag_mentions_miss_reports_the_configured_delta():
+    stats = HashtagStats(MemoryStore({}), delta=0.001)
+    day = date(2024, 10, 3)
+    assert stats.mentions("#nothing", day) == (0, 0, CountMinSketch(delta=0.001).delta)
+    assert not stats._mentions
+
+
+def test_hashtag_stats_reject_days_out_of_retention(store):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in ("/api/v1/instagram/hashtag-reach", "/api/v1/instagram/hashtag-mentions"):
+                response = await client.get(path, params={"hashtag": "#travel", "day": "2024-10-01"})
+                assert response.status_code == 422
+                assert response.json() == {"detail": "Hashtag stats only cover the last 7 days"}
+                response = await client.get(path, params={"hashtag": "#travel"})
+                assert response.status_code == 200
+
+    asyncio.run(run())
@@ -0,0 +1,169 @@
+import asyncio
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from mock_social_api import constants
+from mock_social_api import snapshot as snapshot_module
+from mock_social_api.schemas.instagram_schema import IComment, IPost, IStory, IUser
+from mock_social_api.snapshot import MAGIC, VERSION, SnapshotError, dump_snapshot, open_snapshot, write_snapshot
+from mock_social_api.store import ExportFilter, MemoryStore
+
+PARIS_SUMMER = timezone(timedelta(hours=2))
+
+
+def make_users() -> dict[str, IUser]:
+    return {
+        "naive": IUser(
+            stories=[IStory(content="Morning #coffee", timestamp=datetime(2024, 10, 3, 7, 30, 0, 123456), likes=3)],
+            posts=[],
+            private=False,
+            followers=10,
+        ),
+        "aware": IUser(
+            stories=[],
+            posts=[
+                IPost(
+                    content="Sunset #travel #vacation",
+                    timestamp=datetime(2024, 10, 3, 19, 45, tzinfo=PARIS_SUMMER),
+                    likes=12,
+                    link="https://example.com/p/1",
+                    comments=[
+                        IComment(username="naive", content="Nice!", timestamp=datetime(2024, 10, 3, 18, 0, tzinfo=timezone.utc)),
+                        IComment(username="empty", content="Wow", timestamp=datetime(2024, 10, 3, 20, 0)),
+                    ],
+                ),
+            ],
+            private=True,
+            followers=2**40,
+        ),
+        "empty": IUser(stories=[], posts=[], private=False, followers=0),
+        "ünïcode": IUser(
+            stories=[IStory(content="#travel", timestamp=datetime(2024, 10, 2, tzinfo=timezone(-timedelta(hours=5))), likes=0)],
+            posts=[],
+            private=False,
+            followers=1,
+        ),
+    }
+
+
+def test_snapshot_round_trip(tmp_path):
+    users = make_users()
+    path = str(tmp_path / "users.snapshot")
+    assert write_snapshot(users, path) == len(dump_snapshot(users))
+
+    snapshot = open_snapshot(path)
+    assert len(snapshot) == len(users)
+    assert sorted(snapshot) == sorted(users)
+    for username, user in users.items():
+        assert username in snapshot
+        assert snapshot[username] == user
+    assert "nobody" not in snapshot and 42 not in snapshot
+    with pytest.raises(KeyError):
+        snapshot["nobody"]
+
+    # Naive timestamps stay naive and aware ones keep their offset
+    assert snapshot["naive"].stories[0].timestamp.tzinfo is None
+    post = snapshot["aware"].posts[0]
+    assert post.timestamp.utcoffset() == timedelta(hours=2)
+    assert post.comments[0].timestamp.utcoffset() == timedelta(0)
+    assert post.comments[1].timestamp.tzinfo is None
+
+    assert snapshot.hashtag_count == 3
+    assert sorted(snapshot.users_with_hashtag("#travel")) == ["aware", "ünïcode"]
+    assert snapshot.users_with_hashtag("#coffee") == ["naive"]
+    assert snapshot.users_with_hashtag("#unused") == []
+
+
+def test_snapshot_of_the_mock_dataset(tmp_path):
+    users = constants._build_mock_users()
+    path = str(tmp_path / "mock.snapshot")
+    write_snapshot(users, path)
+    snapshot = open_snapshot(path)
+    assert dict(snapshot) == users
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "empty.snapshot")
+    write_snapshot({}, path)
+    snapshot = open_snapshot(path)
+    assert len(snapshot) == 0 and list(snapshot) == []
+    assert snapshot.hashtag_count == 0
+    assert snapshot.users_with_hashtag("#travel") == []
+
+
+@pytest.mark.parametrize(
+    ("data", "message"),
+    [
+        (b"", "not a snapshot"),
+        (b"MSA", "not a snapshot"),
+        (b"NOPE" + dump_snapshot({})[4:], "not a snapshot"),
+        (MAGIC + struct.pack("<H", VERSION + 1) + dump_snapshot({})[6:], f"version {VERSION + 1}"),
+    ],
+)
+def test_invalid_snapshots_are_rejected(tmp_path, data, message):
+    path = tmp_path / "bad.snapshot"
+    path.write_bytes(data)
+    with pytest.raises(SnapshotError, match=message):
+        open_snapshot(str(path))
+
+
+def test_hashtag_exports_only_decode_tagged_users(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(make_users(), path)
+    snapshot = open_snapshot(path)
+    store = MemoryStore(snapshot)
+    store.add_story("empty", IStory(content="Later #travel", timestamp=datetime(2024, 10, 4), likes=1))
+
+    rows = [row for batch in store.export_rows("stories", ExportFilter(hashtag="#travel"), 100) for row in batch]
+    assert sorted(row[0] for row in rows) == ["empty", "ünïcode"]
+    # Users without the hashtag in the snapshot were never decoded
+    assert "naive" not in snapshot._cache
+
+
+def test_dump_over_a_snapshot_copies_untouched_records(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(make_users(), path)
+    snapshot = open_snapshot(path)
+    overlay = {
+        "aware": IUser(stories=[IStory(content="#coffee", timestamp=datetime(2024, 10, 4), likes=1)], posts=[], private=False, followers=3),
+        "new": IUser(stories=[], posts=[IPost(content="#travel", timestamp=datetime(2024, 10, 4), likes=2)], private=False, followers=1),
+    }
+    data = dump_snapshot(overlay, snapshot)
+    assert snapshot._cache == {}
+    assert data == dump_snapshot({**make_users(), **overlay})
+
+
+def test_periodic_snapshots_only_follow_writes(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(make_users(), path)
+    snapshot = open_snapshot(path)
+    store = MemoryStore(snapshot)
+    writes = []
+
+    def counting_write(*args):
+        writes.append(args)
+        return write_snapshot(*args)
+
+    monkeypatch.setattr(snapshot_module, "write_snapshot", counting_write)
+
+    async def run():
+        task = asyncio.create_task(snapshot_module.snapshot_periodically(store, path, 0.01))
+        try:
+            await asyncio.sleep(0.05)
+            assert writes == []
+            store.add_story("empty", IStory(content="#coffee", timestamp=datetime(2024, 10, 4), likes=1))
+            await asyncio.sleep(0.05)
+            assert len(writes) == 1
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        assert store._listeners == []
+
+    asyncio.run(run())
+    # Only the written user was ever decoded
+    assert list(snapshot._cache) == ["empty"]
+    reopened = open_snapshot(path)
+    assert reopened["empty"].stories[0].content == "#coffee"
+    assert dict(reopened) == {**make_users(), "empty": store.get_user("empty")}
@@ -0,0 +1,73 @@
+import json
+import subprocess
+import sys
+
+from mock_social_api.openapi import OPENAPI_PATH, dump_openapi
+
+# Time the app's own modules may spend importing, on top of FastAPI itself
+IMPORT_BUDGET_US = 100_000
+
+LAZY_MODULES = ("httpx", "pytz", "fastapi_pagination", "mock_social_api.snapshot", "pyarrow")
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """Run `statement` under `-X importtime` and return each module's self time in us."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def test_import_main_within_budget():
+    # Best of a few runs, so a noisy machine does not fail the budget
+    own = min(
+        sum(us for name, us in import_times("import mock_social_api.main").items() if name.startswith("mock_social_api"))
+        for _ in range(3)
+    )
+    assert own < IMPORT_BUDGET_US, f"mock_social_api modules took {own} us to import"
+
+
+def test_import_main_defers_heavy_dependencies():
+    times = import_times("import mock_social_api.main")
+    for module in LAZY_MODULES:
+        assert module not in times, f"{module} is imported at startup"
+
+
+def test_import_main_defers_dataset():
+    result = subprocess.run(
+        [sys.executable, "-c", "import mock_social_api.main\n"
+                               "from mock_social_api import constants\n"
+                               "print('mock_users' in vars(constants))"],
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_precomputed_openapi_is_current():
+    from mock_social_api.main import app
+
+    assert json.loads(OPENAPI_PATH.read_text()) == json.loads(dump_openapi(app)), (
+        "openapi.json is stale, regenerate it with `python -m mock_social_api.openapi`"
+    )
+
+
+def test_startup_defers_dataset():
+    result = subprocess.run(
+        [sys.executable, "-c", "import asyncio\n"
+                               "from mock_social_api import constants\n"
+                               "from mock_social_api.main import app\n"
+                               "async def run():\n"
+                               "    async with app.router.lifespan_context(app):\n"
+                               "        await asyncio.sleep(0.1)\n"
+                               "asyncio.run(run())\n"
+                               "print('mock_users' in vars(constants))"],
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == "False"
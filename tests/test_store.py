@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from mock_social_api import constants
+from mock_social_api.main import app
+from mock_social_api.schemas.instagram_schema import IComment, IPost, IStory, IUser
+from mock_social_api.store import ExportFilter, MemoryStore
+from mock_social_api.store.sqlite import SQLiteStore
+
+HASHTAGS = ("#vacation", "#travel", "#coffee", "#unused")
+SINCE = (
+    datetime(2024, 9, 1),
+    datetime(2024, 10, 1, 12, tzinfo=timezone.utc),
+    datetime(2024, 10, 2, 23, 48, tzinfo=timezone(timedelta(hours=2))),
+    datetime(2024, 10, 4),
+)
+
+
+def seed(store) -> None:
+    for username, user in constants._build_mock_users().items():
+        store.put_user(username, user)
+    store.put_user("tz", IUser(
+        stories=[
+            IStory(content="Late #coffee", timestamp=datetime(2024, 10, 2, 23, 45, tzinfo=timezone(timedelta(hours=2))), likes=4),
+            IStory(content="#Coffee again", timestamp=datetime(2024, 10, 2, 21, 50), likes=1),
+        ],
+        posts=[],
+        private=False,
+        followers=7,
+    ))
+    store.add_post("tz", IPost(
+        content="Road trip #travel #coffee",
+        timestamp=datetime(2024, 10, 3, 8, tzinfo=timezone.utc),
+        likes=9,
+        comments=[IComment(username="user1", content="Enjoy", timestamp=datetime(2024, 10, 3, 9))],
+    ))
+    store.add_story("user2", IStory(content="#travel", timestamp=datetime(2024, 10, 3, 12), likes=2))
+
+
+@pytest.fixture
+def stores(tmp_path):
+    memory = MemoryStore({})
+    sqlite = SQLiteStore(str(tmp_path / "users.db"))
+    for store in (memory, sqlite):
+        seed(store)
+    yield memory, sqlite
+    sqlite.close()
+
+
+def test_memory_and_sqlite_stores_agree(stores):
+    memory, sqlite = stores
+    assert sorted(memory.usernames()) == sorted(sqlite.usernames())
+    for username in [*memory.usernames(), "nobody"]:
+        assert memory.get_user(username) == sqlite.get_user(username)
+        for hashtag in HASHTAGS:
+            for since in SINCE:
+                expected = memory.hashtag_activity(username, hashtag, since)
+                assert sqlite.hashtag_activity(username, hashtag, since) == expected
+                assert memory.count_posts(username, hashtag, since) == expected.posts_with_hashtag
+                assert sqlite.count_posts(username, hashtag, since) == expected.posts_with_hashtag
+                assert memory.count_stories(username, hashtag, since) == expected.stories_with_hashtag
+                assert sqlite.count_stories(username, hashtag, since) == expected.stories_with_hashtag
+
+    # An aware and a naive (UTC) story on either side of an aware bound
+    assert memory.hashtag_activity("tz", "#coffee", SINCE[2]) == (1, 1, 10)
+
+
+@pytest.mark.parametrize("table", ["users", "stories", "posts", "comments"])
+@pytest.mark.parametrize(
+    "filters",
+    [
+        ExportFilter(),
+        ExportFilter(hashtag="#travel"),
+        ExportFilter(usernames=frozenset({"tz", "nobody"}), since=SINCE[1], until=SINCE[3]),
+    ],
+)
+def test_memory_and_sqlite_exports_agree(stores, table, filters):
+    memory, sqlite = stores
+
+    def rows(store):
+        return sorted(row for batch in store.export_rows(table, filters, 2) for row in batch)
+
+    assert rows(sqlite) == rows(memory)
+
+
+def test_count_endpoints_read_the_store(store):
+    async def run():
+        now = datetime.now(timezone.utc)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Scripted scenarios are unchanged
+            response = await client.get("/api/v1/instagram/count-posts", params={"username": "user1", "hashtag": "#vacation"})
+            assert response.json() == {"result": 2, "username": "user1"}
+
+            params = {"username": "user2", "hashtag": "Travel"}
+            assert (await client.get("/api/v1/instagram/count-posts", params=params)).json()["result"] == 0
+            assert (await client.get("/api/v1/instagram/count-stories", params=params)).json()["result"] == 0
+            store.add_post("user2", IPost(content="#travel", timestamp=now, likes=1))
+            store.add_story("user2", IStory(content="#travel", timestamp=now, likes=1))
+            store.add_story("user2", IStory(content="#travel", timestamp=now - timedelta(days=8), likes=1))
+            response = await client.get("/api/v1/instagram/count-posts", params={**params, "timeframe": "today_midnight"})
+            assert response.json() == {"result": 1, "username": "user2"}
+            assert (await client.get("/api/v1/instagram/count-stories", params=params)).json()["result"] == 1
+
+            response = await client.get("/api/v1/instagram/count-posts", params={"username": "user3", "hashtag": "#travel"})
+            assert response.status_code == 403
+            response = await client.get("/api/v1/instagram/count-stories", params={"username": "nobody", "hashtag": "#travel"})
+            assert response.status_code == 404
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timezone
+
+from mock_social_api.schemas.instagram_schema import IPost, IStory, IUser
+from mock_social_api.subscriptions import CheckType, SubscriptionHub, evaluate, format_event
+
+
+def test_store_writes_push_new_results(store):
+    async def run():
+        hub = SubscriptionHub()
+        hub.start()
+        now = datetime.now(timezone.utc)
+        stories = hub.subscribe(("user2", "#travel", CheckType.count_stories))
+        has_story = hub.subscribe(("andrealbriziom", "#travel", CheckType.check_story))
+        try:
+            assert await anext(stories) == {"status_code": 200, "result": 0, "username": "user2"}
+            assert (await anext(has_story))["result"] is False
+            assert hub.subscriber_count == 2
+
+            store.add_story("user2", IStory(content="Off again #travel", timestamp=now, likes=1))
+            result = await asyncio.wait_for(anext(stories), 1)
+            assert result == {"status_code": 200, "result": 1, "username": "user2"}
+            store.add_story("andrealbriziom", IStory(content="#travel", timestamp=now, likes=1))
+            assert (await asyncio.wait_for(anext(has_story), 1))["result"] is True
+
+            # A write that leaves the result unchanged pushes nothing
+            store.add_post("user2", IPost(content="#other", timestamp=now, likes=1))
+            await asyncio.sleep(0.05)
+            assert all(queue.empty() for queue in hub._topics[("user2", "#travel", CheckType.count_stories)].queues)
+
+            store.put_user("user2", IUser(stories=[], posts=[], private=True, followers=0))
+            result = await asyncio.wait_for(anext(stories), 1)
+            assert result == {"status_code": 403, "detail": "Account is private"}
+        finally:
+            await stories.aclose()
+            await has_story.aclose()
+            await hub.stop()
+        assert hub.subscriber_count == 0 and not hub._topics_by_username
+
+    asyncio.run(run())
+
+
+def test_evaluate_reads_the_store_for_unscripted_users(store):
+    async def run():
+        assert await evaluate(("nobody", "#travel", CheckType.count_posts)) == {
+            "status_code": 404, "detail": "Account does not exist",
+        }
+        assert await evaluate(("andrealbriziom", "", CheckType.check_follow)) == {
+            "status_code": 200, "result": False, "username": "andrealbriziom",
+        }
+        store.put_user("andrealbriziom", IUser(stories=[], posts=[], private=True, followers=0))
+        assert (await evaluate(("andrealbriziom", "", CheckType.check_follow)))["status_code"] == 403
+        # Scripted scenarios are unchanged
+        assert (await evaluate(("user1", "", CheckType.check_follow)))["result"] is True
+
+    asyncio.run(run())
+
+
+def test_format_event():
+    assert format_event(None) == ": keepalive\n\n"
+    assert format_event({"status_code": 200, "result": 1}) == 'event: result\ndata: {"status_code": 200, "result": 1}\n\n'